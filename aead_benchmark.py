@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+AEAD Cipher Benchmark Suite
+Measures AES-128/256-GCM, ChaCha20-Poly1305 and (when the installed
+cryptography provides them) AES-GCM-SIV and AES-OCB3 over a sweep of payload
+sizes. Every cell is timed with perf_counter_ns after a warmup, repeated,
+and reported as ops/s, MB/s and cycles/byte with a 95% confidence interval,
+for encrypt and decrypt separately, plus the cost of key setup.
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import platform
+from cryptography.hazmat.primitives.ciphers import aead
+from perf_stats import confidence_interval
+
+PAYLOAD_SIZES = [16, 64, 256, 1024, 4096, 16384, 65536, 1024 * 1024, 16 * 1024 * 1024, 64 * 1024 * 1024]
+AAD = b"authenticated but not encrypted data"
+
+def available_ciphers():
+    """Cipher name -> (class, key bits, nonce bytes) for what this cryptography build offers"""
+    ciphers = {
+        'AES-128-GCM': (aead.AESGCM, 128, 12),
+        'AES-256-GCM': (aead.AESGCM, 256, 12),
+        'ChaCha20-Poly1305': (aead.ChaCha20Poly1305, 256, 12),
+    }
+    if hasattr(aead, 'AESGCMSIV'):
+        ciphers['AES-128-GCM-SIV'] = (aead.AESGCMSIV, 128, 12)
+        ciphers['AES-256-GCM-SIV'] = (aead.AESGCMSIV, 256, 12)
+    if hasattr(aead, 'AESOCB3'):
+        ciphers['AES-128-OCB3'] = (aead.AESOCB3, 128, 12)
+        ciphers['AES-256-OCB3'] = (aead.AESOCB3, 256, 12)
+    return ciphers
+
+def cpu_info():
+    """CPU model and nominal clock, used to convert time into cycles/byte"""
+    model, mhz = platform.processor() or platform.machine(), None
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                name = name.strip()
+                if name == 'model name' and value.strip():
+                    model = value.strip()
+                elif name == 'cpu MHz' and mhz is None:
+                    mhz = float(value)
+    except OSError:
+        pass
+    return model, (mhz / 1000 if mhz else None)
+
+def usable(cipher_class, key_bits, nonce_size):
+    """Some backends (e.g. OpenSSL builds without OCB or GCM-SIV) reject a cipher at first use"""
+    try:
+        cipher_class(os.urandom(key_bits // 8)).encrypt(os.urandom(nonce_size), b"x", None)
+        return True
+    except Exception:
+        return False
+
+def calibrate(operation, min_time_ns):
+    """Number of calls per timed repeat so one repeat lasts at least min_time_ns"""
+    iterations = 1
+    while True:
+        start = time.perf_counter_ns()
+        for _ in range(iterations):
+            operation()
+        elapsed = time.perf_counter_ns() - start
+        if elapsed >= min_time_ns or iterations >= 1 << 24:
+            return iterations
+        iterations *= 2 if elapsed == 0 else max(2, min(10, int(min_time_ns / elapsed) + 1))
+
+def measure(operation, repeats, warmup, min_time_ns):
+    """Per-call durations in ns: one sample per repeat (the mean over its calibrated iterations)"""
+    for _ in range(warmup):
+        operation()
+    iterations = calibrate(operation, min_time_ns)
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        for _ in range(iterations):
+            operation()
+        samples.append((time.perf_counter_ns() - start) / iterations)
+    return samples, iterations
+
+def describe(samples_ns, size=0, ghz=None):
+    """ops/s, MB/s and cycles/byte (with 95% CI half-widths) from per-call durations"""
+    mean_ns, half_ns = confidence_interval(samples_ns)
+    result = {
+        'ns_per_op': mean_ns,
+        'ns_per_op_ci95': half_ns,
+        'ops_per_s': 1e9 / mean_ns,
+        'ops_per_s_ci95': 1e9 * half_ns / (mean_ns * mean_ns),
+    }
+    if size:
+        result['mb_per_s'] = size / mean_ns * 1e3
+        result['mb_per_s_ci95'] = size * half_ns / (mean_ns * mean_ns) * 1e3
+    if ghz and size:
+        result['cycles_per_byte'] = mean_ns * ghz / size
+        result['cycles_per_byte_ci95'] = half_ns * ghz / size
+    return result
+
+def benchmark_cipher(name, cipher_class, key_bits, nonce_size, sizes, repeats, warmup, min_time_ns, ghz):
+    key = os.urandom(key_bits // 8)
+    setup_samples, _ = measure(lambda: cipher_class(key), repeats, warmup, min_time_ns)
+    cipher = cipher_class(key)
+    # A fixed nonce is fine for timing (never do this with real data)
+    nonce = os.urandom(nonce_size)
+    rows = []
+    for size in sizes:
+        plaintext = os.urandom(size)
+        ciphertext = cipher.encrypt(nonce, plaintext, AAD)
+        # Large payloads take long per call; fewer warmups keep the sweep practical
+        size_warmup = warmup if size <= 1024 * 1024 else 1
+        encrypt, encrypt_iterations = measure(lambda: cipher.encrypt(nonce, plaintext, AAD),
+                                              repeats, size_warmup, min_time_ns)
+        decrypt, decrypt_iterations = measure(lambda: cipher.decrypt(nonce, ciphertext, AAD),
+                                              repeats, size_warmup, min_time_ns)
+        rows.append({
+            'cipher': name,
+            'size': size,
+            'encrypt': dict(describe(encrypt, size, ghz), iterations=encrypt_iterations),
+            'decrypt': dict(describe(decrypt, size, ghz), iterations=decrypt_iterations),
+        })
+    return describe(setup_samples), rows
+
+def run_suite(ciphers=None, sizes=PAYLOAD_SIZES, repeats=10, warmup=5, min_time_ms=20.0, ghz=None, log=sys.stderr):
+    """Benchmark every requested cipher at every payload size and return a report dict"""
+    model, detected_ghz = cpu_info()
+    ghz = ghz or detected_ghz
+    catalog = available_ciphers()
+    names = ciphers or list(catalog)
+    report = {
+        'cpu': model,
+        'ghz': ghz,
+        'python': platform.python_version(),
+        'repeats': repeats,
+        'warmup': warmup,
+        'min_time_ms': min_time_ms,
+        'key_setup': {},
+        'results': [],
+        'skipped': [],
+    }
+    for name in names:
+        if name not in catalog or not usable(*catalog[name]):
+            report['skipped'].append(name)
+            print(f"{name}: not available in this build, skipped", file=log)
+            continue
+        setup, rows = benchmark_cipher(name, *catalog[name], sizes, repeats, warmup, min_time_ms * 1e6, ghz)
+        report['key_setup'][name] = setup
+        report['results'].extend(rows)
+        for row in rows:
+            print(f"{name:<18} {row['size']:>9} B  enc {row['encrypt']['mb_per_s']:>9.1f} MB/s  "
+                  f"dec {row['decrypt']['mb_per_s']:>9.1f} MB/s", file=log)
+    return report
+
+def write_csv(report, path):
+    fields = ['cipher', 'size', 'operation', 'ops_per_s', 'ops_per_s_ci95', 'mb_per_s', 'mb_per_s_ci95',
+              'cycles_per_byte', 'cycles_per_byte_ci95', 'ns_per_op', 'ns_per_op_ci95', 'iterations',
+              'key_setup_ns']
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        for row in report['results']:
+            for operation in ('encrypt', 'decrypt'):
+                writer.writerow(dict(row[operation], cipher=row['cipher'], size=row['size'], operation=operation,
+                                     key_setup_ns=report['key_setup'][row['cipher']]['ns_per_op']))
+
+def parse_size(text):
+    units = {'K': 1024, 'M': 1024 * 1024, 'G': 1024 ** 3}
+    text = text.strip().upper().rstrip('B')
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="AEAD cipher benchmark suite")
+    parser.add_argument('--ciphers', help="comma-separated subset of: " + ", ".join(available_ciphers()))
+    parser.add_argument('--sizes', help="comma-separated payload sizes, e.g. 16,1K,1M (default 16 B to 64 MB)")
+    parser.add_argument('--max-size', help="drop sweep sizes above this, e.g. 1M for a quick run")
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--min-time-ms', type=float, default=20.0, help="minimum duration of one timed repeat")
+    parser.add_argument('--ghz', type=float, help="CPU clock for cycles/byte (default: from /proc/cpuinfo)")
+    parser.add_argument('--json', help="write the JSON report here (default stdout)")
+    parser.add_argument('--csv', help="also write a flat CSV table here")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    sizes = [parse_size(s) for s in args.sizes.split(',')] if args.sizes else PAYLOAD_SIZES
+    if args.max_size:
+        sizes = [s for s in sizes if s <= parse_size(args.max_size)]
+    ciphers = args.ciphers.split(',') if args.ciphers else None
+    report = run_suite(ciphers, sizes, args.repeats, args.warmup, args.min_time_ms, args.ghz)
+    text = json.dumps(report, indent=2)
+    if args.json:
+        with open(args.json, 'w') as f:
+            f.write(text + "\n")
+        print(f"Report written to {args.json}", file=sys.stderr)
+    else:
+        print(text)
+    if args.csv:
+        write_csv(report, args.csv)
+        print(f"CSV written to {args.csv}", file=sys.stderr)
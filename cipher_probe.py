@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Runtime AEAD Selection from a Hardware Probe
+Checks the CPU for AES instructions and micro-benchmarks AES-GCM against
+ChaCha20-Poly1305 once per CPU model, caching the verdict on disk. The
+result backs preferred_aead() and orders the TLS cipher suites of the
+server and client: hosts without AES-NI get ChaCha20-Poly1305 first.
+
+Building an SSLContext only reads the cached result (run `python
+cipher_probe.py` once per host); it never benchmarks or writes to disk.
+Override it with IAS_CIPHER_PREFERENCE=aes|chacha and move the cache with
+IAS_CIPHER_PROBE_CACHE=/path/to/file.json. The TLS 1.3 suite order has no
+Python API; --openssl-conf writes an OPENSSL_CONF file that sets it.
+"""
+
+import os
+import sys
+import ssl
+import json
+import time
+import logging
+import argparse
+import functools
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+from aead_benchmark import cpu_info, measure
+
+logger = logging.getLogger("cipher_probe")
+
+AES_GCM = 'AES-GCM'
+CHACHA20_POLY1305 = 'CHACHA20-POLY1305'
+PROBE_SIZES = [1024, 16384]
+PROBE_VERSION = 1
+
+TLS13_SUITES = {
+    AES_GCM: "TLS_AES_256_GCM_SHA384:TLS_AES_128_GCM_SHA256:TLS_CHACHA20_POLY1305_SHA256",
+    CHACHA20_POLY1305: "TLS_CHACHA20_POLY1305_SHA256:TLS_AES_256_GCM_SHA384:TLS_AES_128_GCM_SHA256",
+}
+TLS13_NAMES = set(TLS13_SUITES[AES_GCM].split(':'))
+# Not exported by the ssl module; value from OpenSSL's ssl.h
+OP_PRIORITIZE_CHACHA = getattr(ssl, 'OP_PRIORITIZE_CHACHA', 0x00200000)
+TLS12_CIPHERS = {
+    AES_GCM: 'ECDHE+AESGCM:ECDHE+CHACHA20:DHE+AESGCM:DHE+CHACHA20:!aNULL:!MD5:!DSS',
+    CHACHA20_POLY1305: 'ECDHE+CHACHA20:ECDHE+AESGCM:DHE+CHACHA20:DHE+AESGCM:!aNULL:!MD5:!DSS',
+}
+
+def default_cache_path():
+    return os.environ.get('IAS_CIPHER_PROBE_CACHE') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'ias_cipher_probe.json')
+
+def cpu_flags():
+    """CPU feature flags from /proc/cpuinfo (x86 'flags', ARM 'Features'); None when unavailable"""
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name.strip() in ('flags', 'Features'):
+                    return set(value.split())
+    except OSError:
+        pass
+    return None
+
+def has_aes_instructions():
+    """True/False from the CPU flags, None when the platform does not expose them"""
+    flags = cpu_flags()
+    return None if flags is None else 'aes' in flags
+
+def benchmark_aeads():
+    """Mean MB/s of AES-256-GCM and ChaCha20-Poly1305 over the probe sizes"""
+    rates = {}
+    for name, cipher_class in ((AES_GCM, AESGCM), (CHACHA20_POLY1305, ChaCha20Poly1305)):
+        cipher = cipher_class(os.urandom(32))
+        nonce = os.urandom(12)
+        speeds = []
+        for size in PROBE_SIZES:
+            payload = os.urandom(size)
+            samples, _ = measure(lambda: cipher.encrypt(nonce, payload, None), 3, 3, 5_000_000)
+            speeds.append(size / min(samples) * 1e3)
+        rates[name] = sum(speeds) / len(speeds)
+    return rates
+
+def run_probe():
+    aes_instructions = has_aes_instructions()
+    rates = benchmark_aeads()
+    if aes_instructions is False:
+        preferred = CHACHA20_POLY1305
+    else:
+        preferred = max(rates, key=rates.get)
+    return {
+        'version': PROBE_VERSION,
+        'cpu': cpu_info()[0],
+        'aes_instructions': aes_instructions,
+        'mb_per_s': rates,
+        'preferred': preferred,
+        'probed_at': time.time(),
+    }
+
+def load_cache(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def probe(cache_path=None, refresh=False):
+    """Probe result for this CPU, from the on-disk cache when it has one for this CPU model"""
+    cache_path = cache_path or default_cache_path()
+    model = cpu_info()[0]
+    cache = load_cache(cache_path)
+    entry = cache.get(model)
+    if not refresh and entry and entry.get('version') == PROBE_VERSION:
+        return entry
+    entry = run_probe()
+    cache[model] = entry
+    try:
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning("Could not write cipher probe cache %s: %s", cache_path, e)
+    logger.info("Cipher probe for %s: %s (AES instructions: %s)", model, entry['preferred'],
+                entry['aes_instructions'])
+    return entry
+
+def cached_preference(cache_path=None):
+    """Preferred AEAD from an earlier probe of this CPU model; None if it was never probed"""
+    entry = load_cache(cache_path or default_cache_path()).get(cpu_info()[0])
+    if entry and entry.get('version') == PROBE_VERSION:
+        return entry['preferred']
+    return None
+
+def requested_aead(preference=None):
+    """
+    AEAD the TLS suites should be ordered by, or None when nothing says so
+    preference (default IAS_CIPHER_PREFERENCE) is 'aes' or 'chacha'; otherwise
+    the cached probe result is used. This never benchmarks or writes to disk.
+    """
+    preference = (preference or os.environ.get('IAS_CIPHER_PREFERENCE', '')).lower()
+    if preference.startswith('aes'):
+        return AES_GCM
+    if preference.startswith('chacha'):
+        return CHACHA20_POLY1305
+    return cached_preference()
+
+@functools.lru_cache(maxsize=1)
+def preferred_aead():
+    """'AES-GCM' or 'CHACHA20-POLY1305' for this host (probed once per process, cached on disk)"""
+    override = os.environ.get('IAS_CIPHER_PREFERENCE', '').lower()
+    if override.startswith(('aes', 'chacha')):
+        return requested_aead(override)
+    return probe()['preferred']
+
+def openssl_conf(preferred):
+    """
+    OPENSSL_CONF file text that orders the TLS 1.3 suites for `preferred`
+    Python has no API for the TLS 1.3 suite order; OpenSSL applies this
+    `Ciphersuites` setting to every SSLContext of a process started with
+    OPENSSL_CONF pointing at the file. It replaces the system openssl.cnf.
+    """
+    return (
+        "openssl_conf = openssl_init\n\n"
+        "[openssl_init]\nssl_conf = ssl_module\n\n"
+        "[ssl_module]\nsystem_default = ias_tls\n\n"
+        f"[ias_tls]\nCiphersuites = {TLS13_SUITES[preferred]}\n"
+    )
+
+def configure_cipher_order(context, server=False, preferred=None):
+    """
+    Order an SSLContext's cipher suites by the preferred AEAD
+    preferred defaults to IAS_CIPHER_PREFERENCE, then to the cached probe
+    result, then to AES-GCM. TLS 1.2 suites are ordered directly. For TLS 1.3
+    a server honours a client that lists ChaCha20 first
+    (SSL_OP_PRIORITIZE_CHACHA); its own TLS 1.3 order comes from OPENSSL_CONF
+    (see openssl_conf()). Returns the AEAD applied.
+    """
+    preferred = requested_aead(preferred) or AES_GCM
+    context.set_ciphers(TLS12_CIPHERS[preferred])
+    if server:
+        # Servers pick from their own list, so our order decides the suite;
+        # clients without AES-NI that put ChaCha20 first still get it
+        context.options |= ssl.OP_CIPHER_SERVER_PREFERENCE | OP_PRIORITIZE_CHACHA
+    first_suite = context.get_ciphers()[0]['name']
+    if first_suite in TLS13_NAMES and first_suite != TLS13_SUITES[preferred].split(':')[0]:
+        logger.info("TLS 1.3 suites start with %s; write `python cipher_probe.py --openssl-conf FILE` "
+                    "and set OPENSSL_CONF=FILE to put %s first", first_suite, preferred)
+    return preferred
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Probe AES/ChaCha20 performance on this host")
+    parser.add_argument('--refresh', action='store_true', help="ignore the cached result and probe again")
+    parser.add_argument('--cache', help="cache file (default ~/.cache/ias_cipher_probe.json)")
+    parser.add_argument('--openssl-conf', metavar='FILE',
+                        help="also write an OPENSSL_CONF file with the matching TLS 1.3 suite order")
+    args = parser.parse_args()
+
+    result = probe(args.cache, args.refresh)
+    print(json.dumps(result, indent=2))
+    if args.openssl_conf:
+        with open(args.openssl_conf, 'w') as f:
+            f.write(openssl_conf(result['preferred']))
+        print(f"Wrote {args.openssl_conf}; start the server/client with OPENSSL_CONF={args.openssl_conf}",
+              file=sys.stderr)
+    context = ssl.create_default_context()
+    configure_cipher_order(context, preferred=result['preferred'])
+    print("TLS cipher order:", [c['name'] for c in context.get_ciphers()][:4], file=sys.stderr)
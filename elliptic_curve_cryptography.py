@@ -1,54 +1,271 @@
 import os
+import sys
+import time
+import queue
+import argparse
+import threading
+import weakref
 from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
-from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.backends import default_backend
+from perf_stats import summarize
 
 # =====================================================
-# Generate ECC Key Pairs (Alice & Bob)
+# ECIES (ECDH -> HKDF -> AES-GCM) as a reusable API
 # =====================================================
+#
+# Wire format: version (1) | ephemeral public key, compressed (33) | ciphertext | tag (16)
+# Every message uses a fresh ephemeral key, so the derived AES key is never
+# reused and the AES-GCM nonce can be fixed instead of being sent.
 
-alice_private = ec.generate_private_key(ec.SECP256R1())
-alice_public = alice_private.public_key()
+ECIES_VERSION = 1
+ECIES_CURVE = ec.SECP256R1()
+POINT_SIZE = 33
+ECIES_NONCE = bytes(12)
+ECIES_OVERHEAD = 1 + POINT_SIZE + 16
 
-bob_private = ec.generate_private_key(ec.SECP256R1())
-bob_public = bob_private.public_key()
+def encode_point(public_key):
+    return public_key.public_bytes(serialization.Encoding.X962, serialization.PublicFormat.CompressedPoint)
 
-# =====================================================
-# ECDH Key Exchange
-# =====================================================
+def ecies_key(shared_secret, ephemeral_point, recipient_point):
+    # Binding both public keys into HKDF ties the key to this exact exchange
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b'ecies p256 aes-gcm' + ephemeral_point + recipient_point,
+    ).derive(shared_secret)
 
-alice_shared_key = alice_private.exchange(ec.ECDH(), bob_public)
-bob_shared_key = bob_private.exchange(ec.ECDH(), alice_public)
 
-# Derive AES key from shared secret
-derived_key = HKDF(
-    algorithm=hashes.SHA256(),
-    length=32,
-    salt=None,
-    info=b'handshake data',
-).derive(alice_shared_key)
+# Live pools, so a forked child can reset every one of them
+_pools = weakref.WeakSet()
 
-# =====================================================
-# Encrypt Message Using AES-GCM
-# =====================================================
+class EphemeralKeyPool:
+    """
+    Ephemeral P-256 keys generated ahead of time by background threads
+    Each key is handed out exactly once. Refilling starts only when the pool
+    drops below the low watermark and then tops it up in one go, so the
+    generator threads stay idle (and off the CPU) while a burst is served.
+    When the pool runs dry get() generates inline, so callers never block.
+    A forked child drops the keys it inherited (the parent still hands them
+    out, and ECIES relies on every ephemeral key being used once) and starts
+    its own pool.
+    """
 
-message = b"Secure ECC Encryption Message"
-aad = b"authenticated data"
+    def __init__(self, size=256, threads=1, low_watermark=None):
+        self.size = size
+        self.thread_count = threads
+        self.low_watermark = size // 2 if low_watermark is None else low_watermark
+        self.stopped = threading.Event()
+        self.reset()
+        self.start_threads()
+        _pools.add(self)
 
-aesgcm = AESGCM(derived_key)
-nonce = os.urandom(12)
+    def reset(self):
+        """Empty queue, counters and lock owned by the current process"""
+        self.pid = os.getpid()
+        self.keys = queue.Queue(maxsize=self.size)
+        self.lock = threading.Lock()
+        self.refill = threading.Event()
+        self.refill.set()
+        self.inline = 0
+        self.served = 0
+        self.threads = []
 
-ciphertext = aesgcm.encrypt(nonce, message, aad)
+    def start_threads(self):
+        self.threads = [threading.Thread(target=self.fill, name=f"ecies-keygen-{i}", daemon=True)
+                        for i in range(self.thread_count)]
+        for thread in self.threads:
+            thread.start()
 
-# =====================================================
-# Decrypt Message
-# =====================================================
+    def generate(self):
+        private_key = ec.generate_private_key(ECIES_CURVE)
+        return private_key, encode_point(private_key.public_key())
+
+    def fill(self):
+        while not self.stopped.is_set():
+            if not self.refill.wait(timeout=0.5):
+                continue
+            try:
+                while not self.stopped.is_set():
+                    self.keys.put_nowait(self.generate())
+            except queue.Full:
+                self.refill.clear()
+
+    def get(self):
+        """(private key, compressed public point) never handed out before"""
+        if self.pid != os.getpid():
+            self.reset()   # inherited across fork(): never reuse the parent's keys
+        if not self.threads and not self.stopped.is_set():
+            with self.lock:
+                if not self.threads:
+                    self.start_threads()
+        try:
+            key = self.keys.get_nowait()
+            inline = 0
+        except queue.Empty:
+            key = self.generate()
+            inline = 1
+        with self.lock:
+            self.served += 1
+            self.inline += inline
+        if self.keys.qsize() < self.low_watermark:
+            self.refill.set()
+        return key
+
+    def close(self):
+        self.stopped.set()
+        self.refill.set()
+
+    def stats(self):
+        with self.lock:
+            return {'available': self.keys.qsize(), 'served': self.served, 'generated_inline': self.inline}
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+def default_key_pool():
+    """Process-wide pool, started on first use"""
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = EphemeralKeyPool()
+        return _default_pool
+
+def _reset_pools_in_child():
+    # The child must not hand out the parent's pre-generated keys, and any
+    # lock a parent thread held at fork time would stay locked forever
+    global _default_pool, _default_pool_lock
+    _default_pool = None
+    _default_pool_lock = threading.Lock()
+    for pool in list(_pools):
+        pool.reset()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_pools_in_child)
+
+
+def ecies_encrypt(recipient_pub, msg, aad=None, pool=None):
+    """Encrypt msg to a P-256 public key (object or SEC1 bytes); pool=False generates inline"""
+    if isinstance(recipient_pub, (bytes, bytearray)):
+        recipient_pub = ec.EllipticCurvePublicKey.from_encoded_point(ECIES_CURVE, bytes(recipient_pub))
+    if pool is False:
+        ephemeral_private = ec.generate_private_key(ECIES_CURVE)
+        ephemeral_point = encode_point(ephemeral_private.public_key())
+    else:
+        ephemeral_private, ephemeral_point = (pool or default_key_pool()).get()
+    shared = ephemeral_private.exchange(ec.ECDH(), recipient_pub)
+    key = ecies_key(shared, ephemeral_point, encode_point(recipient_pub))
+    return bytes([ECIES_VERSION]) + ephemeral_point + AESGCM(key).encrypt(ECIES_NONCE, msg, aad)
+
+def ecies_decrypt(recipient_private, data, aad=None):
+    """Decrypt an ecies_encrypt message; raises ValueError or InvalidTag on bad input"""
+    if len(data) < ECIES_OVERHEAD or data[0] != ECIES_VERSION:
+        raise ValueError("Not an ECIES message (bad length or version)")
+    ephemeral_point = bytes(data[1:1 + POINT_SIZE])
+    ephemeral_pub = ec.EllipticCurvePublicKey.from_encoded_point(ECIES_CURVE, ephemeral_point)
+    shared = recipient_private.exchange(ec.ECDH(), ephemeral_pub)
+    key = ecies_key(shared, ephemeral_point, encode_point(recipient_private.public_key()))
+    return AESGCM(key).decrypt(ECIES_NONCE, data[1 + POINT_SIZE:], aad)
+
+
+def benchmark_ecies(count=2000, size=256, burst=128, pool_size=256):
+    """
+    Per-call latency of ecies_encrypt with pooled vs per-call ephemeral keys
+    Requests arrive in bursts; between bursts the background threads refill
+    the pool, which is how it absorbs peaks on a server with spare cores.
+    """
+    recipient = ec.generate_private_key(ECIES_CURVE)
+    recipient_pub = recipient.public_key()
+    message = os.urandom(size)
+    results = {}
+    pool = EphemeralKeyPool(size=pool_size)
+    for name, option in (('per_call_keygen', False), ('pooled', pool)):
+        latencies = []
+        while len(latencies) < count:
+            # Start every burst (for both variants) with the refill threads idle
+            while pool.refill.is_set():
+                time.sleep(0.005)
+            for _ in range(min(burst, count - len(latencies))):
+                start = time.perf_counter()
+                ecies_encrypt(recipient_pub, message, pool=option)
+                latencies.append(time.perf_counter() - start)
+        results[name] = summarize(latencies, 1e6)
+    results['pool'] = pool.stats()
+    pool.close()
+    assert ecies_decrypt(recipient, ecies_encrypt(recipient_pub, message, pool=False)) == message
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ECC demo and ECIES latency benchmark")
+    parser.add_argument('--benchmark', type=int, metavar='N', help="time N ECIES encryptions (µs percentiles)")
+    parser.add_argument('--burst', type=int, default=128, help="requests per burst in the benchmark")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        report = benchmark_ecies(args.benchmark, burst=args.burst)
+        for name in ('per_call_keygen', 'pooled'):
+            stats = report[name]
+            print(f"{name:<16} p50 {stats['p50']:8.1f} µs  p99 {stats['p99']:8.1f} µs  max {stats['max']:8.1f} µs")
+        print("Pool:", report['pool'])
+        sys.exit(0)
+
+    # =====================================================
+    # Generate ECC Key Pairs (Alice & Bob)
+    # =====================================================
+
+    alice_private = ec.generate_private_key(ec.SECP256R1())
+    alice_public = alice_private.public_key()
+
+    bob_private = ec.generate_private_key(ec.SECP256R1())
+    bob_public = bob_private.public_key()
+
+    # =====================================================
+    # ECDH Key Exchange
+    # =====================================================
+
+    alice_shared_key = alice_private.exchange(ec.ECDH(), bob_public)
+    bob_shared_key = bob_private.exchange(ec.ECDH(), alice_public)
+
+    # Derive AES key from shared secret
+    derived_key = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b'handshake data',
+    ).derive(alice_shared_key)
+
+    # =====================================================
+    # Encrypt Message Using AES-GCM
+    # =====================================================
+
+    message = b"Secure ECC Encryption Message"
+    aad = b"authenticated data"
+
+    aesgcm = AESGCM(derived_key)
+    nonce = os.urandom(12)
+
+    ciphertext = aesgcm.encrypt(nonce, message, aad)
+
+    # =====================================================
+    # Decrypt Message
+    # =====================================================
+
+    aesgcm_decrypt = AESGCM(derived_key)
+    decrypted = aesgcm_decrypt.decrypt(nonce, ciphertext, aad)
+
+    print("Original Message:", message)
+    print("Encrypted Message:", ciphertext)
+    print("Decrypted Message:", decrypted)
 
-aesgcm_decrypt = AESGCM(derived_key)
-decrypted = aesgcm_decrypt.decrypt(nonce, ciphertext, aad)
+    # =====================================================
+    # Same flow through the ECIES API
+    # =====================================================
 
-print("Original Message:", message)
-print("Encrypted Message:", ciphertext)
-print("Decrypted Message:", decrypted)
+    sealed = ecies_encrypt(bob_public, message, aad)
+    print("ECIES Message:", sealed, f"({len(sealed) - len(message)} bytes overhead)")
+    print("ECIES Decrypted:", ecies_decrypt(bob_private, sealed, aad))
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Hybrid Classical + Post-Quantum Key Exchange
+Combines an ECDH exchange (X25519 or P-256) with a Kyber/ML-KEM
+encapsulation, so the session key stays secret as long as either component
+holds. Both components run at the same time: the ECDH on a worker thread and
+the KEM in the caller (liboqs releases the GIL through ctypes), so latency is
+close to max(classical, PQ) rather than their sum.
+
+    public key  = len | classical public key | len | KEM public key
+    ciphertext  = len | ephemeral public key | len | KEM ciphertext
+    session key = HKDF-SHA256(classical secret | KEM secret, info = labels | ciphertext | public key)
+"""
+
+import sys
+import json
+import time
+import struct
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from key_agreement_service import CURVES, generate_private_key, public_bytes, load_public
+from post_quantum_cryptography import KeyEncapsulation, check_parameter_set
+from perf_stats import summarize
+
+LENGTH = struct.Struct('!H')
+
+def pack_parts(*parts):
+    return b"".join(LENGTH.pack(len(part)) + part for part in parts)
+
+def unpack_parts(data, count):
+    parts = []
+    offset = 0
+    for _ in range(count):
+        if offset + LENGTH.size > len(data):
+            raise ValueError("Truncated hybrid encoding")
+        (length,) = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        if offset + length > len(data):
+            raise ValueError("Truncated hybrid encoding")
+        parts.append(bytes(data[offset:offset + length]))
+        offset += length
+    if offset != len(data):
+        raise ValueError("Trailing bytes after hybrid encoding")
+    return parts
+
+class HybridSecretKey:
+    """Recipient side of a hybrid keypair"""
+
+    def __init__(self, classical_private, kem_secret, public_key):
+        self.classical_private = classical_private
+        self.kem_secret = kem_secret
+        self.public_key = public_key
+
+class HybridKEM:
+    """
+    X25519/P-256 + Kyber/ML-KEM hybrid key encapsulation
+    One instance can be shared by many threads: each thread lazily builds
+    its own KeyEncapsulation object, and the ECDH half runs on a small
+    shared executor.
+    """
+
+    def __init__(self, curve='X25519', kem='Kyber768', key_length=32, parallel=True, workers=4):
+        if curve not in CURVES:
+            raise ValueError(f"Unsupported curve {curve!r}; use one of {CURVES}")
+        self.curve = curve
+        self.kem_algorithm = check_parameter_set(kem)
+        self.key_length = key_length
+        self.parallel = parallel
+        self.label = f"ias hybrid kem {curve}+{kem}".encode()
+        self.local = threading.local()
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="hybrid-ecdh") if parallel else None
+
+    def kem(self):
+        kem = getattr(self.local, 'kem', None)
+        if kem is None:
+            kem = self.local.kem = KeyEncapsulation(self.kem_algorithm)
+        return kem
+
+    def exchange(self, private_key, peer_public):
+        if self.curve == 'X25519':
+            return private_key.exchange(peer_public)
+        return private_key.exchange(ec.ECDH(), peer_public)
+
+    def derive(self, classical_secret, kem_secret, ciphertext, public_key):
+        return HKDF(
+            algorithm=hashes.SHA256(),
+            length=self.key_length,
+            salt=None,
+            info=self.label + ciphertext + public_key,
+        ).derive(classical_secret + kem_secret)
+
+    def run_concurrently(self, classical, post_quantum):
+        """Run classical() on the executor while post_quantum() runs here; returns both results"""
+        if not self.parallel:
+            return classical(), post_quantum()
+        future = self.executor.submit(classical)
+        pq_result = post_quantum()
+        return future.result(), pq_result
+
+    def generate_keypair(self):
+        """(public key bytes, HybridSecretKey)"""
+        def classical():
+            private_key = generate_private_key(self.curve)
+            return private_key, public_bytes(private_key.public_key())
+
+        def post_quantum():
+            kem = self.kem()
+            public_key = kem.generate_keypair()
+            return public_key, kem.export_secret_key()
+
+        (classical_private, classical_public), (kem_public, kem_secret) = \
+            self.run_concurrently(classical, post_quantum)
+        public_key = pack_parts(classical_public, kem_public)
+        return public_key, HybridSecretKey(classical_private, kem_secret, public_key)
+
+    def encapsulate(self, public_key, timings=None):
+        """(ciphertext, session key) for a recipient's hybrid public key"""
+        classical_public, kem_public = unpack_parts(public_key, 2)
+
+        def classical():
+            start = time.perf_counter()
+            ephemeral = generate_private_key(self.curve)
+            secret = self.exchange(ephemeral, load_public(self.curve, classical_public))
+            result = public_bytes(ephemeral.public_key()), secret
+            if timings is not None:
+                timings['classical'] = time.perf_counter() - start
+            return result
+
+        def post_quantum():
+            start = time.perf_counter()
+            result = self.kem().encap_secret(kem_public)
+            if timings is not None:
+                timings['pq'] = time.perf_counter() - start
+            return result
+
+        (ephemeral_public, classical_secret), (kem_ciphertext, kem_secret) = \
+            self.run_concurrently(classical, post_quantum)
+        ciphertext = pack_parts(ephemeral_public, kem_ciphertext)
+        return ciphertext, self.derive(classical_secret, kem_secret, ciphertext, public_key)
+
+    def decapsulate(self, secret_key, ciphertext, timings=None):
+        """Session key from a ciphertext produced by encapsulate()"""
+        ephemeral_public, kem_ciphertext = unpack_parts(ciphertext, 2)
+
+        def classical():
+            start = time.perf_counter()
+            secret = self.exchange(secret_key.classical_private, load_public(self.curve, ephemeral_public))
+            if timings is not None:
+                timings['classical'] = time.perf_counter() - start
+            return secret
+
+        def post_quantum():
+            start = time.perf_counter()
+            kem = self.kem()
+            kem.secret_key = secret_key.kem_secret
+            secret = kem.decap_secret(kem_ciphertext)
+            if timings is not None:
+                timings['pq'] = time.perf_counter() - start
+            return secret
+
+        classical_secret, kem_secret = self.run_concurrently(classical, post_quantum)
+        return self.derive(classical_secret, kem_secret, ciphertext, secret_key.public_key)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+def benchmark_hybrid(curve='X25519', kem='Kyber768', count=1000):
+    """Latency breakdown (µs): classical and PQ components, sequential vs concurrent hybrid"""
+    concurrent_kem = HybridKEM(curve, kem, parallel=True)
+    sequential_kem = HybridKEM(curve, kem, parallel=False)
+    public_key, secret_key = concurrent_kem.generate_keypair()
+    report = {'curve': curve, 'kem': kem, 'count': count}
+    for operation in ('encapsulate', 'decapsulate'):
+        samples = {'classical': [], 'pq': [], 'sequential': [], 'concurrent': []}
+        for _ in range(count):
+            for name, hybrid in (('sequential', sequential_kem), ('concurrent', concurrent_kem)):
+                timings = {}
+                start = time.perf_counter()
+                if operation == 'encapsulate':
+                    ciphertext, key = hybrid.encapsulate(public_key, timings)
+                else:
+                    hybrid.decapsulate(secret_key, ciphertext, timings)
+                samples[name].append(time.perf_counter() - start)
+                if name == 'sequential':
+                    # Component costs measured without concurrent interference
+                    samples['classical'].append(timings['classical'])
+                    samples['pq'].append(timings['pq'])
+        report[operation] = {name: summarize(values, 1e6) for name, values in samples.items()}
+    ciphertext, key = concurrent_kem.encapsulate(public_key)
+    if concurrent_kem.decapsulate(secret_key, ciphertext) != key:
+        raise RuntimeError("Hybrid session keys do not match")
+    concurrent_kem.close()
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hybrid ECDH + Kyber key exchange benchmark")
+    parser.add_argument('--curve', choices=CURVES, default='X25519')
+    parser.add_argument('--kem', default='Kyber768')
+    parser.add_argument('--count', type=int, default=1000)
+    args = parser.parse_args()
+
+    report = benchmark_hybrid(args.curve, args.kem, args.count)
+    for operation in ('encapsulate', 'decapsulate'):
+        parts = report[operation]
+        print(f"{operation:<12} classical {parts['classical']['p50']:7.1f} µs  pq {parts['pq']['p50']:7.1f} µs  "
+              f"sequential {parts['sequential']['p50']:7.1f} µs  concurrent {parts['concurrent']['p50']:7.1f} µs (p50)",
+              file=sys.stderr)
+    print(json.dumps(report, indent=2))
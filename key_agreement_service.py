@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Batch ECDH Key Agreement and HKDF Derivation Service
+Takes many peer public keys at once, runs the scalar multiplications (X25519
+or P-256) across a worker pool, derives per-session AES keys with HKDF and
+keeps them in a TTL/LRU cache keyed by (local public key fingerprint, peer
+public key fingerprint, info), so returning peers skip the ECDH entirely and
+re-registering a key id with a new key never serves the old key's secrets.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, x25519
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from ttl_cache import TTLCache
+
+CURVES = ('X25519', 'P-256')
+CHUNK_SIZE = 256
+WORKER_KEYS = 8
+
+# Deserialized private keys of a pool worker process, so each chunk does not
+# reload them; bounded so replaced keys do not stay in memory for good
+worker_keys = TTLCache(max_size=WORKER_KEYS, ttl=600.0)
+
+def generate_private_key(curve):
+    if curve == 'X25519':
+        return x25519.X25519PrivateKey.generate()
+    return ec.generate_private_key(ec.SECP256R1())
+
+def private_bytes(private_key):
+    return private_key.private_bytes(serialization.Encoding.DER, serialization.PrivateFormat.PKCS8,
+                                     serialization.NoEncryption())
+
+def public_bytes(public_key):
+    """Raw 32 bytes for X25519, uncompressed SEC1 point for P-256"""
+    if isinstance(public_key, x25519.X25519PublicKey):
+        return public_key.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+    return public_key.public_bytes(serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint)
+
+def load_public(curve, data):
+    if curve == 'X25519':
+        return x25519.X25519PublicKey.from_public_bytes(data)
+    return ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), data)
+
+def fingerprint(peer_public):
+    return hashlib.sha256(peer_public).digest()
+
+def exchange_chunk(curve, private_key, info, salt, length, peers):
+    """
+    Worker task: ECDH + HKDF for a chunk of peer public keys
+    private_key is a key object in-process and DER bytes in a pool worker.
+    Returns one derived key per peer, or None for keys that fail to load or
+    produce an all-zero X25519 secret (small-order points).
+    """
+    if isinstance(private_key, bytes):
+        private_der = private_key
+        private_key = worker_keys.get(private_der)
+        if private_key is None:
+            private_key = serialization.load_der_private_key(private_der, None)
+            worker_keys.put(private_der, private_key)
+    results = []
+    for peer in peers:
+        try:
+            peer_key = load_public(curve, peer)
+            if curve == 'X25519':
+                shared = private_key.exchange(peer_key)
+            else:
+                shared = private_key.exchange(ec.ECDH(), peer_key)
+        except ValueError:
+            results.append(None)
+            continue
+        results.append(HKDF(algorithm=hashes.SHA256(), length=length, salt=salt, info=info).derive(shared))
+    return results
+
+class KeyAgreementService:
+    """
+    ECDH + HKDF for many peers against a set of long-lived local keys
+    The default process pool sidesteps the GIL for the scalar multiplications;
+    executor='thread' avoids process start-up for small deployments.
+    """
+
+    def __init__(self, curve='X25519', workers=None, executor='process', cache_size=100_000,
+                 cache_ttl=3600.0, key_length=32, salt=None):
+        if curve not in CURVES:
+            raise ValueError(f"Unsupported curve {curve!r}; use one of {CURVES}")
+        self.curve = curve
+        self.workers = workers or os.cpu_count() or 1
+        self.executor_kind = executor
+        self.key_length = key_length
+        self.salt = salt
+        self.cache = TTLCache(max_size=cache_size, ttl=cache_ttl)
+        self.local_keys = {}  # key id -> (private key, DER bytes for the workers, public key fingerprint)
+        self.pool = None
+        self.lock = threading.Lock()
+        self.exchanges = 0
+        self.invalid = 0
+        self.busy_seconds = 0.0
+
+    def add_local_key(self, key_id, private_key=None):
+        """Register (or generate) a local private key; returns its public key bytes"""
+        private_key = private_key or generate_private_key(self.curve)
+        public = public_bytes(private_key.public_key())
+        self.local_keys[key_id] = (private_key, private_bytes(private_key), fingerprint(public))
+        return public
+
+    def start(self):
+        if self.pool is None:
+            pool_class = ProcessPoolExecutor if self.executor_kind == 'process' else ThreadPoolExecutor
+            self.pool = pool_class(self.workers)
+        return self
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        worker_keys.clear()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def derive(self, key_id, peer_public, info=b""):
+        """Session key for one peer (computed inline; use derive_many for batches)"""
+        return self.derive_many(key_id, [peer_public], info, parallel=False)[0]
+
+    def derive_many(self, key_id, peer_publics, info=b"", parallel=True):
+        """
+        Session keys for a batch of peers, in input order
+        Cached peers are answered immediately; the distinct misses are split
+        into chunks and exchanged on the pool. Invalid peer keys yield None.
+        """
+        private_key, private_der, local = self.local_keys[key_id]
+        results = [None] * len(peer_publics)
+        missing = {}  # peer bytes -> result positions
+        for index, peer in enumerate(peer_publics):
+            cached = self.cache.get((local, fingerprint(peer), info))
+            if cached is not None:
+                results[index] = cached
+            else:
+                missing.setdefault(bytes(peer), []).append(index)
+        if not missing:
+            return results
+
+        start = time.perf_counter()
+        peers = list(missing)
+        size = max(1, min(CHUNK_SIZE, -(-len(peers) // self.workers)))
+        chunks = [peers[i:i + size] for i in range(0, len(peers), size)]
+        task = (self.curve, private_key, info, self.salt, self.key_length)
+        if parallel and len(chunks) > 1:
+            self.start()
+            if self.executor_kind == 'process':
+                # Key objects do not pickle; workers load (and cache) the DER form
+                task = (self.curve, private_der, info, self.salt, self.key_length)
+            futures = [self.pool.submit(exchange_chunk, *task, chunk) for chunk in chunks]
+            derived_chunks = [future.result() for future in futures]
+        else:
+            derived_chunks = [exchange_chunk(*task, chunk) for chunk in chunks]
+        invalid = 0
+        for chunk, derived in zip(chunks, derived_chunks):
+            for peer, key in zip(chunk, derived):
+                if key is None:
+                    invalid += 1
+                    continue
+                self.cache.put((local, fingerprint(peer), info), key)
+                for index in missing[peer]:
+                    results[index] = key
+        with self.lock:
+            self.exchanges += len(peers) - invalid
+            self.invalid += invalid
+            self.busy_seconds += time.perf_counter() - start
+        return results
+
+    def stats(self):
+        """Exchange counters, exchanges/s while busy, and the key cache hit rate"""
+        with self.lock:
+            stats = {
+                'curve': self.curve,
+                'workers': self.workers,
+                'exchanges': self.exchanges,
+                'invalid_peers': self.invalid,
+                'exchanges_per_s': self.exchanges / self.busy_seconds if self.busy_seconds else 0.0,
+            }
+        stats['cache'] = self.cache.stats()
+        return stats
+
+def benchmark(curve='X25519', peers=10_000, repeat_ratio=0.5, workers=None, executor='process'):
+    """Derive keys for a stream of peers where repeat_ratio of requests come from known peers"""
+    unique = [public_bytes(generate_private_key(curve).public_key()) for _ in range(peers)]
+    known = unique[:max(1, int(peers * repeat_ratio))]
+    with KeyAgreementService(curve, workers=workers, executor=executor) as service:
+        service.add_local_key('server-1')
+        start = time.perf_counter()
+        service.derive_many('server-1', unique)
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        service.derive_many('server-1', known)
+        warm = time.perf_counter() - start
+        return {
+            'cold_requests_per_s': len(unique) / cold,
+            'warm_requests_per_s': len(known) / warm,
+            'service': service.stats(),
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch ECDH + HKDF key agreement benchmark")
+    parser.add_argument('--curve', choices=CURVES, default='X25519')
+    parser.add_argument('--peers', type=int, default=10_000)
+    parser.add_argument('--repeat-ratio', type=float, default=0.5, help="fraction of peers that reconnect")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--executor', choices=['process', 'thread'], default='process')
+    args = parser.parse_args()
+
+    report = benchmark(args.curve, args.peers, args.repeat_ratio, args.workers, args.executor)
+    print(f"{args.curve}: {report['service']['exchanges_per_s']:,.0f} exchanges/s, "
+          f"cache hit rate {report['service']['cache']['hit_rate']:.1%}", file=sys.stderr)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Simultaneous Modular Multi-Exponentiation
+Computes prod(base_i ^ exp_i) mod m in one pass instead of one pow() per base.
+Straus' interleaved windows share the squarings between a few bases (e.g. the
+two exponentiations of a Schnorr check); Pippenger's bucket method needs about
+one multiplication per base per window and wins for hundreds of bases (e.g. a
+weighted sum over Paillier ciphertexts). FixedBaseTable trades memory for
+speed when the same base is raised to many exponents (a generator g).
+gmpy2 is used when it is installed.
+"""
+
+import os
+import time
+import struct
+import random
+import hashlib
+import tempfile
+import argparse
+
+try:
+    import gmpy2
+    HAVE_GMPY2 = True
+except ImportError:
+    HAVE_GMPY2 = False
+
+STRAUS_LIMIT = 16
+TABLE_MAGIC = b"IASF"
+TABLE_HEADER = struct.Struct('!4sHHI')   # magic, window, width, exponent bits
+DEFAULT_TABLE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "ias_fixed_base")
+
+# Tables built in this process, keyed by (base, modulus, exponent bits, window)
+_tables = {}
+
+def to_native(value):
+    """gmpy2.mpz when available (faster multiplication), otherwise the int unchanged"""
+    return gmpy2.mpz(value) if HAVE_GMPY2 else value
+
+def straus(bases, exponents, modulus, window=4):
+    """prod(b^e) mod modulus with a fixed window per base and shared squarings"""
+    mask = (1 << window) - 1
+    tables = []
+    for base in bases:
+        base = to_native(base) % modulus
+        table = [1, base]
+        for _ in range(2, mask + 1):
+            table.append(table[-1] * base % modulus)
+        tables.append(table)
+    bits = max((exponent.bit_length() for exponent in exponents), default=0)
+    result = to_native(1)
+    for shift in range(((bits + window - 1) // window - 1) * window, -1, -window):
+        if result != 1:
+            for _ in range(window):
+                result = result * result % modulus
+        for table, exponent in zip(tables, exponents):
+            digit = (exponent >> shift) & mask
+            if digit:
+                result = result * table[digit] % modulus
+    return int(result % modulus)
+
+def pippenger_window(count):
+    """Bucket width that roughly minimises count/width + 2^width multiplications"""
+    return max(1, count.bit_length() - 4)
+
+def pippenger(bases, exponents, modulus, window=None):
+    """prod(b^e) mod modulus with Pippenger's bucket method"""
+    window = window or pippenger_window(len(bases))
+    mask = (1 << window) - 1
+    bases = [to_native(base) for base in bases]
+    bits = max((exponent.bit_length() for exponent in exponents), default=0)
+    result = to_native(1)
+    for shift in range(((bits + window - 1) // window - 1) * window, -1, -window):
+        if result != 1:
+            for _ in range(window):
+                result = result * result % modulus
+        buckets = [None] * (mask + 1)
+        for base, exponent in zip(bases, exponents):
+            digit = (exponent >> shift) & mask
+            if digit:
+                bucket = buckets[digit]
+                buckets[digit] = base if bucket is None else bucket * base % modulus
+        # prod(bucket_j ^ j) as a running product from the top bucket down
+        running = total = None
+        for bucket in reversed(buckets[1:]):
+            if bucket is not None:
+                running = bucket if running is None else running * bucket % modulus
+            if running is not None:
+                total = running if total is None else total * running % modulus
+        if total is not None:
+            result = result * total % modulus
+    return int(result % modulus)
+
+def multi_exponentiation(bases, exponents, modulus):
+    """prod(base_i ^ exp_i) mod modulus for non-negative exponents"""
+    if len(bases) != len(exponents):
+        raise ValueError("bases and exponents differ in length")
+    if len(bases) <= STRAUS_LIMIT:
+        return straus(bases, exponents, modulus)
+    return pippenger(bases, exponents, modulus)
+
+def product(values, modulus):
+    """prod(values) mod modulus as a pairwise tree, so every step multiplies two reduced operands"""
+    values = [to_native(value) for value in values]
+    if not values:
+        return 1 % modulus
+    while len(values) > 1:
+        paired = [values[i] * values[i + 1] % modulus for i in range(0, len(values) - 1, 2)]
+        if len(values) % 2:
+            paired.append(values[-1])
+        values = paired
+    return int(values[0] % modulus)
+
+class FixedBaseTable:
+    """
+    Windowed fixed-base exponentiation
+    Row i holds base^(d * 2^(window*i)) for every digit d, so base^e is one
+    table lookup and multiplication per window of e and no squarings at all.
+    A 255-bit exponent with window 8 takes at most 32 multiplications
+    instead of roughly 300 for pow(), at the cost of 32 * 255 stored residues.
+    """
+
+    def __init__(self, base, modulus, exponent_bits, window=8, rows=None):
+        self.base = base % modulus
+        self.modulus = modulus
+        self.exponent_bits = exponent_bits
+        self.window = window
+        self.width = (modulus.bit_length() + 7) // 8
+        self.rows = rows if rows is not None else self.build()
+
+    def build(self):
+        rows = []
+        mask = (1 << self.window) - 1
+        row_base = to_native(self.base)
+        for _ in range((self.exponent_bits + self.window - 1) // self.window):
+            row = [1, row_base]
+            for _ in range(2, mask + 1):
+                row.append(row[-1] * row_base % self.modulus)
+            rows.append(row)
+            row_base = row[-1] * row_base % self.modulus   # base^(2^window) for the next row
+        return rows
+
+    def pow(self, exponent):
+        """base^exponent mod modulus; exponents beyond the table fall back to pow()"""
+        if exponent < 0 or exponent.bit_length() > self.exponent_bits:
+            return pow(self.base, exponent, self.modulus)
+        result = to_native(1)
+        modulus = self.modulus
+        if self.window == 8:
+            digits = exponent.to_bytes(len(self.rows), 'little')
+        else:
+            mask = (1 << self.window) - 1
+            digits = [(exponent >> shift) & mask for shift in range(0, len(self.rows) * self.window, self.window)]
+        for row, digit in zip(self.rows, digits):
+            if digit:
+                result = result * row[digit] % modulus
+        return int(result)
+
+    def save(self, path):
+        """
+        Write the table as fixed-width big-endian residues
+        Each writer uses its own temporary file and renames it into place, so
+        processes saving the same table at once never mix their writes.
+        """
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as handle:
+                handle.write(TABLE_HEADER.pack(TABLE_MAGIC, self.window, self.width, self.exponent_bits))
+                handle.write(self.base.to_bytes(self.width, 'big') + self.modulus.to_bytes(self.width, 'big'))
+                for row in self.rows:
+                    handle.write(b"".join(int(value).to_bytes(self.width, 'big') for value in row[1:]))
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    @classmethod
+    def load(cls, path, base, modulus):
+        """Table from save(); raises ValueError if it was built for another base or modulus"""
+        with open(path, 'rb') as handle:
+            data = handle.read()
+        magic, window, width, exponent_bits = TABLE_HEADER.unpack_from(data)
+        offset = TABLE_HEADER.size
+        stored_base = int.from_bytes(data[offset:offset + width], 'big')
+        stored_modulus = int.from_bytes(data[offset + width:offset + 2 * width], 'big')
+        if magic != TABLE_MAGIC or stored_base != base % modulus or stored_modulus != modulus:
+            raise ValueError(f"{path} is not a table for this base and modulus")
+        offset += 2 * width
+        row_count = (exponent_bits + window - 1) // window
+        row_size = ((1 << window) - 1) * width
+        if len(data) != offset + row_count * row_size:
+            raise ValueError(f"{path} is truncated")
+        rows = []
+        for _ in range(row_count):
+            rows.append([1] + [to_native(int.from_bytes(data[start:start + width], 'big'))
+                               for start in range(offset, offset + row_size, width)])
+            offset += row_size
+        return cls(base, modulus, exponent_bits, window, rows)
+
+def table_path(base, modulus, exponent_bits, window, directory=DEFAULT_TABLE_DIR):
+    digest = hashlib.sha256(f"{base}:{modulus}:{exponent_bits}:{window}".encode()).hexdigest()[:16]
+    return os.path.join(directory, f"{digest}.bin")
+
+def fixed_base_table(base, modulus, exponent_bits, window=8, persist=False, directory=DEFAULT_TABLE_DIR):
+    """
+    Shared FixedBaseTable for a base, built once per process
+    persist=True also loads it from (or saves it to) `directory`, so later
+    processes skip the build.
+    """
+    key = (base % modulus, modulus, exponent_bits, window)
+    table = _tables.get(key)
+    if table is not None:
+        return table
+    path = table_path(*key, directory) if persist else None
+    if path and os.path.exists(path):
+        try:
+            table = FixedBaseTable.load(path, base, modulus)
+        except (ValueError, struct.error, OSError):
+            table = None
+    if table is None:
+        table = FixedBaseTable(base, modulus, exponent_bits, window)
+        if path:
+            try:
+                table.save(path)
+            except OSError:
+                pass
+    _tables[key] = table
+    return table
+
+def benchmark(count=256, exponent_bits=32, modulus_bits=4096):
+    """Seconds for naive pow() products vs straus/pippenger on random inputs"""
+    modulus = random.getrandbits(modulus_bits) | (1 << (modulus_bits - 1)) | 1
+    bases = [random.randrange(2, modulus) for _ in range(count)]
+    exponents = [random.getrandbits(exponent_bits) for _ in range(count)]
+    report = {}
+    start = time.perf_counter()
+    expected = 1
+    for base, exponent in zip(bases, exponents):
+        expected = expected * pow(base, exponent, modulus) % modulus
+    report['pow'] = time.perf_counter() - start
+    for name, function in (('straus', straus), ('pippenger', pippenger)):
+        start = time.perf_counter()
+        if function(bases, exponents, modulus) != expected:
+            raise RuntimeError(f"{name} disagrees with pow()")
+        report[name] = time.perf_counter() - start
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-exponentiation benchmark")
+    parser.add_argument('--count', type=int, default=256)
+    parser.add_argument('--exponent-bits', type=int, default=32)
+    parser.add_argument('--modulus-bits', type=int, default=4096)
+    args = parser.parse_args()
+
+    report = benchmark(args.count, args.exponent_bits, args.modulus_bits)
+    for name, seconds in report.items():
+        print(f"{name:<10} {seconds * 1e3:9.2f} ms  ({report['pow'] / seconds:.2f}x)")
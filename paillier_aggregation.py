@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Parallel Homomorphic Aggregation over Encrypted Vectors
+Sums, weighted sums and dot products of an EncryptedVector without building
+one EncryptedNumber per step. Under Paillier, Enc(a) * Enc(b) = Enc(a + b) and
+Enc(a)^w = Enc(w * a) mod n^2, so each chunk of the vector reduces to a single
+ciphertext in a worker process (a product for sums, a Pippenger
+multi-exponentiation for weights), and the chunk results are multiplied
+together as a tree. Every ciphertext in a vector shares one exponent and the
+weights are encoded at one common exponent, so exponent alignment happens
+once, on the final result.
+"""
+
+import os
+import sys
+import json
+import time
+import secrets
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from phe import paillier
+from phe.paillier import EncryptedNumber
+from phe.util import invert, powmod
+from multiexp import HAVE_GMPY2, to_native, multi_exponentiation, product
+from paillier_batch import EncryptedVector, encode_values
+
+TASKS_PER_WORKER = 4
+MAX_CHUNK = 65_536
+
+# (n, n^2, width, buffer) of the vector being aggregated, set once per worker
+# process by the pool initializer. With the fork start method the buffer is
+# inherited from the parent instead of being pickled per task.
+worker_vector = None
+
+def init_worker(n, width, buffer):
+    global worker_vector
+    worker_vector = (n, n * n, width, buffer)
+
+def chunk_ciphertexts(vector, start, stop):
+    _, _, width, buffer = vector
+    view = memoryview(buffer)
+    return [to_native(int.from_bytes(view[offset:offset + width], 'big'))
+            for offset in range(start * width, stop * width, width)]
+
+def sum_chunk(start, stop, vector=None):
+    """Worker task: product of ciphertexts [start, stop) mod n^2"""
+    vector = vector or worker_vector
+    return product(chunk_ciphertexts(vector, start, stop), vector[1])
+
+def weighted_chunk(start, stop, weights, vector=None):
+    """
+    Worker task: prod(c_i ^ w_i) mod n^2 for encoded weights (residues mod n)
+    Negative weights are encoded as n - |w|; they go into a second
+    multi-exponentiation with |w| whose result is inverted once per chunk.
+    """
+    vector = vector or worker_vector
+    n, nsquare = vector[0], vector[1]
+    positive, negative = ([], []), ([], [])
+    for ciphertext, weight in zip(chunk_ciphertexts(vector, start, stop), weights):
+        if weight == 0:
+            continue
+        if weight > n // 2:
+            negative[0].append(ciphertext)
+            negative[1].append(n - weight)
+        else:
+            positive[0].append(ciphertext)
+            positive[1].append(weight)
+    result = multi_exponentiation(*positive, nsquare)
+    if negative[0]:
+        result = result * invert(multi_exponentiation(*negative, nsquare), nsquare) % nsquare
+    return result
+
+class HomomorphicAggregator:
+    """
+    Chunked, multi-process aggregation over one EncryptedVector
+    The pool is bound to the vector (its buffer is handed to the workers once),
+    so create one aggregator per vector and run as many aggregations on it as
+    needed. workers=1 runs everything in the calling process.
+    """
+
+    def __init__(self, vector, workers=None, chunk_size=None):
+        self.vector = vector
+        self.public_key = vector.public_key
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size or max(1, min(MAX_CHUNK, -(-len(vector) // (self.workers * TASKS_PER_WORKER))))
+        self.local_vector = (self.public_key.n, self.public_key.nsquare, vector.width, vector.buffer)
+        self.pool = None
+
+    def start(self):
+        if self.pool is None and self.workers > 1:
+            self.pool = ProcessPoolExecutor(self.workers, initializer=init_worker,
+                                            initargs=(self.public_key.n, self.vector.width, self.vector.buffer))
+        return self
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def chunks(self):
+        return [(start, min(start + self.chunk_size, len(self.vector)))
+                for start in range(0, len(self.vector), self.chunk_size)]
+
+    def run(self, task, extra=None):
+        """task(start, stop[, extra[start:stop]]) over every chunk, tree-reduced mod n^2"""
+        arguments = [(start, stop) if extra is None else (start, stop, extra[start:stop])
+                     for start, stop in self.chunks()]
+        if self.workers > 1:
+            self.start()
+            results = [future.result() for future in [self.pool.submit(task, *args) for args in arguments]]
+        else:
+            results = [task(*args, vector=self.local_vector) for args in arguments]
+        return product(results, self.public_key.nsquare)
+
+    def sum(self):
+        """Encrypted sum of all entries"""
+        if not len(self.vector):
+            return self.public_key.encrypt(0)
+        return EncryptedNumber(self.public_key, self.run(sum_chunk), self.vector.exponent)
+
+    def weighted_sum(self, weights, exponent=None):
+        """
+        Encrypted sum(w_i * x_i) for plaintext weights (ints or floats)
+        Weights share one exponent (0 for ints), so the result's exponent is
+        the vector's plus the weights'; phe aligns it when the result is used.
+        """
+        if len(weights) != len(self.vector):
+            raise ValueError(f"{len(weights)} weights for a vector of {len(self.vector)}")
+        encoded, weight_exponent = encode_values(self.public_key, weights, exponent)
+        return EncryptedNumber(self.public_key, self.run(weighted_chunk, encoded),
+                               self.vector.exponent + weight_exponent)
+
+    def dot(self, plaintexts):
+        """Encrypted inner product with a plaintext vector (same as weighted_sum)"""
+        return self.weighted_sum(plaintexts)
+
+def benchmark_vector(public_key, values, distinct=32):
+    """
+    Vector for timing aggregation only: obfuscators are products of two from a
+    small set, so building 10^5+ entries takes seconds rather than hours.
+    Never use this for real data.
+    """
+    n, nsquare = public_key.n, public_key.nsquare
+    obfuscators = [powmod(secrets.randbelow(n - 1) + 1, n, nsquare) for _ in range(distinct)]
+    width = (nsquare.bit_length() + 7) // 8
+    buffer = bytearray(len(values) * width)
+    for index, value in enumerate(values):
+        r = obfuscators[index % distinct] * obfuscators[(index // distinct) % distinct] % nsquare
+        ciphertext = (n * (value % n) + 1) * r % nsquare
+        buffer[index * width:(index + 1) * width] = ciphertext.to_bytes(width, 'big')
+    return EncryptedVector(public_key, buffer)
+
+def benchmark(key_bits=2048, count=20_000, worker_counts=(1, 2, 4), weight_bits=16):
+    """elements/s for sum and weighted sum per worker count, against phe's object loop"""
+    public_key, private_key = paillier.generate_paillier_keypair(n_length=key_bits)
+    values = [secrets.randbelow(2 ** 20) for _ in range(count)]
+    weights = [secrets.randbelow(2 ** weight_bits) - 2 ** (weight_bits - 1) for _ in range(count)]
+    vector = benchmark_vector(public_key, values)
+    report = {'key_bits': key_bits, 'count': count, 'gmpy2': HAVE_GMPY2, 'cpus': os.cpu_count()}
+
+    sample = min(count, 2000)
+    numbers = [vector[i] for i in range(sample)]
+    start = time.perf_counter()
+    total = numbers[0]
+    for number, weight in zip(numbers[1:], weights[1:sample]):
+        total = total + number * weight
+    report['phe_weighted_elements_per_s'] = sample / (time.perf_counter() - start)
+
+    expected_sum = sum(values)
+    expected_dot = sum(v * w for v, w in zip(values, weights))
+    for workers in worker_counts:
+        with HomomorphicAggregator(vector, workers) as aggregator:
+            aggregator.sum()  # start the pool outside the timing
+            start = time.perf_counter()
+            encrypted_sum = aggregator.sum()
+            sum_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            encrypted_dot = aggregator.weighted_sum(weights)
+            dot_seconds = time.perf_counter() - start
+        if private_key.decrypt(encrypted_sum) != expected_sum or private_key.decrypt(encrypted_dot) != expected_dot:
+            raise RuntimeError("Aggregation result does not decrypt to the expected value")
+        report[f'workers_{workers}'] = {
+            'sum_elements_per_s': count / sum_seconds,
+            'weighted_elements_per_s': count / dot_seconds,
+        }
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel Paillier aggregation benchmark")
+    parser.add_argument('--key-bits', type=int, default=2048)
+    parser.add_argument('--count', type=int, default=20_000)
+    parser.add_argument('--workers', default='1,2,4', help="comma-separated worker counts")
+    parser.add_argument('--weight-bits', type=int, default=16)
+    args = parser.parse_args()
+
+    report = benchmark(args.key_bits, args.count, [int(w) for w in args.workers.split(',')], args.weight_bits)
+    print(f"phe loop: {report['phe_weighted_elements_per_s']:,.0f} weighted elements/s", file=sys.stderr)
+    for key, value in report.items():
+        if key.startswith('workers_'):
+            print(f"{key}: sum {value['sum_elements_per_s']:,.0f}/s, weighted {value['weighted_elements_per_s']:,.0f}/s",
+                  file=sys.stderr)
+    print(json.dumps(report, indent=2))
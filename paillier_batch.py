@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Batched Paillier Encryption for Large Columns
+Paillier encryption is c = (1 + n*m) * r^n mod n^2 (phe uses g = n + 1), and
+the obfuscator r^n mod n^2 is nearly all of the cost. PaillierBatchEncryptor
+computes obfuscators ahead of time in background worker processes and
+spreads the remaining work over a process pool. The result is an
+EncryptedVector: one contiguous buffer of fixed-width big-endian ciphertexts
+with a shared public key and exponent, instead of millions of
+EncryptedNumber objects. decrypt_batch() is the matching key-holder path:
+CRT decryption mod p^2 and q^2 in worker processes, streamed into a NumPy
+array or a generator.
+"""
+
+import os
+import sys
+import json
+import time
+import secrets
+import argparse
+import tracemalloc
+from fractions import Fraction
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from phe import paillier
+from phe.paillier import EncodedNumber, EncryptedNumber
+from phe.util import powmod
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_CHUNK = 256
+
+# CRT constants of the private key, set once per decryption worker process
+worker_private = None
+
+def ciphertext_width(public_key):
+    """Bytes per ciphertext: the byte length of n^2"""
+    return (public_key.nsquare.bit_length() + 7) // 8
+
+def encode_at(public_key, value, exponent):
+    """phe's encoding of value at exactly this exponent (rounded), as a residue mod n"""
+    if isinstance(value, int) and exponent == 0:
+        int_rep = value
+    else:
+        int_rep = round(Fraction(value) * Fraction(EncodedNumber.BASE) ** -exponent)
+    if abs(int_rep) > public_key.max_int:
+        raise ValueError(f"{value!r} does not fit the key at exponent {exponent}")
+    return int_rep % public_key.n
+
+def shared_exponent(public_key, values):
+    """Smallest exponent phe would encode any of the values at (0 when all are ints)"""
+    if all(isinstance(value, int) for value in values):
+        return 0
+    return min(EncodedNumber.encode(public_key, value).exponent for value in values)
+
+def encode_values(public_key, values, exponent=None):
+    """
+    Encode values with one shared exponent (phe's base-16 fixed point)
+    Integers use exponent 0. For floats the default is the smallest exponent
+    any value needs, so every value is encoded exactly as phe would; an
+    explicit exponent rounds every value to that precision instead.
+    """
+    if exponent is None:
+        exponent = shared_exponent(public_key, values)
+    return [encode_at(public_key, value, exponent) for value in values], exponent
+
+def random_obfuscator(n, nsquare):
+    return powmod(secrets.randbelow(n - 1) + 1, n, nsquare)
+
+def obfuscator_chunk(n, count):
+    """Worker task: `count` fresh obfuscators r^n mod n^2"""
+    nsquare = n * n
+    return [random_obfuscator(n, nsquare) for _ in range(count)]
+
+def encrypt_chunk(n, plaintexts, width):
+    """Worker task: encrypt encoded plaintexts, returned packed as fixed-width big-endian bytes"""
+    nsquare = n * n
+    out = bytearray(len(plaintexts) * width)
+    for index, plaintext in enumerate(plaintexts):
+        ciphertext = (n * plaintext + 1) * random_obfuscator(n, nsquare) % nsquare
+        out[index * width:(index + 1) * width] = ciphertext.to_bytes(width, 'big')
+    return bytes(out)
+
+def init_decrypt_worker(p, q, hp, hq, p_inverse):
+    global worker_private
+    n = p * q
+    worker_private = (p, q, p * p, q * q, hp, hq, p_inverse, n, n // 3 - 1)   # max_int as in PaillierPublicKey
+
+def crt_constants(private_key):
+    return (private_key.p, private_key.q, private_key.hp, private_key.hq, private_key.p_inverse)
+
+def decrypt_chunk(packed, width, exponent, constants=None):
+    """
+    Worker task: decrypt and decode packed ciphertexts
+    m_p = L_p(c^(p-1) mod p^2) * hp mod p, likewise for q, then CRT to mod n.
+    Decoding follows phe: residues above n - max_int are negative.
+    """
+    if constants is not None:
+        init_decrypt_worker(*constants)
+    p, q, psquare, qsquare, hp, hq, p_inverse, n, max_int = worker_private
+    scale = EncodedNumber.BASE ** abs(exponent)
+    values = []
+    for offset in range(0, len(packed), width):
+        ciphertext = int.from_bytes(packed[offset:offset + width], 'big')
+        mp = (powmod(ciphertext, p - 1, psquare) - 1) // p * hp % p
+        mq = (powmod(ciphertext, q - 1, qsquare) - 1) // q * hq % q
+        encoding = mp + (mq - mp) * p_inverse % q * p
+        if encoding <= max_int:
+            mantissa = encoding
+        elif encoding >= n - max_int:
+            mantissa = encoding - n
+        else:
+            raise OverflowError('Overflow detected in decrypted number')
+        values.append(mantissa * scale if exponent >= 0 else mantissa / scale)
+    return values
+
+def iter_decrypted_chunks(private_key, vector, workers=None, chunk_size=DEFAULT_CHUNK):
+    """(start index, decoded values) per chunk, in order, with at most 2 chunks per worker in flight"""
+    constants = crt_constants(private_key)
+    width = vector.width
+    starts = range(0, len(vector), chunk_size)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for start in starts:
+            yield start, decrypt_chunk(bytes(vector.buffer[start * width:(start + chunk_size) * width]),
+                                       width, vector.exponent, constants)
+        return
+    with ProcessPoolExecutor(workers, initializer=init_decrypt_worker, initargs=constants) as pool:
+        pending = deque()
+        for start in starts:
+            packed = bytes(vector.buffer[start * width:(start + chunk_size) * width])
+            pending.append((start, pool.submit(decrypt_chunk, packed, width, vector.exponent)))
+            if len(pending) >= 2 * workers:
+                first, future = pending.popleft()
+                yield first, future.result()
+        while pending:
+            first, future = pending.popleft()
+            yield first, future.result()
+
+def iter_decrypt(private_key, vector, workers=None, chunk_size=DEFAULT_CHUNK):
+    """Decrypted values one at a time, without holding the whole result"""
+    for _, values in iter_decrypted_chunks(private_key, vector, workers, chunk_size):
+        yield from values
+
+def decrypt_batch(private_key, vector, workers=None, output='numpy', chunk_size=DEFAULT_CHUNK):
+    """
+    Decrypt an EncryptedVector over a process pool
+    output='numpy' fills an int64 array (float64 for negative exponents,
+    object dtype once a value exceeds int64); 'generator' streams values;
+    'list' returns a plain list.
+    """
+    if private_key.public_key != vector.public_key:
+        raise ValueError("Private key does not match the vector's public key")
+    if output == 'generator':
+        return iter_decrypt(private_key, vector, workers, chunk_size)
+    if output == 'list':
+        return list(iter_decrypt(private_key, vector, workers, chunk_size))
+    if output != 'numpy':
+        raise ValueError(f"Unknown output {output!r}; use 'numpy', 'list' or 'generator'")
+    if np is None:
+        raise RuntimeError("output='numpy' needs numpy installed")
+    out = np.empty(len(vector), dtype=np.float64 if vector.exponent < 0 else np.int64)
+    for start, values in iter_decrypted_chunks(private_key, vector, workers, chunk_size):
+        try:
+            out[start:start + len(values)] = values
+        except OverflowError:
+            out = out.astype(object)
+            out[start:start + len(values)] = values
+    return out
+
+class EncryptedVector:
+    """
+    Paillier ciphertexts packed back to back in one buffer
+    All entries share the public key and the exponent. Indexing returns a
+    phe EncryptedNumber, so single values still work with the phe API.
+    """
+
+    def __init__(self, public_key, buffer, exponent=0):
+        self.public_key = public_key
+        self.exponent = exponent
+        self.width = ciphertext_width(public_key)
+        if len(buffer) % self.width:
+            raise ValueError(f"Buffer of {len(buffer)} bytes is not a multiple of {self.width}")
+        self.buffer = buffer
+
+    @classmethod
+    def from_encrypted_numbers(cls, numbers):
+        """Pack phe EncryptedNumbers (same public key and exponent) into a vector"""
+        numbers = list(numbers)
+        if not numbers:
+            raise ValueError("Cannot build a vector without a public key from an empty list")
+        public_key, exponent = numbers[0].public_key, numbers[0].exponent
+        width = ciphertext_width(public_key)
+        buffer = bytearray(len(numbers) * width)
+        for index, number in enumerate(numbers):
+            if number.public_key != public_key or number.exponent != exponent:
+                raise ValueError("All numbers must share the public key and exponent")
+            buffer[index * width:(index + 1) * width] = number.ciphertext(be_secure=False).to_bytes(width, 'big')
+        return cls(public_key, buffer, exponent)
+
+    def __len__(self):
+        return len(self.buffer) // self.width
+
+    def ciphertext(self, index):
+        """Raw ciphertext integer at index"""
+        if not 0 <= index < len(self):
+            raise IndexError("vector index out of range")
+        return int.from_bytes(self.buffer[index * self.width:(index + 1) * self.width], 'big')
+
+    def ciphertexts(self, start=0, stop=None):
+        """Raw ciphertext integers, decoded one at a time"""
+        view = memoryview(self.buffer)
+        width = self.width
+        for offset in range(start * width, (len(self) if stop is None else stop) * width, width):
+            yield int.from_bytes(view[offset:offset + width], 'big')
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        return EncryptedNumber(self.public_key, self.ciphertext(index), self.exponent)
+
+    def __iter__(self):
+        for ciphertext in self.ciphertexts():
+            yield EncryptedNumber(self.public_key, ciphertext, self.exponent)
+
+    @property
+    def nbytes(self):
+        return len(self.buffer)
+
+class PaillierBatchEncryptor:
+    """
+    Encrypts whole columns with a process pool and precomputed obfuscators
+    Call precompute(count) while idle: worker processes produce obfuscators
+    in the background, and later encrypt_batch() calls consume them so the
+    online cost is one multiplication per value.
+    """
+
+    def __init__(self, public_key, workers=None, chunk_size=DEFAULT_CHUNK):
+        self.public_key = public_key
+        self.n = public_key.n
+        self.nsquare = public_key.nsquare
+        self.width = ciphertext_width(public_key)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.pool = None
+        self.pending = deque()   # futures of obfuscator chunks
+        self.ready = deque()     # obfuscators ready for use
+        self.encrypted = 0
+        self.seconds = 0.0
+
+    def start(self):
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers)
+        return self
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def precompute(self, count):
+        """Queue background generation of `count` obfuscators; returns immediately"""
+        self.start()
+        while count > 0:
+            size = min(count, self.chunk_size)
+            self.pending.append(self.pool.submit(obfuscator_chunk, self.n, size))
+            count -= size
+
+    def collect(self, wait=False):
+        """Move finished obfuscator chunks into the ready queue; returns how many are ready"""
+        while self.pending and (wait or self.pending[0].done()):
+            self.ready.extend(self.pending.popleft().result())
+        return len(self.ready)
+
+    def encrypt_batch(self, values, exponent=None):
+        """Encrypt a sequence of ints/floats into an EncryptedVector"""
+        start = time.perf_counter()
+        plaintexts, exponent = encode_values(self.public_key, values, exponent)
+        buffer = bytearray(len(plaintexts) * self.width)
+        n, nsquare, width = self.n, self.nsquare, self.width
+
+        # Precomputed obfuscators first: one multiplication per value, done here
+        self.collect()
+        offline = min(len(plaintexts), len(self.ready))
+        for index in range(offline):
+            ciphertext = (n * plaintexts[index] + 1) * self.ready.popleft() % nsquare
+            buffer[index * width:(index + 1) * width] = ciphertext.to_bytes(width, 'big')
+
+        # The rest is spread over the pool in chunks
+        remaining = len(plaintexts) - offline
+        if remaining:
+            chunk = max(1, min(self.chunk_size, -(-remaining // self.workers)))
+            self.start()
+            futures = [(offset, self.pool.submit(encrypt_chunk, n, plaintexts[offset:offset + chunk], width))
+                       for offset in range(offline, len(plaintexts), chunk)]
+            for offset, future in futures:
+                packed = future.result()
+                buffer[offset * width:offset * width + len(packed)] = packed
+        self.encrypted += len(plaintexts)
+        self.seconds += time.perf_counter() - start
+        return EncryptedVector(self.public_key, buffer, exponent)
+
+    def stats(self):
+        return {
+            'encrypted': self.encrypted,
+            'values_per_s': self.encrypted / self.seconds if self.seconds else 0.0,
+            'obfuscators_ready': len(self.ready),
+            'obfuscator_chunks_pending': len(self.pending),
+            'bytes_per_ciphertext': self.width,
+        }
+
+def encrypt_batch(public_key, values, workers=None, exponent=None):
+    """One-shot batch encryption with a temporary process pool"""
+    with PaillierBatchEncryptor(public_key, workers) as encryptor:
+        return encryptor.encrypt_batch(values, exponent)
+
+def phe_memory_per_ciphertext(public_key, sample=200):
+    """Bytes held per value by a Python list of phe EncryptedNumber objects"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    numbers = [public_key.encrypt(i) for i in range(sample)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    used = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del numbers
+    return used / sample
+
+def benchmark(key_bits=2048, count=2000, workers=None):
+    """values/s for phe's per-item encrypt, the process pool, and precomputed obfuscators"""
+    public_key, private_key = paillier.generate_paillier_keypair(n_length=key_bits)
+    values = [secrets.randbelow(2 ** 32) - 2 ** 31 for _ in range(count)]
+    report = {'key_bits': key_bits, 'count': count}
+
+    sample = values[:max(1, count // 10)]
+    start = time.perf_counter()
+    for value in sample:
+        public_key.encrypt(value)
+    report['phe_encrypt_values_per_s'] = len(sample) / (time.perf_counter() - start)
+
+    with PaillierBatchEncryptor(public_key, workers) as encryptor:
+        report['workers'] = encryptor.workers
+        start = time.perf_counter()
+        vector = encryptor.encrypt_batch(values)
+        report['pool_values_per_s'] = count / (time.perf_counter() - start)
+
+        encryptor.precompute(count)
+        start = time.perf_counter()
+        encryptor.collect(wait=True)
+        report['precompute_values_per_s'] = count / (time.perf_counter() - start)
+        start = time.perf_counter()
+        encryptor.encrypt_batch(values)
+        report['precomputed_online_values_per_s'] = count / (time.perf_counter() - start)
+
+    report['vector_bytes_per_ciphertext'] = vector.nbytes / len(vector)
+    report['phe_bytes_per_ciphertext'] = phe_memory_per_ciphertext(public_key)
+    for index in (0, count // 2, count - 1):
+        if private_key.decrypt(vector[index]) != values[index]:
+            raise RuntimeError("Batch encryption round trip failed")
+    return report
+
+def benchmark_decrypt(key_bits=(2048, 3072), count=200, workers=None):
+    """values/s for phe's per-item decrypt against decrypt_batch, per key size"""
+    report = {}
+    for bits in key_bits:
+        public_key, private_key = paillier.generate_paillier_keypair(n_length=bits)
+        values = [secrets.randbelow(2 ** 32) - 2 ** 31 for _ in range(count)]
+        vector = encrypt_batch(public_key, values, workers)
+        start = time.perf_counter()
+        expected = [private_key.decrypt(number) for number in vector]
+        per_item = count / (time.perf_counter() - start)
+        start = time.perf_counter()
+        decrypted = decrypt_batch(private_key, vector, workers)
+        batch = count / (time.perf_counter() - start)
+        if decrypted.tolist() != expected or expected != values:
+            raise RuntimeError("Batch decryption disagrees with phe")
+        report[bits] = {'phe_decrypt_values_per_s': per_item, 'batch_values_per_s': batch, 'speedup': batch / per_item}
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batched Paillier encryption benchmark")
+    parser.add_argument('--key-bits', type=int, default=2048)
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--decrypt', metavar='BITS', help="benchmark batch decryption at these key sizes, e.g. 2048,3072")
+    args = parser.parse_args()
+
+    if args.decrypt:
+        report = benchmark_decrypt([int(bits) for bits in args.decrypt.split(',')], args.count, args.workers)
+        for bits, result in report.items():
+            print(f"{bits}-bit: phe {result['phe_decrypt_values_per_s']:,.0f} values/s, "
+                  f"batch {result['batch_values_per_s']:,.0f} values/s ({result['speedup']:.2f}x)", file=sys.stderr)
+        print(json.dumps(report, indent=2))
+        sys.exit(0)
+
+    report = benchmark(args.key_bits, args.count, args.workers)
+    print(f"phe {report['phe_encrypt_values_per_s']:,.0f} values/s, pool {report['pool_values_per_s']:,.0f} values/s, "
+          f"precomputed {report['precomputed_online_values_per_s']:,.0f} values/s; "
+          f"{report['vector_bytes_per_ciphertext']:.0f} vs {report['phe_bytes_per_ciphertext']:.0f} bytes/value",
+          file=sys.stderr)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Compact Binary Storage and Streaming for Encrypted Paillier Vectors
+A fixed-width binary format for EncryptedVector payloads:
+
+    magic "IASP" | version | exponent (int32) | n length | width | count (uint64) | n | ciphertexts
+
+Each ciphertext is stored big-endian in exactly `width` bytes (the byte
+length of n^2), so entry i sits at a computable offset. Files are read
+through mmap one chunk at a time, VectorWriter appends chunks as they are
+produced, and aggregate_file() sums a file larger than RAM chunk by chunk
+across worker processes.
+"""
+
+import io
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import operator
+import secrets
+import argparse
+import functools
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from phe import paillier
+from phe.paillier import EncryptedNumber
+from multiexp import product
+from paillier_batch import EncryptedVector, PaillierBatchEncryptor, ciphertext_width, encode_values, shared_exponent
+from paillier_aggregation import benchmark_vector, sum_chunk, weighted_chunk
+
+MAGIC = b"IASP"
+VERSION = 1
+HEADER = struct.Struct('!4sBiIIQ')
+UNKNOWN_COUNT = 2 ** 64 - 1   # written by non-seekable streams; read until EOF
+DEFAULT_CHUNK = 4096
+
+class VectorHeader:
+    """Public key, exponent and layout of a stored vector"""
+
+    def __init__(self, public_key, exponent=0, count=UNKNOWN_COUNT):
+        self.public_key = public_key
+        self.exponent = exponent
+        self.count = count
+        self.width = ciphertext_width(public_key)
+        n = public_key.n
+        self.n_bytes = n.to_bytes((n.bit_length() + 7) // 8, 'big')
+
+    @property
+    def encoded(self):
+        return HEADER.pack(MAGIC, VERSION, self.exponent, len(self.n_bytes), self.width, self.count) + self.n_bytes
+
+    @property
+    def size(self):
+        return HEADER.size + len(self.n_bytes)
+
+    @classmethod
+    def parse(cls, data):
+        """Header from the first bytes of a payload (needs at least HEADER.size + len(n))"""
+        if len(data) < HEADER.size:
+            raise ValueError("Truncated Paillier vector header")
+        magic, version, exponent, n_length, width, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a Paillier vector payload (bad magic or version)")
+        if len(data) < HEADER.size + n_length:
+            raise ValueError("Truncated Paillier vector header")
+        n = int.from_bytes(data[HEADER.size:HEADER.size + n_length], 'big')
+        header = cls(paillier.PaillierPublicKey(n), exponent, count)
+        if header.width != width:
+            raise ValueError(f"Ciphertext width {width} does not match n (expected {header.width})")
+        return header
+
+    @classmethod
+    def read_from(cls, reader):
+        prefix = reader.read(HEADER.size)
+        if len(prefix) == HEADER.size:
+            prefix += reader.read(HEADER.unpack(prefix)[3])
+        return cls.parse(prefix)
+
+class VectorWriter:
+    """
+    Appends ciphertext chunks to a file or stream
+    The count is patched into the header on close when the target is
+    seekable; pipes and sockets keep UNKNOWN_COUNT and readers go to EOF.
+    """
+
+    def __init__(self, target, public_key, exponent=0):
+        self.owns_file = isinstance(target, (str, os.PathLike))
+        self.file = open(target, 'wb') if self.owns_file else target
+        self.header = VectorHeader(public_key, exponent)
+        self.count = 0
+        self.file.write(self.header.encoded)
+
+    def write(self, vector):
+        """Append an EncryptedVector (or a list of EncryptedNumbers) with the same key and exponent"""
+        if not isinstance(vector, EncryptedVector):
+            vector = EncryptedVector.from_encrypted_numbers(vector)
+        if vector.public_key != self.header.public_key or vector.exponent != self.header.exponent:
+            raise ValueError("Vector does not match the writer's public key and exponent")
+        self.file.write(vector.buffer)
+        self.count += len(vector)
+
+    def close(self):
+        if self.file is None:
+            return
+        try:
+            if self.file.seekable():
+                position = self.file.tell()
+                self.header.count = self.count
+                self.file.seek(0)
+                self.file.write(self.header.encoded)
+                self.file.seek(position)
+            self.file.flush()
+        except (io.UnsupportedOperation, OSError):
+            pass
+        if self.owns_file:
+            self.file.close()
+        self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class VectorFile:
+    """
+    Memory-mapped reader for a stored vector
+    vector(start, stop) copies only that slice out of the mapping, so a file
+    much larger than RAM can be walked chunk by chunk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.header = VectorHeader.read_from(self.file)
+        self.mapped = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.public_key = self.header.public_key
+        self.exponent = self.header.exponent
+        self.width = self.header.width
+        self.data_offset = self.header.size
+        stored = (len(self.mapped) - self.data_offset) // self.width
+        if self.header.count == UNKNOWN_COUNT:
+            self.count = stored
+        elif self.header.count > stored:
+            raise ValueError(f"File holds {stored} ciphertexts, header says {self.header.count}")
+        else:
+            self.count = self.header.count
+
+    def __len__(self):
+        return self.count
+
+    def vector(self, start=0, stop=None):
+        """EncryptedVector for entries [start, stop)"""
+        stop = self.count if stop is None else min(stop, self.count)
+        begin = self.data_offset + start * self.width
+        return EncryptedVector(self.public_key, self.mapped[begin:self.data_offset + stop * self.width], self.exponent)
+
+    def chunks(self, chunk_size=DEFAULT_CHUNK):
+        """(start index, EncryptedVector) for consecutive chunks"""
+        for start in range(0, self.count, chunk_size):
+            yield start, self.vector(start, start + chunk_size)
+
+    def close(self):
+        self.mapped.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def save_vector(path, vector):
+    with VectorWriter(path, vector.public_key, vector.exponent) as writer:
+        writer.write(vector)
+
+def load_vector(path):
+    with VectorFile(path) as stored:
+        return stored.vector()
+
+def iter_stream(reader, chunk_size=DEFAULT_CHUNK):
+    """
+    EncryptedVector chunks from a non-seekable stream (pipe, socket file)
+    Stops after the header's count, or at EOF for UNKNOWN_COUNT streams.
+    """
+    header = VectorHeader.read_from(reader)
+    remaining = header.count
+    while remaining:
+        wanted = min(chunk_size, remaining) * header.width
+        data = bytearray()
+        while len(data) < wanted:
+            piece = reader.read(wanted - len(data))
+            if not piece:
+                break
+            data += piece
+        if len(data) % header.width:
+            raise ValueError("Stream ended inside a ciphertext")
+        if not data:
+            if header.count != UNKNOWN_COUNT:
+                raise ValueError(f"Stream ended {remaining} ciphertexts early")
+            return
+        if header.count != UNKNOWN_COUNT:
+            remaining -= len(data) // header.width
+        yield EncryptedVector(header.public_key, data, header.exponent)
+        if len(data) < wanted:
+            if header.count != UNKNOWN_COUNT and remaining:
+                raise ValueError(f"Stream ended {remaining} ciphertexts early")
+            return
+
+def encrypt_to_file(target, public_key, values, exponent=None, workers=None, chunk_size=DEFAULT_CHUNK):
+    """
+    Encrypt an iterable of values chunk by chunk straight into a file or stream
+    Every chunk must share the file's exponent. By default it is inferred
+    from the first chunk as phe would (0 for ints); a later chunk that needs
+    more precision raises ValueError instead of being rounded, so pass an
+    explicit exponent (e.g. -8 for fixed-point floats) for mixed data.
+    Returns the number of values written.
+    """
+    values = iter(values)
+    chunk = list(itertools.islice(values, chunk_size))
+    inferred = exponent is None
+    if inferred:
+        exponent = shared_exponent(public_key, chunk)
+    with PaillierBatchEncryptor(public_key, workers) as encryptor, \
+            VectorWriter(target, public_key, exponent) as writer:
+        while chunk:
+            if inferred and shared_exponent(public_key, chunk) < exponent:
+                raise ValueError(f"Values after entry {writer.count} need an exponent below {exponent}; "
+                                 "pass an explicit exponent")
+            writer.write(encryptor.encrypt_batch(chunk, exponent))
+            chunk = list(itertools.islice(values, chunk_size))
+        return writer.count
+
+def aggregate_file_chunk(path, data_offset, n, width, start, stop, weights=None):
+    """Worker task: sum or weighted sum of entries [start, stop) read from the file's mapping"""
+    with open(path, 'rb') as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        buffer = mapped[data_offset + start * width:data_offset + stop * width]
+    vector = (n, n * n, width, buffer)
+    if weights is None:
+        return sum_chunk(0, stop - start, vector=vector)
+    return weighted_chunk(0, stop - start, weights, vector=vector)
+
+def aggregate_file(path, weights=None, weight_exponent=None, workers=None, chunk_size=DEFAULT_CHUNK):
+    """
+    Encrypted sum (or weighted sum) of a stored vector without loading it
+    Workers map the file themselves and each task reads one chunk. Weights
+    may be any iterable; they are consumed and encoded one chunk at a time,
+    each chunk at the exponent phe would pick unless weight_exponent is given
+    (which rounds every weight to it). Chunk results with different
+    exponents are aligned by phe when they are added at the end.
+    """
+    with VectorFile(path) as stored:
+        public_key, exponent, count = stored.public_key, stored.exponent, stored.count
+        data_offset, width = stored.data_offset, stored.width
+    weights = None if weights is None else iter(weights)
+    workers = workers or os.cpu_count() or 1
+    task = (os.fspath(path), data_offset, public_key.n, width)
+    results = {}   # result exponent -> chunk ciphertexts
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for start in range(0, count, chunk_size):
+            stop = min(start + chunk_size, count)
+            encoded, chunk_exponent = None, exponent
+            if weights is not None:
+                chunk_weights = list(itertools.islice(weights, stop - start))
+                if len(chunk_weights) != stop - start:
+                    raise ValueError("Fewer weights than stored ciphertexts")
+                encoded, encoded_exponent = encode_values(public_key, chunk_weights, weight_exponent)
+                chunk_exponent += encoded_exponent
+            pending.append((chunk_exponent, pool.submit(aggregate_file_chunk, *task, start, stop, encoded)))
+            if len(pending) >= 2 * workers:
+                chunk_exponent, future = pending.popleft()
+                results.setdefault(chunk_exponent, []).append(future.result())
+        for chunk_exponent, future in pending:
+            results.setdefault(chunk_exponent, []).append(future.result())
+    totals = [EncryptedNumber(public_key, product(ciphertexts, public_key.nsquare), chunk_exponent)
+              for chunk_exponent, ciphertexts in results.items()]
+    if not totals:
+        return EncryptedNumber(public_key, 1, exponent)
+    return functools.reduce(operator.add, totals)
+
+def benchmark(path, key_bits=2048, count=2000, workers=None):
+    """Size and write/read time of the binary format against JSON of decimal strings"""
+    public_key, private_key = paillier.generate_paillier_keypair(n_length=key_bits)
+    values = [secrets.randbelow(2 ** 32) for _ in range(count)]
+    vector = benchmark_vector(public_key, values)
+    report = {'key_bits': key_bits, 'count': count}
+
+    start = time.perf_counter()
+    save_vector(path, vector)
+    report['binary_write_s'] = time.perf_counter() - start
+    report['binary_bytes'] = os.path.getsize(path)
+    start = time.perf_counter()
+    with VectorFile(path) as stored:
+        parsed = [number.ciphertext(be_secure=False) for _, chunk in stored.chunks() for number in chunk]
+    report['binary_read_s'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    document = json.dumps({'n': str(public_key.n), 'exponent': vector.exponent,
+                           'ciphertexts': [str(c) for c in vector.ciphertexts()]})
+    report['json_write_s'] = time.perf_counter() - start
+    report['json_bytes'] = len(document)
+    start = time.perf_counter()
+    from_json = [int(c) for c in json.loads(document)['ciphertexts']]
+    report['json_read_s'] = time.perf_counter() - start
+    if parsed != from_json:
+        raise RuntimeError("Binary and JSON payloads disagree")
+
+    start = time.perf_counter()
+    total = aggregate_file(path, workers=workers)
+    report['file_sum_values_per_s'] = count / (time.perf_counter() - start)
+    if private_key.decrypt(total) != sum(values):
+        raise RuntimeError("File aggregation returned the wrong sum")
+    os.remove(path)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Binary Paillier vector format benchmark")
+    parser.add_argument('--path', default='paillier_vector.bin')
+    parser.add_argument('--key-bits', type=int, default=2048)
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    report = benchmark(args.path, args.key_bits, args.count, args.workers)
+    print(f"binary {report['binary_bytes']:,} bytes (read {report['binary_read_s'] * 1e3:.1f} ms), "
+          f"JSON {report['json_bytes']:,} bytes (parse {report['json_read_s'] * 1e3:.1f} ms)", file=sys.stderr)
+    print(json.dumps(report, indent=2))
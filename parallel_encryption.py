@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Multi-core AEAD Encryption for Large Buffers and Files
+Splits the input into independently nonced segments (the same format as
+stream_encryption.py, so either side can decrypt the other's output) and
+seals them concurrently. cryptography releases the GIL inside the cipher, so
+a thread pool scales across cores; files can also be handled by a process
+pool where every worker maps the input and output files itself. Segments are
+encrypted straight into a preallocated output buffer or mmap, with no
+intermediate copies.
+"""
+
+import io
+import os
+import sys
+import mmap
+import time
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from cryptography.exceptions import InvalidTag
+from perf_stats import confidence_interval
+from stream_encryption import (
+    ALGORITHMS, TAG_SIZE, HEADER_PREFIX, SALT_SIZE, NONCE_PREFIX_SIZE,
+    StreamHeader, StreamDecryptionError, resolve_key, seal_into, open_into,
+)
+
+# Larger than the streaming default: fewer tasks and nonces per gigabyte
+DEFAULT_PARALLEL_SEGMENT = 1024 * 1024
+TASKS_PER_WORKER = 4
+
+def default_workers():
+    return os.cpu_count() or 1
+
+def task_ranges(count, workers):
+    """Split segment indices 0..count into contiguous ranges, a few per worker for load balance"""
+    tasks = max(1, min(count, workers * TASKS_PER_WORKER))
+    step, extra = divmod(count, tasks)
+    ranges = []
+    start = 0
+    for i in range(tasks):
+        stop = start + step + (1 if i < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+def segment_count(plaintext_size, segment_size):
+    return max(1, -(-plaintext_size // segment_size))
+
+def parse_layout(data):
+    """Header, segment count and plaintext size of an encrypted buffer"""
+    view = memoryview(data)
+    prefix = bytes(view[:HEADER_PREFIX.size])
+    if len(prefix) < HEADER_PREFIX.size:
+        raise StreamDecryptionError("Buffer ends inside the header")
+    key_id_len = prefix[-1]
+    header_size = HEADER_PREFIX.size + key_id_len + SALT_SIZE + NONCE_PREFIX_SIZE
+    header = StreamHeader.read_from(io.BytesIO(bytes(view[:header_size])))
+    body = len(view) - header_size
+    sealed_segment = header.segment_size + TAG_SIZE
+    count = max(1, -(-body // sealed_segment))
+    if body - (count - 1) * sealed_segment < TAG_SIZE:
+        raise StreamDecryptionError(f"Segment {count - 1} is truncated")
+    return header, count, body - count * TAG_SIZE
+
+def seal_segments(cipher, header, src, dst, start, stop, count):
+    """Encrypt segments start..stop of src into their slots in dst"""
+    size = header.segment_size
+    offset = len(header.encoded)
+    for index in range(start, stop):
+        chunk = src[index * size:(index + 1) * size]
+        begin = offset + index * (size + TAG_SIZE)
+        seal_into(cipher, header.nonce(index, index == count - 1), chunk, header.encoded,
+                  dst[begin:begin + len(chunk) + TAG_SIZE])
+
+def open_segments(cipher, header, src, dst, start, stop, count):
+    """Decrypt segments start..stop of src into their slots in dst"""
+    size = header.segment_size
+    offset = len(header.encoded)
+    for index in range(start, stop):
+        begin = offset + index * (size + TAG_SIZE)
+        sealed = src[begin:begin + size + TAG_SIZE]
+        try:
+            open_into(cipher, header.nonce(index, index == count - 1), sealed, header.encoded,
+                      dst[index * size:index * size + len(sealed) - TAG_SIZE])
+        except InvalidTag:
+            raise StreamDecryptionError(
+                f"Segment {index} failed authentication (tampered, reordered or truncated stream)")
+
+def run_threaded(function, header, stream_key, src, dst, count, workers):
+    ranges = task_ranges(count, workers)
+    cipher_class = ALGORITHMS[header.algorithm][1]
+    if workers == 1 or len(ranges) == 1:
+        function(cipher_class(stream_key), header, src, dst, 0, count, count)
+        return
+    with ThreadPoolExecutor(workers) as pool:
+        # One cipher object per task keeps workers from sharing state
+        futures = [pool.submit(function, cipher_class(stream_key), header, src, dst, start, stop, count)
+                   for start, stop in ranges]
+        for future in futures:
+            future.result()
+
+def encrypt_buffer(data, key, key_id=b"", algorithm='AES-GCM', segment_size=DEFAULT_PARALLEL_SEGMENT,
+                   workers=None, out=None):
+    """
+    Encrypt a bytes-like object (bytes, bytearray, mmap) across a thread pool
+    Writes into out when given (it must be exactly the encrypted size, see
+    encrypted_size) and returns the output buffer.
+    """
+    workers = workers or default_workers()
+    header = StreamHeader(algorithm, segment_size, key_id)
+    src = memoryview(data)
+    size = header.ciphertext_size(len(src))
+    if out is None:
+        out = bytearray(size)
+    dst = memoryview(out)
+    if len(dst) != size:
+        raise ValueError(f"Output buffer must be {size} bytes, got {len(dst)}")
+    dst[:len(header.encoded)] = header.encoded
+    run_threaded(seal_segments, header, header.stream_key(key), src, dst,
+                 segment_count(len(src), segment_size), workers)
+    return out
+
+def decrypt_buffer(data, key, workers=None, out=None):
+    """Decrypt a buffer produced by encrypt_buffer or encrypt_stream across a thread pool"""
+    workers = workers or default_workers()
+    header, count, size = parse_layout(data)
+    if out is None:
+        out = bytearray(size)
+    dst = memoryview(out)
+    if len(dst) != size:
+        raise ValueError(f"Output buffer must be {size} bytes, got {len(dst)}")
+    run_threaded(open_segments, header, header.stream_key(resolve_key(key, header.key_id)),
+                 memoryview(data), dst, count, workers)
+    return out
+
+def encrypted_size(plaintext_size, key_id=b"", segment_size=DEFAULT_PARALLEL_SEGMENT):
+    """Size of the buffer encrypt_buffer needs for a plaintext of the given size"""
+    return StreamHeader('AES-GCM', segment_size, key_id).ciphertext_size(plaintext_size)
+
+def map_file(f, size, writable):
+    """mmap of an open file; zero-length files cannot be mapped, so use an empty buffer"""
+    if size == 0:
+        return bytearray(0)
+    access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+    return mmap.mmap(f.fileno(), size, access=access)
+
+def process_segments(decrypt, src_path, dst_path, header, stream_key, start, stop, count):
+    """Process-pool task: map both files and handle one range of segments"""
+    function = open_segments if decrypt else seal_segments
+    cipher = ALGORITHMS[header.algorithm][1](stream_key)
+    with open(src_path, 'rb') as src_file, open(dst_path, 'r+b') as dst_file:
+        src_map = map_file(src_file, os.fstat(src_file.fileno()).st_size, False)
+        dst_map = map_file(dst_file, os.fstat(dst_file.fileno()).st_size, True)
+        try:
+            with memoryview(src_map) as src, memoryview(dst_map) as dst:
+                function(cipher, header, src, dst, start, stop, count)
+        finally:
+            if isinstance(src_map, mmap.mmap):
+                src_map.close()
+            if isinstance(dst_map, mmap.mmap):
+                dst_map.flush()
+                dst_map.close()
+
+def transform_file(decrypt, src_path, dst_path, key, key_id, algorithm, segment_size, workers, processes):
+    with open(src_path, 'rb') as src_file:
+        src_size = os.fstat(src_file.fileno()).st_size
+        src_map = map_file(src_file, src_size, False)
+        try:
+            if decrypt:
+                header, count, dst_size = parse_layout(src_map)
+                stream_key = header.stream_key(resolve_key(key, header.key_id))
+            else:
+                header = StreamHeader(algorithm, segment_size, key_id)
+                count = segment_count(src_size, segment_size)
+                dst_size = header.ciphertext_size(src_size)
+                stream_key = header.stream_key(key)
+            with open(dst_path, 'w+b') as dst_file:
+                dst_file.truncate(dst_size)
+                if not decrypt:
+                    dst_file.write(header.encoded)
+                    dst_file.flush()
+                if processes:
+                    ranges = task_ranges(count, workers)
+                    with ProcessPoolExecutor(workers) as pool:
+                        futures = [pool.submit(process_segments, decrypt, src_path, dst_path,
+                                               header, stream_key, start, stop, count)
+                                   for start, stop in ranges]
+                        for future in futures:
+                            future.result()
+                else:
+                    dst_map = map_file(dst_file, dst_size, True)
+                    try:
+                        with memoryview(src_map) as src, memoryview(dst_map) as dst:
+                            run_threaded(open_segments if decrypt else seal_segments,
+                                         header, stream_key, src, dst, count, workers)
+                    finally:
+                        if isinstance(dst_map, mmap.mmap):
+                            dst_map.flush()
+                            dst_map.close()
+        finally:
+            if isinstance(src_map, mmap.mmap):
+                src_map.close()
+    return dst_size
+
+def encrypt_file(src_path, dst_path, key, key_id=b"", algorithm='AES-GCM',
+                 segment_size=DEFAULT_PARALLEL_SEGMENT, workers=None, processes=False):
+    """Encrypt a file through memory maps using threads (or processes); returns the output size"""
+    return transform_file(False, src_path, dst_path, key, key_id, algorithm, segment_size,
+                          workers or default_workers(), processes)
+
+def decrypt_file(src_path, dst_path, key, workers=None, processes=False):
+    """Decrypt a file produced by encrypt_file or encrypt_stream; returns the plaintext size"""
+    return transform_file(True, src_path, dst_path, key, b"", None, None,
+                          workers or default_workers(), processes)
+
+def benchmark(size=256 * 1024 * 1024, core_counts=None, algorithm='AES-GCM',
+              segment_size=DEFAULT_PARALLEL_SEGMENT, repeats=5):
+    """GB/s for encrypt and decrypt at each worker count, using preallocated buffers"""
+    if core_counts is None:
+        core_counts = sorted({1, 2, 4, default_workers()})
+    key = os.urandom(32)
+    plaintext = bytearray(os.urandom(1024 * 1024)) * (size // (1024 * 1024) or 1)
+    sealed = bytearray(encrypted_size(len(plaintext), segment_size=segment_size))
+    opened = bytearray(len(plaintext))
+    results = {'algorithm': algorithm, 'bytes': len(plaintext), 'segment_size': segment_size,
+               'cpu_count': default_workers(), 'workers': {}}
+    for workers in core_counts:
+        rates = {'encrypt': [], 'decrypt': []}
+        for _ in range(repeats):
+            start = time.perf_counter()
+            encrypt_buffer(plaintext, key, algorithm=algorithm, segment_size=segment_size,
+                           workers=workers, out=sealed)
+            rates['encrypt'].append(len(plaintext) / (time.perf_counter() - start) / 1e9)
+            start = time.perf_counter()
+            decrypt_buffer(sealed, key, workers=workers, out=opened)
+            rates['decrypt'].append(len(plaintext) / (time.perf_counter() - start) / 1e9)
+        if opened != plaintext:
+            raise RuntimeError("Round trip mismatch")
+        entry = {}
+        for operation, samples in rates.items():
+            mean, half_width = confidence_interval(samples)
+            entry[operation] = {'gb_per_s': mean, 'ci95': half_width, 'best': max(samples)}
+        results['workers'][workers] = entry
+        print(f"{workers:>3} workers: encrypt {entry['encrypt']['gb_per_s']:.2f} GB/s, "
+              f"decrypt {entry['decrypt']['gb_per_s']:.2f} GB/s", file=sys.stderr)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-core AEAD encryption")
+    parser.add_argument('command', choices=['encrypt', 'decrypt', 'benchmark'])
+    parser.add_argument('--key-file', help="raw 32-byte key (see stream_encryption.py keygen)")
+    parser.add_argument('--key-id', default="")
+    parser.add_argument('--algorithm', choices=sorted(ALGORITHMS), default='AES-GCM')
+    parser.add_argument('--segment-size', type=int, default=DEFAULT_PARALLEL_SEGMENT)
+    parser.add_argument('--workers', type=int, default=None, help="threads/processes (default: all cores)")
+    parser.add_argument('--processes', action='store_true', help="use a process pool instead of threads")
+    parser.add_argument('--input')
+    parser.add_argument('--output')
+    parser.add_argument('--size-mb', type=int, default=256, help="benchmark buffer size")
+    parser.add_argument('--cores', help="comma-separated worker counts to benchmark (default 1,2,4,N)")
+    args = parser.parse_args()
+
+    if args.command == 'benchmark':
+        cores = [int(c) for c in args.cores.split(',')] if args.cores else None
+        print(json.dumps(benchmark(args.size_mb * 1024 * 1024, cores, args.algorithm, args.segment_size), indent=2))
+        return
+
+    if not (args.key_file and args.input and args.output):
+        parser.error("encrypt/decrypt need --key-file, --input and --output")
+    with open(args.key_file, 'rb') as f:
+        key = f.read()
+    start = time.perf_counter()
+    try:
+        if args.command == 'encrypt':
+            size = encrypt_file(args.input, args.output, key, args.key_id.encode(), args.algorithm,
+                                args.segment_size, args.workers, args.processes)
+        else:
+            size = decrypt_file(args.input, args.output, key, args.workers, args.processes)
+    except StreamDecryptionError as e:
+        print(f"Decryption failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+    print(f"{args.command.capitalize()}ed {size} bytes in {elapsed:.3f}s "
+          f"({size / elapsed / 1e9:.2f} GB/s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Small statistics helpers shared by the benchmark and load tools
+"""
+
+import math
+import statistics
+
+# Student t critical values (two-sided 95%) by degrees of freedom
+T_95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365,
+        8: 2.306, 9: 2.262, 10: 2.228, 15: 2.131, 20: 2.086, 30: 2.042, 60: 2.000}
+
+def percentile(sorted_samples, q):
+    """Nearest-rank percentile (q in 0..100) of an already sorted list"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+def summarize(samples, scale=1.0):
+    """count/mean/min/p50/p95/p99/max of samples, each multiplied by scale"""
+    ordered = sorted(samples)
+    if not ordered:
+        return {'count': 0}
+    return {
+        'count': len(ordered),
+        'mean': statistics.fmean(ordered) * scale,
+        'min': ordered[0] * scale,
+        'p50': percentile(ordered, 50) * scale,
+        'p95': percentile(ordered, 95) * scale,
+        'p99': percentile(ordered, 99) * scale,
+        'max': ordered[-1] * scale,
+    }
+
+def histogram(samples, bounds):
+    """Cumulative bucket counts for the given upper bounds, plus +Inf"""
+    ordered = sorted(samples)
+    buckets = {}
+    index = 0
+    for bound in bounds:
+        while index < len(ordered) and ordered[index] <= bound:
+            index += 1
+        buckets[str(bound)] = index
+    buckets['+Inf'] = len(ordered)
+    return buckets
+
+def confidence_interval(samples):
+    """Mean and 95% confidence half-width using the t distribution"""
+    mean = statistics.fmean(samples)
+    if len(samples) < 2:
+        return mean, 0.0
+    dof = len(samples) - 1
+    t = T_95[max(k for k in T_95 if k <= dof)]
+    return mean, t * statistics.stdev(samples) / math.sqrt(len(samples))
@@ -1,81 +1,306 @@
 from liboqs import KeyEncapsulation, KeySignature
 
 import secrets
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 
-
 # =====================================================
+# KEM parameter sets, keypair pool and batch operations
+# =====================================================
+#
+# liboqs is called through ctypes, which releases the GIL for the duration
+# of each call, so plain threads run keygen/encap/decap on all cores.
+
+KEM_PARAMETER_SETS = ("Kyber512", "Kyber768", "Kyber1024", "ML-KEM-512", "ML-KEM-768", "ML-KEM-1024")
+
+
+def check_parameter_set(algorithm):
+    if algorithm not in KEM_PARAMETER_SETS:
+        raise ValueError(f"Unsupported KEM {algorithm!r}; choose one of {', '.join(KEM_PARAMETER_SETS)}")
+    return algorithm
+
+
+def generate_keypair(kem):
+    """(public key, secret key) from a reusable KeyEncapsulation object"""
+    public_key = kem.generate_keypair()
+    return public_key, kem.export_secret_key()
+
+
+class KEMKeyPool:
+    """
+    Bounded pool of pre-generated KEM keypairs for ephemeral-KEM handshakes
+    Background workers, each with its own KeyEncapsulation object, top the
+    pool up whenever it drops below the low watermark. get() never blocks:
+    when the pool is empty it generates inline, with a KeyEncapsulation
+    object per calling thread (liboqs keeps the secret key on the object).
+    """
+
+    def __init__(self, algorithm="Kyber512", size=64, workers=2, low_watermark=None):
+        self.algorithm = check_parameter_set(algorithm)
+        self.keypairs = queue.Queue(maxsize=size)
+        self.low_watermark = size // 2 if low_watermark is None else low_watermark
+        self.refill = threading.Event()
+        self.refill.set()
+        self.stopped = threading.Event()
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.inline = 0
+        self.served = 0
+        self.threads = [threading.Thread(target=self.fill, name=f"kem-keygen-{i}", daemon=True)
+                        for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def fill(self):
+        kem = KeyEncapsulation(self.algorithm)
+        while not self.stopped.is_set():
+            if not self.refill.wait(timeout=0.5):
+                continue
+            try:
+                while not self.stopped.is_set():
+                    self.keypairs.put_nowait(generate_keypair(kem))
+            except queue.Full:
+                self.refill.clear()
+
+    def get(self):
+        """(public key, secret key) that has never been handed out before"""
+        try:
+            keypair = self.keypairs.get_nowait()
+            inline = 0
+        except queue.Empty:
+            kem = getattr(self.local, 'kem', None)
+            if kem is None:
+                kem = self.local.kem = KeyEncapsulation(self.algorithm)
+            keypair = generate_keypair(kem)
+            inline = 1
+        with self.lock:
+            self.served += 1
+            self.inline += inline
+        if self.keypairs.qsize() < self.low_watermark:
+            self.refill.set()
+        return keypair
+
+    def close(self):
+        self.stopped.set()
+        self.refill.set()
+
+    def stats(self):
+        with self.lock:
+            return {'algorithm': self.algorithm, 'available': self.keypairs.qsize(),
+                    'served': self.served, 'generated_inline': self.inline}
+
+
+class KEMWorkers:
+    """
+    Batch encapsulation/decapsulation on a thread pool
+    Every worker thread builds one KeyEncapsulation object on first use and
+    reuses it for all later items instead of constructing one per call.
+    """
+
+    def __init__(self, algorithm="Kyber512", workers=4):
+        self.algorithm = check_parameter_set(algorithm)
+        self.workers = workers
+        self.local = threading.local()
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="kem")
+
+    def kem(self):
+        kem = getattr(self.local, 'kem', None)
+        if kem is None:
+            kem = self.local.kem = KeyEncapsulation(self.algorithm)
+        return kem
+
+    def chunks(self, items):
+        size = max(1, -(-len(items) // self.workers))
+        return [items[i:i + size] for i in range(0, len(items), size)]
+
+    def encap_chunk(self, public_keys):
+        kem = self.kem()
+        return [kem.encap_secret(public_key) for public_key in public_keys]
+
+    def decap_chunk(self, pairs):
+        kem = self.kem()
+        secrets_out = []
+        for ciphertext, secret_key in pairs:
+            kem.secret_key = secret_key
+            secrets_out.append(kem.decap_secret(ciphertext))
+        return secrets_out
+
+    def run(self, function, items):
+        results = []
+        for chunk_result in self.executor.map(function, self.chunks(items)):
+            results.extend(chunk_result)
+        return results
+
+    def encap_many(self, public_keys):
+        """[(ciphertext, shared secret), ...] in input order"""
+        return self.run(self.encap_chunk, list(public_keys))
+
+    def decap_many(self, ciphertexts, secret_keys):
+        """
+        Shared secrets in input order
+        secret_keys is one secret key for every ciphertext, or a list with one
+        secret key per ciphertext (e.g. keypairs drawn from a KEMKeyPool).
+        """
+        ciphertexts = list(ciphertexts)
+        if isinstance(secret_keys, (bytes, bytearray)):
+            secret_keys = [secret_keys] * len(ciphertexts)
+        return self.run(self.decap_chunk, list(zip(ciphertexts, secret_keys)))
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
-# Generate Public & Private Keys (Kyber512)
 
-# =====================================================
+def ops_per_second(operation, count):
+    start = time.perf_counter()
+    operation()
+    return count / (time.perf_counter() - start)
 
 
+def benchmark_kem(algorithm="Kyber512", count=2000, workers=4):
+    """keygen/encap/decap ops/s: one object per call vs reused objects vs batched on threads"""
+    check_parameter_set(algorithm)
+    report = {'algorithm': algorithm, 'count': count, 'workers': workers}
 
-kem = KeyEncapsulation("Kyber512")
+    def keygen_new_object():
+        for _ in range(count):
+            kem = KeyEncapsulation(algorithm)
+            kem.generate_keypair()
+            kem.export_secret_key()
 
-public_key = kem.generate_keypair()
+    reused = KeyEncapsulation(algorithm)
+    report['keygen_new_object_per_s'] = ops_per_second(keygen_new_object, count)
+    report['keygen_reused_object_per_s'] = ops_per_second(
+        lambda: [generate_keypair(reused) for _ in range(count)], count)
 
-private_key = kem.export_secret_key()
+    public_key, secret_key = generate_keypair(reused)
+    public_keys = [public_key] * count
+    report['encap_single_per_s'] = ops_per_second(
+        lambda: [reused.encap_secret(public_key) for _ in range(count)], count)
+    with KEMWorkers(algorithm, workers) as batch:
+        encapsulated = []
+        report['encap_many_per_s'] = ops_per_second(
+            lambda: encapsulated.extend(batch.encap_many(public_keys)), count)
+        ciphertexts = [ciphertext for ciphertext, _ in encapsulated]
+        decapsulator = KeyEncapsulation(algorithm)
+        decapsulator.secret_key = secret_key
+        report['decap_single_per_s'] = ops_per_second(
+            lambda: [decapsulator.decap_secret(ciphertext) for ciphertext in ciphertexts], count)
+        shared = []
+        report['decap_many_per_s'] = ops_per_second(
+            lambda: shared.extend(batch.decap_many(ciphertexts, secret_key)), count)
+        if shared != [secret for _, secret in encapsulated]:
+            raise RuntimeError("Batch decapsulation does not match encapsulation")
 
+    # Draw one full pool: the latency a handshake sees while the pool absorbs a burst
+    pool_size = min(count, 256)
+    pool = KEMKeyPool(algorithm, size=pool_size, workers=workers, low_watermark=0)
+    while pool.refill.is_set():
+        time.sleep(0.01)
+    report['pool_get_per_s'] = ops_per_second(lambda: [pool.get() for _ in range(pool_size)], pool_size)
+    report['pool'] = pool.stats()
+    pool.close()
+    return report
 
 
-print("Public Key Generated")
+if __name__ == "__main__":
 
-print("Private Key Generated")
+    parser = argparse.ArgumentParser(description="Kyber / ML-KEM demo and benchmark")
+    parser.add_argument('--benchmark', type=int, metavar='N', help="time N operations per parameter set")
+    parser.add_argument('--algorithms', default="Kyber512,Kyber768,Kyber1024",
+                        help="comma-separated parameter sets for the benchmark")
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
 
+    if args.benchmark:
+        reports = [benchmark_kem(name, args.benchmark, args.workers) for name in args.algorithms.split(',')]
+        print(json.dumps(reports, indent=2))
+        sys.exit(0)
 
 
-# =====================================================
+    # =====================================================
 
-# Encrypt (Encapsulate) - Generate Shared Secret
+    # Generate Public & Private Keys (Kyber512)
 
-# =====================================================
+    # =====================================================
 
 
 
-ciphertext, shared_secret_sender = kem.encap_secret(public_key)
+    kem = KeyEncapsulation("Kyber512")
 
+    public_key = kem.generate_keypair()
 
+    private_key = kem.export_secret_key()
 
-print("\nCiphertext:", ciphertext)
 
-print("Sender Shared Secret:", shared_secret_sender)
 
+    print("Public Key Generated")
 
+    print("Private Key Generated")
 
-# =====================================================
 
-# Decrypt (Decapsulate)
 
-# =====================================================
+    # =====================================================
 
+    # Encrypt (Encapsulate) - Generate Shared Secret
 
+    # =====================================================
 
-kem2 = KeyEncapsulation("Kyber512")
 
-kem2.secret_key = private_key
 
-shared_secret_receiver = kem2.decap_secret(ciphertext)
+    ciphertext, shared_secret_sender = kem.encap_secret(public_key)
 
 
 
-print("\nReceiver Shared Secret:", shared_secret_receiver)
+    print("\nCiphertext:", ciphertext)
 
+    print("Sender Shared Secret:", shared_secret_sender)
 
 
-# =====================================================
 
-# Verify
+    # =====================================================
 
-# =====================================================
+    # Decrypt (Decapsulate)
+
+    # =====================================================
+
+
+
+    kem2 = KeyEncapsulation("Kyber512")
+
+    kem2.secret_key = private_key
+
+    shared_secret_receiver = kem2.decap_secret(ciphertext)
+
+
+
+    print("\nReceiver Shared Secret:", shared_secret_receiver)
+
+
+
+    # =====================================================
+
+    # Verify
+
+    # =====================================================
 
 
 
-if shared_secret_sender == shared_secret_receiver:
+    if shared_secret_sender == shared_secret_receiver:
 
-    print("\n Shared secrets match!")
+        print("\n Shared secrets match!")
 
-else:
+    else:
 
-    print("\n Shared secrets do NOT match!")
\ No newline at end of file
+        print("\n Shared secrets do NOT match!")
\ No newline at end of file
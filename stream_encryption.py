@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Streaming AEAD Encryption (STREAM construction)
+Encrypts inputs of any size in fixed-size segments so memory stays constant.
+Every segment has its own nonce and tag; the nonce binds the segment index
+and a "last segment" flag, so reordered, dropped, duplicated or truncated
+segments fail authentication.
+
+Format:
+    header  = MAGIC | version | algorithm | segment_size | key_id_len | key_id | salt | nonce_prefix
+    segment = AEAD(stream_key, nonce_prefix | counter(4) | last(1), plaintext, aad=header)
+The per-stream key is HKDF(key, salt), so nonce prefixes never repeat under one key.
+"""
+
+import os
+import sys
+import struct
+import argparse
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+
+MAGIC = b"IASE"
+VERSION = 1
+TAG_SIZE = 16
+SALT_SIZE = 16
+NONCE_PREFIX_SIZE = 7
+DEFAULT_SEGMENT_SIZE = 64 * 1024
+# Readers allocate buffers of the header's segment size, so it is capped
+MAX_SEGMENT_SIZE = 64 * 1024 * 1024
+MAX_SEGMENTS = 2 ** 32
+
+ALGORITHMS = {
+    'AES-GCM': (1, AESGCM),
+    'CHACHA20-POLY1305': (2, ChaCha20Poly1305),
+}
+ALGORITHM_IDS = {algorithm_id: (name, cipher) for name, (algorithm_id, cipher) in ALGORITHMS.items()}
+
+# magic, version, algorithm id, segment size, key id length
+HEADER_PREFIX = struct.Struct('!4sBBIB')
+SEGMENT_NONCE = struct.Struct('!7sIB')
+
+class StreamDecryptionError(Exception):
+    """Raised when a stream is malformed, truncated, reordered or tampered with"""
+
+class StreamHeader:
+    """Parameters of one encrypted stream; its encoding is the AAD of every segment"""
+
+    def __init__(self, algorithm, segment_size, key_id=b"", salt=None, nonce_prefix=None):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unsupported algorithm {algorithm!r}")
+        if not 0 < segment_size <= MAX_SEGMENT_SIZE:
+            raise ValueError(f"Segment size must be between 1 and {MAX_SEGMENT_SIZE} bytes")
+        if len(key_id) > 255:
+            raise ValueError("Key id must be at most 255 bytes")
+        self.algorithm = algorithm
+        self.segment_size = segment_size
+        self.key_id = key_id
+        self.salt = salt or os.urandom(SALT_SIZE)
+        self.nonce_prefix = nonce_prefix or os.urandom(NONCE_PREFIX_SIZE)
+        self.encoded = HEADER_PREFIX.pack(
+            MAGIC, VERSION, ALGORITHMS[algorithm][0], segment_size, len(key_id)
+        ) + key_id + self.salt + self.nonce_prefix
+
+    @classmethod
+    def read_from(cls, reader):
+        prefix = read_exact(reader, HEADER_PREFIX.size)
+        magic, version, algorithm_id, segment_size, key_id_len = HEADER_PREFIX.unpack(prefix)
+        if magic != MAGIC or version != VERSION:
+            raise StreamDecryptionError("Not an encrypted stream (bad magic or version)")
+        if algorithm_id not in ALGORITHM_IDS:
+            raise StreamDecryptionError(f"Unknown algorithm id {algorithm_id}")
+        if not 0 < segment_size <= MAX_SEGMENT_SIZE:
+            raise StreamDecryptionError(f"Invalid segment size {segment_size}")
+        rest = read_exact(reader, key_id_len + SALT_SIZE + NONCE_PREFIX_SIZE)
+        key_id = rest[:key_id_len]
+        salt = rest[key_id_len:key_id_len + SALT_SIZE]
+        nonce_prefix = rest[key_id_len + SALT_SIZE:]
+        return cls(ALGORITHM_IDS[algorithm_id][0], segment_size, key_id, salt, nonce_prefix)
+
+    def stream_key(self, key):
+        """Per-stream key derived from key and salt"""
+        return HKDF(
+            algorithm=hashes.SHA256(),
+            length=len(key) if self.algorithm == 'AES-GCM' else 32,
+            salt=self.salt,
+            info=b"ias stream encryption v1 " + self.algorithm.encode(),
+        ).derive(key)
+
+    def cipher(self, key):
+        """AEAD instance keyed with the per-stream key"""
+        return ALGORITHMS[self.algorithm][1](self.stream_key(key))
+
+    def nonce(self, index, last):
+        if index >= MAX_SEGMENTS:
+            raise ValueError("Stream exceeds the maximum number of segments")
+        return SEGMENT_NONCE.pack(self.nonce_prefix, index, 1 if last else 0)
+
+    def ciphertext_size(self, plaintext_size):
+        """Total encrypted size (header included) for a plaintext of the given size"""
+        segments = max(1, -(-plaintext_size // self.segment_size))
+        return len(self.encoded) + plaintext_size + segments * TAG_SIZE
+
+def resolve_key(key, key_id):
+    """Key bytes as given, or looked up by key id in a mapping"""
+    if isinstance(key, (bytes, bytearray)):
+        return key
+    try:
+        return key[key_id]
+    except KeyError:
+        raise StreamDecryptionError(f"No key for key id {key_id!r}")
+
+def read_exact(reader, size):
+    data = reader.read(size)
+    if data is None or len(data) != size:
+        raise StreamDecryptionError("Stream ended inside the header")
+    return data
+
+def read_full(reader, view):
+    """Fill view from reader, looping over short reads (pipes, sockets); returns bytes read"""
+    filled = 0
+    while filled < len(view):
+        if hasattr(reader, 'readinto'):
+            count = reader.readinto(view[filled:])
+        else:
+            chunk = reader.read(len(view) - filled)
+            count = len(chunk) if chunk else 0
+            view[filled:filled + count] = chunk or b""
+        if not count:
+            break
+        filled += count
+    return filled
+
+def seal_into(cipher, nonce, plaintext, aad, out):
+    """Encrypt into a preallocated buffer when the backend supports it"""
+    if hasattr(cipher, 'encrypt_into'):
+        cipher.encrypt_into(nonce, plaintext, aad, out)
+    else:
+        out[:] = cipher.encrypt(nonce, bytes(plaintext), aad)
+
+def open_into(cipher, nonce, ciphertext, aad, out):
+    """Decrypt into a preallocated buffer when the backend supports it"""
+    if hasattr(cipher, 'decrypt_into'):
+        cipher.decrypt_into(nonce, ciphertext, aad, out)
+    else:
+        out[:] = cipher.decrypt(nonce, bytes(ciphertext), aad)
+
+def encrypt_stream(reader, writer, key, key_id=b"", algorithm='AES-GCM', segment_size=DEFAULT_SEGMENT_SIZE):
+    """
+    Encrypt everything readable from reader into writer
+    Works with files, pipes and socket.makefile() objects; memory use is two
+    plaintext segments and one ciphertext segment regardless of input size.
+    Returns the number of plaintext bytes encrypted.
+    """
+    header = StreamHeader(algorithm, segment_size, key_id)
+    cipher = header.cipher(key)
+    writer.write(header.encoded)
+
+    current = memoryview(bytearray(segment_size))
+    following = memoryview(bytearray(segment_size))
+    sealed = memoryview(bytearray(segment_size + TAG_SIZE))
+    size = read_full(reader, current)
+    total = 0
+    index = 0
+    while True:
+        # One segment of lookahead tells us whether this segment is the last
+        next_size = read_full(reader, following) if size == segment_size else 0
+        last = next_size == 0
+        out = sealed[:size + TAG_SIZE]
+        seal_into(cipher, header.nonce(index, last), current[:size], header.encoded, out)
+        writer.write(out)
+        total += size
+        if last:
+            return total
+        current, following = following, current
+        size = next_size
+        index += 1
+
+def decrypt_stream(reader, writer, key):
+    """
+    Decrypt a stream produced by encrypt_stream into writer
+    key is the key bytes, or a mapping from key id to key. Each segment is
+    written only after its tag verifies, but truncation is only detected at
+    the end, so treat the output as untrusted until this returns.
+    Returns the number of plaintext bytes written.
+    """
+    header = StreamHeader.read_from(reader)
+    cipher = header.cipher(resolve_key(key, header.key_id))
+
+    segment = header.segment_size + TAG_SIZE
+    current = memoryview(bytearray(segment))
+    following = memoryview(bytearray(segment))
+    opened = memoryview(bytearray(header.segment_size))
+    size = read_full(reader, current)
+    total = 0
+    index = 0
+    while True:
+        next_size = read_full(reader, following) if size == segment else 0
+        last = next_size == 0
+        if size < TAG_SIZE:
+            raise StreamDecryptionError(f"Segment {index} is truncated")
+        out = opened[:size - TAG_SIZE]
+        try:
+            open_into(cipher, header.nonce(index, last), current[:size], header.encoded, out)
+        except InvalidTag:
+            raise StreamDecryptionError(
+                f"Segment {index} failed authentication (tampered, reordered or truncated stream)")
+        writer.write(out)
+        total += len(out)
+        if last:
+            return total
+        current, following = following, current
+        size = next_size
+        index += 1
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming AEAD file/pipe encryption")
+    parser.add_argument('command', choices=['keygen', 'encrypt', 'decrypt'])
+    parser.add_argument('--key-file', required=True, help="raw 32-byte key (written by keygen)")
+    parser.add_argument('--key-id', default="", help="identifier stored in the stream header")
+    parser.add_argument('--algorithm', choices=sorted(ALGORITHMS), default='AES-GCM')
+    parser.add_argument('--segment-size', type=int, default=DEFAULT_SEGMENT_SIZE)
+    parser.add_argument('--input', help="input file (default stdin)")
+    parser.add_argument('--output', help="output file (default stdout)")
+    args = parser.parse_args()
+
+    if args.command == 'keygen':
+        with open(args.key_file, 'wb') as f:
+            f.write(os.urandom(32))
+        print(f"Key written to {args.key_file}", file=sys.stderr)
+        return
+
+    with open(args.key_file, 'rb') as f:
+        key = f.read()
+    reader = open(args.input, 'rb') if args.input else sys.stdin.buffer
+    writer = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        if args.command == 'encrypt':
+            total = encrypt_stream(reader, writer, key, args.key_id.encode(), args.algorithm, args.segment_size)
+            print(f"Encrypted {total} bytes", file=sys.stderr)
+        else:
+            total = decrypt_stream(reader, writer, key)
+            print(f"Decrypted {total} bytes", file=sys.stderr)
+    except StreamDecryptionError as e:
+        print(f"Decryption failed: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if args.input:
+            reader.close()
+        if args.output:
+            writer.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,29 @@
 #!/usr/bin/env python3
+import os
 import ssl
+import time
 import socket
+import select
+import asyncio
+import threading
+import statistics
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
+from ttl_cache import TTLCache
+from cipher_probe import configure_cipher_order
+from tls_protocol import (ALPN_FRAMED, ALPN_STREAM, ProtocolError, send_frame, recv_frame,
+                          read_frame, write_frame, recv_exact, recv_stream, send_stream, send_file, set_nodelay,
+                          STREAM_HEADER, STREAM_ACK, STREAM_UPLOAD, STREAM_DOWNLOAD,
+                          DEFAULT_STREAM_BUFFER)
 
 class TLSClient:
-    def __init__(self, host='localhost', port=8443):
+    def __init__(self, host='localhost', port=8443, session_cache=None, alpn_protocols=None):
         self.host = host
         self.port = port
+        # TLS 1.3 session tickets keyed by (host, port); sessions are bound to
+        # this client's SSLContext, so the cache must not be shared across clients
+        self.session_cache = session_cache if session_cache is not None else TTLCache(max_size=256, ttl=3600.0)
         self.context = ssl.create_default_context()
         
         # Force TLS 1.3
@@ -20,8 +37,26 @@ class TLSClient:
         # Set strong cipher suites (compatible with Python's ssl module)
         self.context.set_ciphers('ECDHE+AESGCM:ECDHE+CHACHA20:DHE+AESGCM:DHE+CHACHA20:!aNULL:!MD5:!DSS')
         
+        # ... then AES-GCM or ChaCha20 first, from this host's cached hardware probe (see cipher_probe.py)
+        configure_cipher_order(self.context)
+        
+        if alpn_protocols:
+            self.context.set_alpn_protocols(alpn_protocols)
+        
         print(f"TLS 1.3 Client configured for {host}:{port}")
     
+    def wrap(self, sock):
+        """Wrap a socket with TLS, offering a cached session ticket if one is available"""
+        session = self.session_cache.get((self.host, self.port))
+        return self.context.wrap_socket(sock, server_hostname=self.host, session=session)
+    
+    def remember_session(self, tls_socket):
+        """Cache the session ticket; call after the first read so TLS 1.3 tickets have arrived"""
+        session = tls_socket.session
+        if session is not None and session.has_ticket:
+            ttl = min(self.session_cache.ttl, session.ticket_lifetime_hint or self.session_cache.ttl)
+            self.session_cache.put((self.host, self.port), session, ttl)
+    
     def connect_and_communicate(self):
         """Connect to TLS server and perform secure communication"""
         try:
@@ -30,7 +65,7 @@ class TLSClient:
             
             # Create socket and wrap with TLS
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                with self.context.wrap_socket(sock, server_hostname=self.host) as tls_socket:
+                with self.wrap(sock) as tls_socket:
                     tls_socket.connect((self.host, self.port))
                     
                     # Display TLS connection details
@@ -38,10 +73,12 @@ class TLSClient:
                     print(f"TLS Version: {tls_socket.version()}")
                     print(f"Cipher Suite: {tls_socket.cipher()}")
                     print(f"Server Certificate: {tls_socket.getpeercert()}")
+                    print(f"Session resumed: {tls_socket.session_reused}")
                     
                     # Receive welcome message
                     welcome = tls_socket.recv(1024)
                     print(f"Server says: {welcome.decode()}")
+                    self.remember_session(tls_socket)
                     
                     # Send message to server
                     message = "Hello from TLS 1.3 Client!"
@@ -61,6 +98,36 @@ class TLSClient:
         except Exception as e:
             print(f"Error: {e}")
     
+    def timed_handshake(self, resume):
+        """Return (handshake seconds, resumed?) for one connection"""
+        with socket.create_connection((self.host, self.port)) as sock:
+            session = self.session_cache.get((self.host, self.port)) if resume else None
+            with self.context.wrap_socket(sock, server_hostname=self.host, session=session,
+                                          do_handshake_on_connect=False) as tls_socket:
+                start = time.perf_counter()
+                tls_socket.do_handshake()
+                elapsed = time.perf_counter() - start
+                tls_socket.recv(1024)  # welcome; also delivers the new session ticket
+                self.remember_session(tls_socket)
+                return elapsed, tls_socket.session_reused
+    
+    def benchmark_resumption(self, rounds=50):
+        """Compare full and resumed TLS 1.3 handshake latency"""
+        print(f"\n=== Session Resumption Benchmark ({rounds} rounds) ===")
+        full = [self.timed_handshake(resume=False)[0] for _ in range(rounds)]
+        results = [self.timed_handshake(resume=True) for _ in range(rounds)]
+        resumed = [elapsed for elapsed, reused in results if reused]
+        
+        print(f"Full handshake:    median {statistics.median(full) * 1000:.3f} ms, "
+              f"mean {statistics.mean(full) * 1000:.3f} ms")
+        if not resumed:
+            print("Resumed handshake: server never accepted a session ticket")
+            return
+        print(f"Resumed handshake: median {statistics.median(resumed) * 1000:.3f} ms, "
+              f"mean {statistics.mean(resumed) * 1000:.3f} ms "
+              f"({len(resumed)}/{rounds} resumed)")
+        print(f"Saving per connection: {(1 - statistics.median(resumed) / statistics.median(full)) * 100:.1f}%")
+    
     def analyze_handshake(self):
         """Analyze TLS handshake details"""
         print(f"\n=== TLS 1.3 Handshake Analysis ===")
@@ -74,7 +141,370 @@ class TLSClient:
         print("• Mandatory authentication")
         print("• Removed renegotiation")
 
+class PooledConnection:
+    """A framed-protocol TLS connection owned by TLSConnectionPool"""
+    
+    def __init__(self, tls_socket):
+        self.tls_socket = tls_socket
+        self.created_at = self.last_used = time.monotonic()
+        self.messages = 0
+    
+    def is_healthy(self):
+        """An idle connection has nothing to read; readable means EOF or a protocol error"""
+        try:
+            if self.tls_socket.pending():
+                return False
+            readable, _, _ = select.select([self.tls_socket], [], [], 0)
+            return not readable
+        except (OSError, ValueError):
+            return False
+    
+    def close(self):
+        try:
+            self.tls_socket.close()
+        except OSError:
+            pass
+
+class TLSConnectionPool:
+    """
+    Pool of persistent framed TLS connections
+    Connections negotiate ALPN_FRAMED, are reused across requests (resuming
+    the TLS session when a new one has to be opened) and are health-checked
+    before reuse. pipeline() keeps several requests in flight on one
+    connection, so a message costs one AEAD record instead of a handshake.
+    """
+    
+    def __init__(self, host='localhost', port=8443, max_size=8, idle_timeout=60.0,
+                 acquire_timeout=10.0, pipeline_window=32):
+        self.client = TLSClient(host, port, alpn_protocols=[ALPN_FRAMED])
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.pipeline_window = pipeline_window
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.idle = deque()
+        self.lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+    
+    def open_connection(self):
+        """Connect, handshake and consume the welcome frame"""
+        sock = socket.create_connection((self.client.host, self.client.port), timeout=self.acquire_timeout)
+        try:
+            set_nodelay(sock)
+            tls_socket = self.client.wrap(sock)
+            if tls_socket.selected_alpn_protocol() != ALPN_FRAMED:
+                raise ProtocolError("Server did not negotiate the framed protocol")
+            tls_socket.settimeout(None)
+            recv_frame(tls_socket)  # welcome; also delivers the session ticket
+            self.client.remember_session(tls_socket)
+        except BaseException:
+            sock.close()
+            raise
+        with self.lock:
+            self.created += 1
+        return PooledConnection(tls_socket)
+    
+    def acquire(self):
+        """Take a healthy idle connection, or open a new one if the pool has room"""
+        if not self.slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(f"No connection available within {self.acquire_timeout}s")
+        try:
+            while True:
+                with self.lock:
+                    conn = self.idle.pop() if self.idle else None
+                if conn is None:
+                    return self.open_connection()
+                if time.monotonic() - conn.last_used > self.idle_timeout or not conn.is_healthy():
+                    conn.close()
+                    with self.lock:
+                        self.discarded += 1
+                    continue
+                with self.lock:
+                    self.reused += 1
+                return conn
+        except BaseException:
+            self.slots.release()
+            raise
+    
+    def release(self, conn, broken=False):
+        """Return a connection to the pool (or drop it if it failed mid-request)"""
+        if broken:
+            conn.close()
+            with self.lock:
+                self.discarded += 1
+        else:
+            conn.last_used = time.monotonic()
+            with self.lock:
+                self.idle.append(conn)
+        self.slots.release()
+    
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, broken=True)
+            raise
+        self.release(conn)
+    
+    def request(self, payload):
+        """Send one message and wait for its response"""
+        with self.connection() as conn:
+            send_frame(conn.tls_socket, payload)
+            response = recv_frame(conn.tls_socket)
+            if response is None:
+                raise ProtocolError("Server closed the connection")
+            conn.messages += 1
+            return response
+    
+    def pipeline(self, payloads, window=None):
+        """Send many messages on one connection with up to `window` in flight; responses keep request order"""
+        window = window or self.pipeline_window
+        responses = []
+        with self.connection() as conn:
+            sent = 0
+            while len(responses) < len(payloads):
+                while sent < len(payloads) and sent - len(responses) < window:
+                    send_frame(conn.tls_socket, payloads[sent])
+                    sent += 1
+                response = recv_frame(conn.tls_socket)
+                if response is None:
+                    raise ProtocolError("Server closed the connection")
+                responses.append(response)
+            conn.messages += len(payloads)
+        return responses
+    
+    def close(self):
+        with self.lock:
+            while self.idle:
+                self.idle.pop().close()
+    
+    def stats(self):
+        with self.lock:
+            return {
+                'idle': len(self.idle),
+                'created': self.created,
+                'reused': self.reused,
+                'discarded': self.discarded,
+            }
+
+class AsyncPooledConnection:
+    """A framed connection shared by many coroutines; responses are matched to requests in order"""
+    
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = deque()
+        self.last_used = time.monotonic()
+        self.reader_task = asyncio.create_task(self.read_responses())
+    
+    @property
+    def alive(self):
+        return not self.reader_task.done()
+    
+    async def read_responses(self):
+        try:
+            while True:
+                payload = await read_frame(self.reader)
+                if payload is None:
+                    raise ConnectionError("Server closed the connection")
+                future = self.pending.popleft()
+                if not future.done():   # the caller may have cancelled (e.g. asyncio.wait_for)
+                    future.set_result(payload)
+                self.last_used = time.monotonic()
+        except Exception as e:
+            while self.pending:
+                future = self.pending.popleft()
+                if not future.done():
+                    future.set_exception(e)
+    
+    async def request(self, payload):
+        if not self.alive:
+            # Nothing would ever answer; the pool prunes dead connections
+            raise ConnectionError("Connection is closed")
+        future = asyncio.get_running_loop().create_future()
+        # Queue the future and the frame in one step so order always matches
+        self.pending.append(future)
+        write_frame(self.writer, payload)
+        await self.writer.drain()
+        return await future
+    
+    async def close(self):
+        self.reader_task.cancel()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except (ConnectionError, ssl.SSLError):
+            pass
+
+class SessionContext:
+    """
+    Offers a cached TLS session to the SSLObject asyncio creates
+    asyncio.open_connection() has no session argument, and its transport only
+    calls wrap_bio() on the context, so this forwards that call with the session.
+    """
+    
+    def __init__(self, context, session):
+        self.context = context
+        self.session = session
+    
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None):
+        return self.context.wrap_bio(incoming, outgoing, server_side, server_hostname, session=self.session)
+
+class AsyncTLSConnectionPool:
+    """
+    asyncio counterpart of TLSConnectionPool
+    Each connection carries up to max_in_flight concurrent requests; new
+    connections are opened only when every existing one is saturated.
+    """
+    
+    def __init__(self, host='localhost', port=8443, max_size=8, idle_timeout=60.0, max_in_flight=32):
+        self.client = TLSClient(host, port, alpn_protocols=[ALPN_FRAMED])
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_in_flight = max_in_flight
+        self.connections = []
+        self.opening = None
+    
+    async def open_connection(self):
+        # Offer the cached session ticket, like TLSClient.wrap() does for blocking sockets
+        session = self.client.session_cache.get((self.client.host, self.client.port))
+        context = self.client.context if session is None else SessionContext(self.client.context, session)
+        reader, writer = await asyncio.open_connection(
+            self.client.host, self.client.port, ssl=context, server_hostname=self.client.host)
+        set_nodelay(writer.get_extra_info('socket'))
+        ssl_object = writer.get_extra_info('ssl_object')
+        if ssl_object.selected_alpn_protocol() != ALPN_FRAMED:
+            writer.close()
+            raise ProtocolError("Server did not negotiate the framed protocol")
+        await read_frame(reader)  # welcome; also delivers the session ticket
+        self.client.remember_session(ssl_object)
+        return AsyncPooledConnection(reader, writer)
+    
+    async def prune(self):
+        """Drop dead connections and ones idle for longer than idle_timeout"""
+        now = time.monotonic()
+        keep = []
+        for conn in self.connections:
+            if conn.alive and (conn.pending or now - conn.last_used <= self.idle_timeout):
+                keep.append(conn)
+            else:
+                await conn.close()
+        self.connections = keep
+    
+    async def acquire(self):
+        while True:
+            await self.prune()
+            least_loaded = min(self.connections, key=lambda c: len(c.pending), default=None)
+            saturated = least_loaded is None or len(least_loaded.pending) >= self.max_in_flight
+            if not saturated or len(self.connections) >= self.max_size:
+                return least_loaded
+            if self.opening is None:
+                self.opening = asyncio.ensure_future(self.open_connection())
+                try:
+                    conn = await self.opening
+                    self.connections.append(conn)
+                    return conn
+                finally:
+                    self.opening = None
+            # Another coroutine is already connecting; re-check once it is done
+            await asyncio.shield(self.opening)
+    
+    async def request(self, payload):
+        conn = await self.acquire()
+        return await conn.request(payload)
+    
+    async def pipeline(self, payloads):
+        """Send many messages concurrently; responses keep request order"""
+        return await asyncio.gather(*(self.request(payload) for payload in payloads))
+    
+    async def close(self):
+        for conn in self.connections:
+            await conn.close()
+        self.connections = []
+
+def pool_demo(host, port, messages):
+    """Send messages over a pooled connection and compare with one handshake per message"""
+    payloads = [f"Pooled message {i}".encode() for i in range(messages)]
+    pool = TLSConnectionPool(host, port)
+    try:
+        start = time.perf_counter()
+        responses = pool.pipeline(payloads)
+        elapsed = time.perf_counter() - start
+        assert responses == payloads, "Echoed payloads do not match"
+        print(f"\n=== Connection Pool ({messages} messages) ===")
+        print(f"Pipelined: {elapsed * 1000:.1f} ms total, {elapsed / messages * 1e6:.1f} µs/message")
+        
+        start = time.perf_counter()
+        for payload in payloads:
+            pool.request(payload)
+        elapsed = time.perf_counter() - start
+        print(f"Sequential on pooled connection: {elapsed / messages * 1e6:.1f} µs/message")
+        print(f"Pool stats: {pool.stats()}")
+    finally:
+        pool.close()
+
+def stream_benchmark(host, port, size, buffer_size=DEFAULT_STREAM_BUFFER, path=None):
+    """Measure bulk upload/download throughput (MB/s) on one streaming connection"""
+    client = TLSClient(host, port, alpn_protocols=[ALPN_STREAM])
+    buffer = bytearray(buffer_size)
+    with socket.create_connection((host, port)) as sock:
+        with client.wrap(sock) as tls_socket:
+            if tls_socket.selected_alpn_protocol() != ALPN_STREAM:
+                raise ProtocolError("Server did not negotiate the streaming protocol")
+            print(f"\n=== Streaming Benchmark (buffer {buffer_size} bytes) ===")
+            
+            # Upload: a file through the reusable buffer, or `size` bytes of it
+            if path:
+                size = os.path.getsize(path)
+            start = time.perf_counter()
+            tls_socket.sendall(STREAM_HEADER.pack(STREAM_UPLOAD, size))
+            if path:
+                with open(path, 'rb') as f:
+                    send_file(tls_socket, f, buffer, size)
+            else:
+                send_stream(tls_socket, size, buffer)
+            (acked,) = STREAM_ACK.unpack(recv_exact(tls_socket, STREAM_ACK.size))
+            elapsed = time.perf_counter() - start
+            print(f"Upload:   {acked} bytes in {elapsed:.3f}s = {acked / elapsed / 1e6:.1f} MB/s")
+            
+            # Download into the same buffer
+            start = time.perf_counter()
+            tls_socket.sendall(STREAM_HEADER.pack(STREAM_DOWNLOAD, size))
+            (incoming,) = STREAM_ACK.unpack(recv_exact(tls_socket, STREAM_ACK.size))
+            recv_stream(tls_socket, incoming, buffer)
+            elapsed = time.perf_counter() - start
+            print(f"Download: {incoming} bytes in {elapsed:.3f}s = {incoming / elapsed / 1e6:.1f} MB/s")
+
 if __name__ == "__main__":
-    client = TLSClient()
-    client.analyze_handshake()
-    client.connect_and_communicate()
+    import argparse
+    parser = argparse.ArgumentParser(description="TLS 1.3 demo client")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--benchmark-resumption', type=int, metavar='ROUNDS',
+                        help="compare full vs resumed handshake latency")
+    parser.add_argument('--pool-demo', type=int, metavar='MESSAGES',
+                        help="send MESSAGES framed messages over a persistent connection pool")
+    parser.add_argument('--stream-benchmark', type=int, metavar='BYTES',
+                        help="upload and download BYTES over the streaming protocol")
+    parser.add_argument('--stream-file', help="upload this file in the streaming benchmark")
+    parser.add_argument('--stream-buffer', type=int, default=DEFAULT_STREAM_BUFFER)
+    args = parser.parse_args()
+    
+    if args.pool_demo:
+        pool_demo(args.host, args.port, args.pool_demo)
+        raise SystemExit
+    if args.stream_benchmark or args.stream_file:
+        stream_benchmark(args.host, args.port, args.stream_benchmark or 0,
+                         args.stream_buffer, args.stream_file)
+        raise SystemExit
+    
+    client = TLSClient(args.host, args.port)
+    if args.benchmark_resumption:
+        client.benchmark_resumption(args.benchmark_resumption)
+    else:
+        client.analyze_handshake()
+        client.connect_and_communicate()
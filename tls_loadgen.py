@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+TLS 1.3 Load Generator
+Drives the TLS server with many concurrent clients (asyncio coroutines,
+optionally spread over several processes) and reports handshake and
+round-trip latency percentiles and throughput as JSON.
+"""
+
+import sys
+import ssl
+import json
+import time
+import asyncio
+import argparse
+import multiprocessing
+from contextlib import redirect_stdout
+from tls_client import TLSClient
+from tls_protocol import ALPN_FRAMED, ProtocolError, read_frame, write_frame
+from perf_stats import summarize, histogram
+
+# Histogram bucket upper bounds in milliseconds
+LATENCY_BUCKETS_MS = [0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+class LoadResult:
+    """Raw samples collected by one load process"""
+
+    def __init__(self):
+        self.handshake_latencies = []
+        self.round_trip_latencies = []
+        self.connections = 0
+        self.messages = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.errors = {}
+
+    def record_error(self, error):
+        name = type(error).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def merge(self, other):
+        self.handshake_latencies.extend(other.handshake_latencies)
+        self.round_trip_latencies.extend(other.round_trip_latencies)
+        self.connections += other.connections
+        self.messages += other.messages
+        self.bytes_sent += other.bytes_sent
+        self.bytes_received += other.bytes_received
+        for name, count in other.errors.items():
+            self.errors[name] = self.errors.get(name, 0) + count
+
+class RateLimiter:
+    """Hands out evenly spaced start slots so the process opens `rate` connections per second"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_slot = time.monotonic()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class TLSLoadGenerator:
+    """Runs connection loops against the server and collects latency samples"""
+
+    def __init__(self, host='localhost', port=8443, concurrency=50, rate=0.0, duration=10.0,
+                 message_size=256, messages_per_connection=1, timeout=10.0):
+        self.host = host
+        self.port = port
+        self.concurrency = concurrency
+        self.rate = rate
+        self.duration = duration
+        self.message_size = message_size
+        self.messages_per_connection = messages_per_connection
+        self.timeout = timeout
+        # Reuse the demo client's TLS settings; framed ALPN so a connection can carry many messages
+        with redirect_stdout(sys.stderr):
+            self.context = TLSClient(host, port, alpn_protocols=[ALPN_FRAMED]).context
+
+    async def run_connection(self, result, payload):
+        start = time.perf_counter()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.context, server_hostname=self.host),
+            self.timeout)
+        result.handshake_latencies.append(time.perf_counter() - start)
+        result.connections += 1
+        try:
+            if self.messages_per_connection:
+                await asyncio.wait_for(read_frame(reader), self.timeout)  # welcome
+            for _ in range(self.messages_per_connection):
+                sent_at = time.perf_counter()
+                write_frame(writer, payload)
+                await writer.drain()
+                response = await asyncio.wait_for(read_frame(reader), self.timeout)
+                if response is None:
+                    raise ConnectionError("Server closed the connection")
+                result.round_trip_latencies.append(time.perf_counter() - sent_at)
+                result.messages += 1
+                result.bytes_sent += len(payload)
+                result.bytes_received += len(response)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, ssl.SSLError):
+                pass
+
+    async def worker(self, result, limiter, deadline, payload):
+        while time.monotonic() < deadline:
+            await limiter.wait()
+            if time.monotonic() >= deadline:
+                break
+            try:
+                await self.run_connection(result, payload)
+            except (OSError, ssl.SSLError, asyncio.TimeoutError, EOFError, ProtocolError) as e:
+                result.record_error(e)
+
+    async def run(self):
+        """Run for the configured duration and return a LoadResult"""
+        result = LoadResult()
+        limiter = RateLimiter(self.rate)
+        deadline = time.monotonic() + self.duration
+        payload = b"x" * self.message_size
+        await asyncio.gather(*(self.worker(result, limiter, deadline, payload)
+                               for _ in range(self.concurrency)))
+        return result
+
+def run_process(options):
+    """Entry point for one load process"""
+    generator = TLSLoadGenerator(**options)
+    return asyncio.run(generator.run())
+
+def build_report(result, options, processes, elapsed):
+    """Machine-readable summary of a load run"""
+    return {
+        'config': dict(options, processes=processes),
+        'elapsed_s': elapsed,
+        'connections': result.connections,
+        'messages': result.messages,
+        'handshakes_per_s': result.connections / elapsed,
+        'messages_per_s': result.messages / elapsed,
+        'bytes_per_s': (result.bytes_sent + result.bytes_received) / elapsed,
+        'errors': result.errors,
+        'latency_ms': {
+            'handshake': summarize(result.handshake_latencies, 1000),
+            'round_trip': summarize(result.round_trip_latencies, 1000),
+        },
+        'histogram_ms': {
+            'handshake': histogram([x * 1000 for x in result.handshake_latencies], LATENCY_BUCKETS_MS),
+            'round_trip': histogram([x * 1000 for x in result.round_trip_latencies], LATENCY_BUCKETS_MS),
+        },
+    }
+
+def run_load(processes=1, **options):
+    """Run the load generator in one or more processes and return the report"""
+    total_rate = options.get('rate', 0.0)
+    per_process = dict(options, rate=total_rate / processes if total_rate else 0.0)
+    start = time.perf_counter()
+    if processes == 1:
+        result = run_process(per_process)
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            partials = pool.map(run_process, [per_process] * processes)
+        result = LoadResult()
+        for partial in partials:
+            result.merge(partial)
+    elapsed = time.perf_counter() - start
+    return build_report(result, options, processes, elapsed)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="TLS 1.3 load generator")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--concurrency', type=int, default=50, help="concurrent connections per process")
+    parser.add_argument('--processes', type=int, default=1, help="load processes (use >1 to saturate many cores)")
+    parser.add_argument('--rate', type=float, default=0.0, help="target new connections/s in total (0 = unbounded)")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds to run")
+    parser.add_argument('--message-size', type=int, default=256, help="payload bytes per message")
+    parser.add_argument('--messages-per-connection', type=int, default=1,
+                        help="framed round trips per connection (0 = handshake only)")
+    parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    options = {
+        'host': args.host,
+        'port': args.port,
+        'concurrency': args.concurrency,
+        'rate': args.rate,
+        'duration': args.duration,
+        'message_size': args.message_size,
+        'messages_per_connection': args.messages_per_connection,
+    }
+    report = run_load(args.processes, **options)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
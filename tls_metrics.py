@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Low-overhead metrics for the TLS server
+Counters, gauges and histograms rendered as Prometheus text on a local HTTP
+endpoint and written as periodic JSON snapshots. When metrics are disabled
+the server gets a NullMetrics whose hooks do nothing.
+"""
+
+import json
+import time
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger("tls_metrics")
+
+HANDSHAKE_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+
+def format_labels(label_names, label_values):
+    if not label_names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(label_names, label_values))
+    return "{" + pairs + "}"
+
+class Counter:
+    """Monotonic counter, optionally split by label values"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.values = {}
+
+    def inc(self, label_values=(), amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for label_values, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{format_labels(self.label_names, label_values)} {value}")
+        if not self.values and not self.label_names:
+            lines.append(f"{self.name} 0")
+        return lines
+
+    def snapshot(self):
+        if not self.label_names:
+            return self.values.get((), 0)
+        return {",".join(map(str, labels)): value for labels, value in self.values.items()}
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def dec(self, label_values=(), amount=1):
+        self.values[label_values] = self.values.get(label_values, 0) - amount
+
+class Histogram:
+    """Cumulative bucket histogram in the Prometheus layout"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        cumulative = 0
+        for bound, count in zip(self.buckets + ['+Inf'], self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {self.total}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+    def snapshot(self):
+        return {
+            'buckets': dict(zip(map(str, self.buckets + ['+Inf']), self.counts)),
+            'sum': self.total,
+            'count': self.count,
+        }
+
+class ServerMetrics:
+    """Metrics recorded by TLSServer and AsyncTLSServer"""
+
+    enabled = True
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.accepted = Counter("tls_connections_accepted_total", "TCP connections accepted")
+        self.handshakes = Counter("tls_handshakes_total", "Completed TLS handshakes",
+                                  ("version", "cipher", "resumed"))
+        self.handshake_duration = Histogram("tls_handshake_duration_seconds",
+                                            "TLS handshake duration", HANDSHAKE_BUCKETS)
+        self.bytes_in = Counter("tls_bytes_received_total", "Application bytes received")
+        self.bytes_out = Counter("tls_bytes_sent_total", "Application bytes sent")
+        self.errors = Counter("tls_errors_total", "Errors by type", ("type",))
+        self.active = Gauge("tls_active_connections", "Connections currently being served")
+        self.metrics = [self.accepted, self.handshakes, self.handshake_duration,
+                        self.bytes_in, self.bytes_out, self.errors, self.active]
+
+    def connection_accepted(self):
+        with self.lock:
+            self.accepted.inc()
+
+    def handshake_completed(self, duration, version, cipher, resumed):
+        with self.lock:
+            self.handshakes.inc((version, cipher, str(bool(resumed)).lower()))
+            if duration is not None:
+                self.handshake_duration.observe(duration)
+
+    def connection_opened(self):
+        with self.lock:
+            self.active.inc()
+
+    def connection_closed(self):
+        with self.lock:
+            self.active.dec()
+
+    def transferred(self, received=0, sent=0):
+        with self.lock:
+            self.bytes_in.inc(amount=received)
+            self.bytes_out.inc(amount=sent)
+
+    def error(self, kind):
+        with self.lock:
+            self.errors.inc((kind,))
+
+    def render_prometheus(self):
+        with self.lock:
+            lines = []
+            for metric in self.metrics:
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        with self.lock:
+            data = {metric.name: metric.snapshot() for metric in self.metrics}
+        data['timestamp'] = time.time()
+        data['uptime_s'] = data['timestamp'] - self.started_at
+        return data
+
+class NullMetrics:
+    """Drop-in replacement used when metrics are disabled"""
+
+    enabled = False
+
+    def connection_accepted(self):
+        pass
+
+    def handshake_completed(self, duration, version, cipher, resumed):
+        pass
+
+    def connection_opened(self):
+        pass
+
+    def connection_closed(self):
+        pass
+
+    def transferred(self, received=0, sent=0):
+        pass
+
+    def error(self, kind):
+        pass
+
+class MetricsExporter:
+    """Serves /metrics (Prometheus text) and /metrics.json, and writes periodic JSON snapshots"""
+
+    def __init__(self, metrics, host='127.0.0.1', port=None, snapshot_path=None, snapshot_interval=10.0):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.http_server = None
+
+    def start(self):
+        if self.port is not None:
+            self.http_server = ThreadingHTTPServer((self.host, self.port), self.handler_class())
+            threading.Thread(target=self.http_server.serve_forever, name="metrics-http", daemon=True).start()
+            logger.info("Metrics endpoint on http://%s:%d/metrics", self.host, self.port)
+        if self.snapshot_path:
+            threading.Thread(target=self.write_snapshots, name="metrics-snapshot", daemon=True).start()
+            logger.info("Writing metrics snapshots to %s every %.0fs", self.snapshot_path, self.snapshot_interval)
+
+    def handler_class(self):
+        metrics = self.metrics
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body = metrics.render_prometheus().encode()
+                    content_type = 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body = json.dumps(metrics.snapshot()).encode()
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("metrics request: " + format, *args)
+
+        return MetricsHandler
+
+    def write_snapshots(self):
+        while True:
+            time.sleep(self.snapshot_interval)
+            try:
+                with open(self.snapshot_path, 'w') as f:
+                    json.dump(self.metrics.snapshot(), f)
+            except OSError as e:
+                logger.warning("Could not write metrics snapshot: %s", e)
+
+    def stop(self):
+        if self.http_server:
+            self.http_server.shutdown()
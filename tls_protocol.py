@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Wire protocol shared by the TLS server and clients
+Legacy clients get the one-shot welcome/response exchange. Clients that
+negotiate the ALPN_FRAMED protocol get length-prefixed frames instead, so
+many messages (and several in flight at once) share one TLS connection.
+ALPN_STREAM carries bulk uploads/downloads of any size through a fixed,
+preallocated buffer so memory stays flat regardless of payload size.
+"""
+
+import socket
+import struct
+import asyncio
+
+WELCOME = b"Welcome to TLS 1.3 Secure Server!"
+RESPONSE = b"Message received securely via TLS 1.3!"
+
+# ALPN identifiers for the framed and bulk streaming protocols
+ALPN_FRAMED = "ias-framed/1"
+ALPN_STREAM = "ias-stream/1"
+
+# Every frame is a 4-byte big-endian payload length followed by the payload
+FRAME_HEADER = struct.Struct('!I')
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+# Every stream request is an opcode and a 64-bit length:
+#   STREAM_UPLOAD   client sends `length` bytes, server answers with STREAM_ACK (bytes received)
+#   STREAM_DOWNLOAD server answers with STREAM_ACK (bytes it will send) followed by the data
+STREAM_HEADER = struct.Struct('!cQ')
+STREAM_ACK = struct.Struct('!Q')
+STREAM_UPLOAD = b'U'
+STREAM_DOWNLOAD = b'D'
+DEFAULT_STREAM_BUFFER = 256 * 1024
+
+class ProtocolError(Exception):
+    """Raised when the peer violates the framing protocol"""
+
+def set_nodelay(sock):
+    """Disable Nagle's algorithm so a small frame is sent at once, not after the previous one's ACK"""
+    if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+def encode_frame(payload):
+    """Header and payload as one buffer, so small frames fit in one TLS record"""
+    if len(payload) > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {len(payload)} bytes exceeds {MAX_FRAME_SIZE}")
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+def recv_exact(sock, size):
+    """Read exactly size bytes; returns None on a clean EOF before the first byte"""
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            if received == 0:
+                return None
+            raise ProtocolError(f"Connection closed after {received} of {size} bytes")
+        received += count
+    return buffer
+
+def send_frame(sock, payload):
+    sock.sendall(encode_frame(payload))
+
+def recv_frame(sock):
+    """Read one frame from a blocking socket; returns None on clean EOF"""
+    header = recv_exact(sock, FRAME_HEADER.size)
+    if header is None:
+        return None
+    (length,) = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {length} bytes exceeds {MAX_FRAME_SIZE}")
+    if length == 0:
+        return b""
+    payload = recv_exact(sock, length)
+    if payload is None:
+        raise ProtocolError("Connection closed inside a frame")
+    return bytes(payload)
+
+async def read_frame(reader):
+    """Read one frame from an asyncio StreamReader; returns None on clean EOF"""
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise ProtocolError("Connection closed inside a frame header")
+    (length,) = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {length} bytes exceeds {MAX_FRAME_SIZE}")
+    try:
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise ProtocolError("Connection closed inside a frame")
+
+def write_frame(writer, payload):
+    """Queue one frame on an asyncio StreamWriter (caller drains)"""
+    writer.write(encode_frame(payload))
+
+def recv_into_exact(sock, view):
+    """Fill a memoryview completely from a blocking socket"""
+    received = 0
+    while received < len(view):
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            raise ProtocolError(f"Connection closed after {received} of {len(view)} bytes")
+        received += count
+
+def recv_stream(sock, length, buffer, sink=None):
+    """
+    Receive `length` bytes through a reusable buffer
+    Each filled chunk is passed to sink (e.g. file.write) as a memoryview
+    before the buffer is reused, so no per-chunk allocations are made.
+    """
+    view = memoryview(buffer)
+    remaining = length
+    while remaining:
+        chunk = view[:min(remaining, len(view))]
+        recv_into_exact(sock, chunk)
+        if sink is not None:
+            sink(chunk)
+        remaining -= len(chunk)
+    return length
+
+def send_stream(sock, length, buffer):
+    """Send `length` bytes by repeatedly writing slices of a preallocated buffer"""
+    view = memoryview(buffer)
+    remaining = length
+    while remaining:
+        chunk = min(remaining, len(view))
+        sock.sendall(view[:chunk])
+        remaining -= chunk
+    return length
+
+def send_file(sock, fileobj, buffer, length=None):
+    """
+    sendfile-style transfer for TLS sockets
+    The kernel cannot encrypt for us, so read the file into the reusable
+    buffer with readinto() and write memoryview slices of it.
+    """
+    view = memoryview(buffer)
+    sent = 0
+    while length is None or sent < length:
+        want = len(view) if length is None else min(len(view), length - sent)
+        count = fileobj.readinto(view[:want])
+        if not count:
+            break
+        sock.sendall(view[:count])
+        sent += count
+    return sent
@@ -1,91 +1,869 @@
 #!/usr/bin/env python3
+import os
 import ssl
+import time
 import socket
+import asyncio
+import argparse
 import threading
-from datetime import datetime
+import multiprocessing
+import queue
+import select
+import signal
+import logging
+from tls_protocol import (WELCOME, RESPONSE, ALPN_FRAMED, ALPN_STREAM, ProtocolError,
+                          send_frame, recv_frame, read_frame, write_frame, recv_exact,
+                          STREAM_HEADER, STREAM_ACK, STREAM_UPLOAD, STREAM_DOWNLOAD,
+                          DEFAULT_STREAM_BUFFER, recv_stream, send_stream, send_file, set_nodelay)
+from tls_metrics import ServerMetrics, NullMetrics, MetricsExporter
+from cipher_probe import configure_cipher_order
+
+logger = logging.getLogger("tls_server")
+
+class HandshakePool:
+    """
+    Bounded TLS handshake executor
+    The accept loop only queues raw sockets here; a fixed set of worker
+    threads performs the handshakes under a hard deadline. When the queue is
+    full new connections are shed immediately instead of stalling accept().
+    """
+    
+    def __init__(self, server, workers=8, queue_depth=128, timeout=5.0):
+        self.server = server
+        self.timeout = timeout
+        self.pending = queue.Queue(maxsize=queue_depth)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.timed_out = 0
+        self.failed = 0
+        self.rejected = 0
+        self.threads = [
+            threading.Thread(target=self.run, name=f"handshake-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+    
+    def submit(self, client_socket, addr):
+        """Queue a raw socket for handshaking; returns False if it was shed"""
+        try:
+            self.pending.put_nowait((client_socket, addr, time.monotonic()))
+            return True
+        except queue.Full:
+            with self.lock:
+                self.rejected += 1
+            self.server.metrics.error('handshake_rejected')
+            client_socket.close()
+            return False
+    
+    def handshake(self, client_socket, deadline):
+        """Run a non-blocking handshake that must finish before the deadline"""
+        tls_socket = self.server.context.wrap_socket(
+            client_socket, server_side=True, do_handshake_on_connect=False)
+        tls_socket.setblocking(False)
+        while True:
+            try:
+                tls_socket.do_handshake()
+                break
+            except ssl.SSLWantReadError:
+                wait_read, wait_write = [tls_socket], []
+            except ssl.SSLWantWriteError:
+                wait_read, wait_write = [], [tls_socket]
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not any(select.select(wait_read, wait_write, [], remaining)):
+                tls_socket.close()
+                raise socket.timeout("TLS handshake timed out")
+        tls_socket.setblocking(True)
+        return tls_socket
+    
+    def run(self):
+        while True:
+            client_socket, addr, queued_at = self.pending.get()
+            with self.lock:
+                self.in_flight += 1
+            metrics = self.server.metrics
+            try:
+                # Time spent waiting in the queue counts against the deadline
+                started = time.perf_counter()
+                tls_socket = self.handshake(client_socket, queued_at + self.timeout)
+                with self.lock:
+                    self.completed += 1
+                self.server.handshake_completed(tls_socket, addr, time.perf_counter() - started)
+            except socket.timeout:
+                with self.lock:
+                    self.timed_out += 1
+                metrics.error('handshake_timeout')
+                logger.info("TLS handshake timed out with %s", addr)
+            except (ssl.SSLError, OSError) as e:
+                with self.lock:
+                    self.failed += 1
+                metrics.error(type(e).__name__)
+                logger.info("TLS handshake failed with %s: %s", addr, e)
+                client_socket.close()
+            finally:
+                with self.lock:
+                    self.in_flight -= 1
+    
+    def close(self):
+        """Shed every queued socket (used when the server starts draining)"""
+        while True:
+            try:
+                client_socket, _, _ = self.pending.get_nowait()
+            except queue.Empty:
+                return
+            with self.lock:
+                self.rejected += 1
+            client_socket.close()
+    
+    def stats(self):
+        """Snapshot of the handshake counters"""
+        with self.lock:
+            return {
+                'queued': self.pending.qsize(),
+                'in_flight': self.in_flight,
+                'completed': self.completed,
+                'timed_out': self.timed_out,
+                'failed': self.failed,
+                'rejected': self.rejected,
+            }
+
+def create_server_context(certfile, keyfile, num_tickets):
+    """Build the server SSLContext from the certificate files"""
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    
+    # Force TLS 1.3
+    context.minimum_version = ssl.TLSVersion.TLSv1_3
+    context.maximum_version = ssl.TLSVersion.TLSv1_3
+    
+    # Load server certificate and private key
+    context.load_cert_chain(certfile=certfile, keyfile=keyfile)
+    
+    # Enable client authentication (optional)
+    # context.load_verify_locations(cafile='cert.pem')
+    # context.verify_mode = ssl.CERT_REQUIRED
+    
+    # Set strong cipher suites (compatible with Python's ssl module)
+    context.set_ciphers('ECDHE+AESGCM:ECDHE+CHACHA20:DHE+AESGCM:DHE+CHACHA20:!aNULL:!MD5:!DSS')
+    
+    # ... then AES-GCM or ChaCha20 first, from this host's cached hardware probe (see cipher_probe.py)
+    configure_cipher_order(context, server=True)
+    
+    # TLS 1.3 session tickets issued after each full handshake (0 disables resumption)
+    context.num_tickets = num_tickets
+    
+    # Clients that negotiate ALPN_FRAMED / ALPN_STREAM get the persistent
+    # framed protocol / bulk streaming instead of the one-shot exchange
+    context.set_alpn_protocols([ALPN_FRAMED, ALPN_STREAM])
+    return context
 
 class TLSServer:
-    def __init__(self, host='localhost', port=8443):
+    def __init__(self, host='localhost', port=8443, reuse_port=False, backlog=128,
+                 handshake_workers=8, handshake_queue=128, handshake_timeout=5.0,
+                 num_tickets=2, stream_buffer_size=DEFAULT_STREAM_BUFFER, stream_source=None,
+                 metrics=None, certfile='server.crt', keyfile='server.key', drain_timeout=30.0,
+                 context=None):
         self.host = host
         self.port = port
-        self.context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-        
-        # Force TLS 1.3
-        self.context.minimum_version = ssl.TLSVersion.TLSv1_3
-        self.context.maximum_version = ssl.TLSVersion.TLSv1_3
-        
-        # Load server certificate and private key
-        self.context.load_cert_chain(certfile='server.crt', keyfile='server.key')
+        self.reuse_port = reuse_port
+        self.backlog = backlog
+        self.handshake_workers = handshake_workers
+        self.handshake_queue = handshake_queue
+        self.handshake_timeout = handshake_timeout
+        self.handshake_pool = None
+        # Bulk streaming: one buffer of this size per connection, optional file served on download
+        self.stream_buffer_size = stream_buffer_size
+        self.stream_source = stream_source
+        self.handshakes = 0
+        self.resumed_handshakes = 0
+        self.lock = threading.Lock()
+        # ServerMetrics when enabled; NullMetrics makes every hook a no-op
+        self.metrics = metrics or NullMetrics()
+        # Graceful shutdown: connections being served and how long to wait for them
+        self.connections = set()
+        self.drain_timeout = drain_timeout
+        self.shutdown_requested = threading.Event()
+        self.certfile = certfile
+        self.keyfile = keyfile
+        self.num_tickets = num_tickets
+        # A context passed in is shared, e.g. by TLSWorkerPool workers so
+        # their session tickets resume on any worker
+        self.context = context or self.create_context()
+        self.context_generation = 1
         
-        # Enable client authentication (optional)
-        # self.context.load_verify_locations(cafile='cert.pem')
-        # self.context.verify_mode = ssl.CERT_REQUIRED
-        
-        # Set strong cipher suites (compatible with Python's ssl module)
-        self.context.set_ciphers('ECDHE+AESGCM:ECDHE+CHACHA20:DHE+AESGCM:DHE+CHACHA20:!aNULL:!MD5:!DSS')
-        
-        print(f"TLS 1.3 Server configured on {host}:{port}")
-        print(f"Supported cipher suites: {self.context.get_ciphers()}")
+        logger.info("TLS 1.3 Server configured on %s:%s", host, port)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Supported cipher suites: %s", [c['name'] for c in self.context.get_ciphers()])
+    
+    def create_context(self):
+        """Build the server SSLContext from the current certificate files"""
+        return create_server_context(self.certfile, self.keyfile, self.num_tickets)
+    
+    def reload_context(self):
+        """
+        Hot certificate reload (SIGHUP)
+        A complete new context is built first and then swapped in with one
+        attribute assignment: new handshakes pick it up, established
+        connections keep the context they were created with.
+        """
+        try:
+            context = self.create_context()
+        except (OSError, ssl.SSLError) as e:
+            logger.error("Certificate reload failed, keeping the current context: %s", e)
+            return False
+        self.context = context
+        self.context_generation += 1
+        logger.info("Loaded %s / %s as context generation %d",
+                    self.certfile, self.keyfile, self.context_generation)
+        return True
+    
+    def request_shutdown(self):
+        """Stop accepting and drain (SIGTERM)"""
+        logger.info("Shutdown requested, draining connections (deadline %.0fs)", self.drain_timeout)
+        self.shutdown_requested.set()
+    
+    def install_signal_handlers(self):
+        """SIGTERM drains, SIGHUP reloads certificates (main thread, POSIX only)"""
+        if threading.current_thread() is not threading.main_thread():
+            return
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.request_shutdown())
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.reload_context())
     
     def handle_client(self, client_socket, addr):
         """Handle individual client connections"""
+        self.metrics.connection_opened()
+        with self.lock:
+            self.connections.add(client_socket)
         try:
-            print(f"\n=== New Connection from {addr} ===")
-            print(f"Connection time: {datetime.now()}")
-            
             # Get TLS handshake information
             tls_socket = client_socket
-            print(f"TLS Version: {tls_socket.version()}")
-            print(f"Cipher: {tls_socket.cipher()}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("New connection from %s: %s %s, resumed=%s", addr,
+                             tls_socket.version(), tls_socket.cipher()[0], tls_socket.session_reused)
+            
+            protocol = tls_socket.selected_alpn_protocol()
+            if protocol == ALPN_FRAMED:
+                served = self.serve_framed(tls_socket)
+                logger.debug("Served %d framed messages to %s", served, addr)
+                return
+            if protocol == ALPN_STREAM:
+                transferred = self.serve_stream(tls_socket)
+                logger.debug("Streamed %d bytes with %s", transferred, addr)
+                return
             
             # Send welcome message
-            welcome = b"Welcome to TLS 1.3 Secure Server!"
-            tls_socket.send(welcome)
+            tls_socket.send(WELCOME)
             
             # Receive client message
             data = tls_socket.recv(1024)
             if data:
-                print(f"Received from client: {data.decode()}")
-                response = b"Message received securely via TLS 1.3!"
-                tls_socket.send(response)
+                logger.debug("Received from client %s: %r", addr, data)
+                tls_socket.send(RESPONSE)
+            self.metrics.transferred(len(data), len(WELCOME) + (len(RESPONSE) if data else 0))
             
         except Exception as e:
-            print(f"Error handling client {addr}: {e}")
+            self.metrics.error(type(e).__name__)
+            logger.warning("Error handling client %s: %s", addr, e)
         finally:
             client_socket.close()
-            print(f"Connection closed for {addr}")
+            with self.lock:
+                self.connections.discard(client_socket)
+            self.metrics.connection_closed()
+            logger.debug("Connection closed for %s", addr)
+    
+    def serve_framed(self, tls_socket):
+        """Echo length-prefixed frames until the client closes; returns the message count"""
+        send_frame(tls_socket, WELCOME)
+        served = 0
+        while True:
+            payload = recv_frame(tls_socket)
+            if payload is None:
+                return served
+            send_frame(tls_socket, payload)
+            self.metrics.transferred(len(payload), len(payload))
+            served += 1
+    
+    def stream_download_size(self, requested):
+        """Bytes a download request will actually get"""
+        if self.stream_source is None:
+            return requested
+        return min(requested, os.path.getsize(self.stream_source))
+    
+    def serve_stream(self, tls_socket):
+        """Serve bulk uploads/downloads through one preallocated buffer; returns bytes moved"""
+        buffer = bytearray(self.stream_buffer_size)
+        transferred = 0
+        while True:
+            header = recv_exact(tls_socket, STREAM_HEADER.size)
+            if header is None:
+                return transferred
+            op, length = STREAM_HEADER.unpack(header)
+            if op == STREAM_UPLOAD:
+                transferred += recv_stream(tls_socket, length, buffer)
+                tls_socket.sendall(STREAM_ACK.pack(length))
+                self.metrics.transferred(received=length)
+            elif op == STREAM_DOWNLOAD:
+                size = self.stream_download_size(length)
+                tls_socket.sendall(STREAM_ACK.pack(size))
+                if self.stream_source is None:
+                    sent = send_stream(tls_socket, size, buffer)
+                else:
+                    with open(self.stream_source, 'rb') as f:
+                        sent = send_file(tls_socket, f, buffer, size)
+                transferred += sent
+                self.metrics.transferred(sent=sent)
+            else:
+                raise ProtocolError(f"Unknown stream opcode {op!r}")
+    
+    def create_listener(self):
+        """Create the listening socket (shared with sibling workers when reuse_port is set)"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if self.reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(self.backlog)
+        return sock
+    
+    def handshake_completed(self, tls_socket, addr, duration=None):
+        """Called from the handshake pool once a client is ready to talk"""
+        resumed = tls_socket.session_reused
+        with self.lock:
+            self.handshakes += 1
+            if resumed:
+                self.resumed_handshakes += 1
+        if self.metrics.enabled:
+            self.metrics.handshake_completed(duration, tls_socket.version(), tls_socket.cipher()[0], resumed)
+        # Handle client in separate thread
+        client_thread = threading.Thread(
+            target=self.handle_client, 
+            args=(tls_socket, addr)
+        )
+        client_thread.daemon = True
+        client_thread.start()
+    
+    def handshake_stats(self):
+        """Queued, in-flight, timed-out and rejected handshake counters"""
+        stats = self.handshake_pool.stats() if self.handshake_pool else {}
+        stats['resumed'] = self.resumed_handshakes
+        return stats
+    
+    def drain(self):
+        """Wait for in-flight handshakes and connections to finish, then force-close stragglers"""
+        self.handshake_pool.close()
+        deadline = time.monotonic() + self.drain_timeout
+        while time.monotonic() < deadline:
+            with self.lock:
+                active = len(self.connections)
+            if not active and not self.handshake_pool.stats()['in_flight']:
+                logger.info("All connections drained")
+                return
+            time.sleep(0.1)
+        with self.lock:
+            remaining = list(self.connections)
+        logger.warning("Drain deadline passed, closing %d connections", len(remaining))
+        for tls_socket in remaining:
+            try:
+                tls_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
     
     def start(self):
         """Start the TLS server"""
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-            sock.bind((self.host, self.port))
-            sock.listen(5)
-            print(f"Server listening on {self.host}:{self.port}")
+        self.handshake_pool = HandshakePool(
+            self, self.handshake_workers, self.handshake_queue, self.handshake_timeout)
+        self.install_signal_handlers()
+        with self.create_listener() as sock:
+            logger.info("Server listening on %s:%s (backlog %d)", self.host, self.port, self.backlog)
+            # Wake up regularly so a shutdown request is noticed promptly
+            sock.settimeout(0.5)
             
             try:
-                while True:
-                    client_socket, addr = sock.accept()
-                    print(f"Accepting connection from {addr}")
-                    
-                    # Wrap socket with TLS
+                while not self.shutdown_requested.is_set():
                     try:
-                        tls_socket = self.context.wrap_socket(client_socket, server_side=True)
-                        # Handle client in separate thread
-                        client_thread = threading.Thread(
-                            target=self.handle_client, 
-                            args=(tls_socket, addr)
-                        )
-                        client_thread.daemon = True
-                        client_thread.start()
-                    except ssl.SSLError as e:
-                        print(f"TLS handshake failed with {addr}: {e}")
-                        client_socket.close()
+                        client_socket, addr = sock.accept()
+                    except socket.timeout:
+                        continue
+                    set_nodelay(client_socket)
+                    self.metrics.connection_accepted()
+                    
+                    # Hand the raw socket to the handshake pool
+                    if not self.handshake_pool.submit(client_socket, addr):
+                        logger.info("Handshake queue full, rejected %s", addr)
                         
             except KeyboardInterrupt:
-                print("\nServer shutting down...")
+                logger.info("Server shutting down...")
             finally:
                 sock.close()
+        self.drain()
+        logger.info("Handshake stats: %s", self.handshake_stats())
+
+class AsyncTLSServer(TLSServer):
+    """
+    asyncio event-loop TLS server
+    Serves the same welcome/echo protocol as TLSServer, but the handshake and
+    every connection run as coroutines on a single event loop instead of one
+    thread per client, so a stalled handshake never blocks new accepts.
+    """
+    
+    def __init__(self, host='localhost', port=8443, backlog=4096,
+                 handshake_timeout=10.0, report_interval=5.0, reuse_port=False,
+                 num_tickets=2, stream_buffer_size=DEFAULT_STREAM_BUFFER, stream_source=None,
+                 metrics=None, certfile='server.crt', keyfile='server.key', drain_timeout=30.0,
+                 context=None):
+        super().__init__(host, port, reuse_port, backlog, handshake_timeout=handshake_timeout,
+                         num_tickets=num_tickets, stream_buffer_size=stream_buffer_size,
+                         stream_source=stream_source, metrics=metrics, certfile=certfile,
+                         keyfile=keyfile, drain_timeout=drain_timeout, context=context)
+        self.client_tasks = set()
+        self.stop_event = None
+        self.report_interval = report_interval
+        self.active_connections = 0
+        self.peak_connections = 0
+    
+    async def handshake_async(self, writer, addr):
+        """Upgrade an accepted TCP stream to TLS; returns False if the handshake failed"""
+        self.metrics.connection_accepted()
+        started = time.perf_counter()
+        try:
+            await writer.start_tls(self.context, ssl_handshake_timeout=self.handshake_timeout)
+        except (ConnectionError, ssl.SSLError, asyncio.TimeoutError, OSError) as e:
+            self.metrics.error(type(e).__name__)
+            logger.info("TLS handshake failed with %s: %s", addr, e)
+            writer.transport.abort()
+            return False
+        ssl_object = writer.get_extra_info('ssl_object')
+        self.handshakes += 1
+        if ssl_object.session_reused:
+            self.resumed_handshakes += 1
+        if self.metrics.enabled:
+            self.metrics.handshake_completed(time.perf_counter() - started, ssl_object.version(),
+                                             ssl_object.cipher()[0], ssl_object.session_reused)
+        return True
+    
+    async def handle_client_async(self, reader, writer):
+        """Handle one client connection on the event loop"""
+        task = asyncio.current_task()
+        self.client_tasks.add(task)
+        try:
+            await self.serve_client_async(reader, writer)
+        finally:
+            self.client_tasks.discard(task)
+    
+    async def serve_client_async(self, reader, writer):
+        addr = writer.get_extra_info('peername')
+        set_nodelay(writer.get_extra_info('socket'))
+        if not await self.handshake_async(writer, addr):
+            return
+        self.active_connections += 1
+        self.peak_connections = max(self.peak_connections, self.active_connections)
+        self.metrics.connection_opened()
+        try:
+            protocol = writer.get_extra_info('ssl_object').selected_alpn_protocol()
+            if protocol == ALPN_FRAMED:
+                await self.serve_framed_async(reader, writer)
+                return
+            if protocol == ALPN_STREAM:
+                await self.serve_stream_async(reader, writer)
+                return
+            
+            writer.write(WELCOME)
+            await writer.drain()
+            
+            data = await reader.read(1024)
+            if data:
+                writer.write(RESPONSE)
+                await writer.drain()
+            self.metrics.transferred(len(data), len(WELCOME) + (len(RESPONSE) if data else 0))
+        except (ConnectionError, ssl.SSLError, asyncio.IncompleteReadError, ProtocolError) as e:
+            self.metrics.error(type(e).__name__)
+            logger.warning("Error handling client %s: %s", addr, e)
+        finally:
+            self.active_connections -= 1
+            self.metrics.connection_closed()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, ssl.SSLError):
+                pass
+    
+    async def serve_framed_async(self, reader, writer):
+        """Echo length-prefixed frames until the client closes"""
+        write_frame(writer, WELCOME)
+        await writer.drain()
+        while True:
+            payload = await read_frame(reader)
+            if payload is None:
+                return
+            write_frame(writer, payload)
+            await writer.drain()
+            self.metrics.transferred(len(payload), len(payload))
+    
+    async def serve_stream_async(self, reader, writer):
+        """
+        Bulk streaming on the event loop
+        asyncio transports keep a reference to written data until it is
+        flushed, so downloads write an immutable chunk (or a fresh file
+        chunk) rather than reusing one mutable buffer.
+        """
+        zeros = bytes(self.stream_buffer_size)
+        while True:
+            try:
+                header = await reader.readexactly(STREAM_HEADER.size)
+            except asyncio.IncompleteReadError as e:
+                if not e.partial:
+                    return
+                raise ProtocolError("Connection closed inside a stream header")
+            op, length = STREAM_HEADER.unpack(header)
+            if op == STREAM_UPLOAD:
+                remaining = length
+                while remaining:
+                    data = await reader.read(min(remaining, self.stream_buffer_size))
+                    if not data:
+                        raise ProtocolError(f"Connection closed with {remaining} bytes outstanding")
+                    remaining -= len(data)
+                writer.write(STREAM_ACK.pack(length))
+                await writer.drain()
+                self.metrics.transferred(received=length)
+            elif op == STREAM_DOWNLOAD:
+                size = self.stream_download_size(length)
+                writer.write(STREAM_ACK.pack(size))
+                source = open(self.stream_source, 'rb') if self.stream_source else None
+                try:
+                    remaining = size
+                    while remaining:
+                        chunk = min(remaining, self.stream_buffer_size)
+                        if source:
+                            data = source.read(chunk)
+                        else:
+                            data = zeros if chunk == len(zeros) else zeros[:chunk]
+                        if not data:
+                            raise ProtocolError("Stream source ended early")
+                        writer.write(data)
+                        await writer.drain()
+                        remaining -= len(data)
+                finally:
+                    if source:
+                        source.close()
+                self.metrics.transferred(sent=size - remaining)
+            else:
+                raise ProtocolError(f"Unknown stream opcode {op!r}")
+    
+    async def report_stats(self):
+        """Periodically log handshake rate and connection counts"""
+        last_count = self.handshakes
+        last_time = time.perf_counter()
+        while True:
+            await asyncio.sleep(self.report_interval)
+            now = time.perf_counter()
+            rate = (self.handshakes - last_count) / (now - last_time)
+            logger.info("[stats] handshakes/s: %.1f | total: %d | resumed: %d | active: %d | peak: %d",
+                        rate, self.handshakes, self.resumed_handshakes,
+                        self.active_connections, self.peak_connections)
+            last_count = self.handshakes
+            last_time = now
+    
+    def request_shutdown(self):
+        logger.info("Shutdown requested, draining connections (deadline %.0fs)", self.drain_timeout)
+        self.stop_event.set()
+    
+    async def drain_async(self):
+        """Let connections finish until the drain deadline, then cancel the rest"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.drain_timeout
+        while self.client_tasks and loop.time() < deadline:
+            await asyncio.sleep(0.1)
+        remaining = list(self.client_tasks)
+        if remaining:
+            logger.warning("Drain deadline passed, cancelling %d connections", len(remaining))
+            for task in remaining:
+                task.cancel()
+            await asyncio.gather(*remaining, return_exceptions=True)
+        else:
+            logger.info("All connections drained")
+    
+    async def serve(self):
+        """Run the event loop server until SIGTERM (drain) or cancellation"""
+        loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        try:
+            loop.add_signal_handler(signal.SIGTERM, self.request_shutdown)
+            loop.add_signal_handler(signal.SIGHUP, self.reload_context)
+        except (NotImplementedError, AttributeError):
+            pass  # no signal support in this event loop (e.g. Windows)
+        
+        # Plain TCP listener; each connection is upgraded with start_tls() so
+        # accepts, handshake durations and handshake failures are observable
+        server = await asyncio.start_server(
+            self.handle_client_async,
+            self.host,
+            self.port,
+            backlog=self.backlog,
+            reuse_port=self.reuse_port or None,
+        )
+        logger.info("Async server listening on %s:%s (backlog %d)", self.host, self.port, self.backlog)
+        reporter = asyncio.create_task(self.report_stats())
+        try:
+            await self.stop_event.wait()
+        finally:
+            # Stop accepting, then drain (also runs when Ctrl-C cancels us)
+            server.close()
+            await self.drain_async()
+            await server.wait_closed()
+            reporter.cancel()
+    
+    def start(self):
+        """Start the asyncio TLS server"""
+        raise_file_limit()
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            logger.info("Server shutting down...")
+
+class TLSWorkerPool:
+    """
+    Multi-process TLS server supervisor
+    Forks N worker processes that each bind the same host:port with
+    SO_REUSEPORT and build their own SSLContext once, so the kernel spreads
+    connections (and the CPU-bound handshakes) across all cores. Crashed
+    workers are restarted and per-worker handshake counts are collected.
+    The SSLContext is built here, before forking, so every worker holds the
+    same session-ticket keys and a ticket resumes on whichever worker the
+    kernel picks. A SIGHUP reload gives each worker fresh keys, so until
+    the supervisor restarts tickets only resume on the worker that issued
+    them; the resumed count in the report shows this.
+    """
+    
+    def __init__(self, workers=None, host='localhost', port=8443, mode='threaded',
+                 report_interval=5.0, metrics_port=None, metrics_snapshot=None, metrics_interval=10.0,
+                 **server_options):
+        if not hasattr(socket, 'SO_REUSEPORT'):
+            raise RuntimeError("SO_REUSEPORT is not available on this platform")
+        self.workers = workers or os.cpu_count() or 1
+        self.host = host
+        self.port = port
+        self.mode = mode
+        self.report_interval = report_interval
+        self.server_options = server_options
+        # Each worker exports its own metrics on metrics_port + index / metrics_snapshot.index
+        self.metrics_port = metrics_port
+        self.metrics_snapshot = metrics_snapshot
+        self.metrics_interval = metrics_interval
+        self.mp = multiprocessing.get_context('fork')
+        # Live handshake and resumed-handshake counts of each worker, written by the worker itself
+        self.counts = self.mp.Array('Q', self.workers, lock=False)
+        self.resumed = self.mp.Array('Q', self.workers, lock=False)
+        # Handshakes served by earlier (crashed) incarnations of each worker
+        self.completed = [0] * self.workers
+        self.completed_resumed = [0] * self.workers
+        self.restarts = [0] * self.workers
+        self.processes = [None] * self.workers
+        self.stopping = False
+        self.drain_timeout = server_options.get('drain_timeout', 30.0)
+    
+    @staticmethod
+    def run_worker(index, host, port, mode, counts, resumed, server_options, metrics_port, metrics_snapshot,
+                   metrics_interval):
+        """Worker process entry point: serve until interrupted"""
+        # Drop the supervisor's handlers inherited through fork until the server installs its own
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        server_options = dict(server_options, metrics=enable_metrics(
+            metrics_port + index if metrics_port is not None else None,
+            f"{metrics_snapshot}.{index}" if metrics_snapshot else None,
+            metrics_interval))
+        if mode == 'asyncio':
+            server = AsyncTLSServer(host, port, reuse_port=True, **server_options)
+        else:
+            server = TLSServer(host, port, reuse_port=True, **server_options)
+        
+        def publish_count():
+            while True:
+                counts[index] = server.handshakes
+                resumed[index] = server.resumed_handshakes
+                time.sleep(0.5)
+        
+        threading.Thread(target=publish_count, daemon=True).start()
+        server.start()
+    
+    def build_context(self):
+        """One context (and so one set of session-ticket keys) for every worker forked from now on"""
+        options = self.server_options
+        options['context'] = create_server_context(options.get('certfile', 'server.crt'),
+                                                   options.get('keyfile', 'server.key'),
+                                                   options.get('num_tickets', 2))
+    
+    def spawn(self, index):
+        """Start (or restart) the worker in the given slot"""
+        self.completed[index] += self.counts[index]
+        self.completed_resumed[index] += self.resumed[index]
+        self.counts[index] = 0
+        self.resumed[index] = 0
+        process = self.mp.Process(
+            target=self.run_worker,
+            args=(index, self.host, self.port, self.mode, self.counts, self.resumed, self.server_options,
+                  self.metrics_port, self.metrics_snapshot, self.metrics_interval),
+            name=f"tls-worker-{index}",
+        )
+        process.start()
+        self.processes[index] = process
+    
+    def worker_totals(self):
+        """Handshakes served per worker slot, including restarted workers"""
+        return [self.completed[i] + self.counts[i] for i in range(self.workers)]
+    
+    def report(self):
+        totals = self.worker_totals()
+        resumed = sum(self.completed_resumed) + sum(self.resumed)
+        per_worker = ", ".join(f"w{i}={count}" for i, count in enumerate(totals))
+        logger.info("[supervisor] handshakes total: %d (resumed %d) | %s | restarts: %d",
+                    sum(totals), resumed, per_worker, sum(self.restarts))
+    
+    def start(self):
+        """Start all workers and supervise them until interrupted"""
+        logger.info("Starting %d %s workers on %s:%s (SO_REUSEPORT)", self.workers, self.mode, self.host, self.port)
+        self.build_context()
+        for index in range(self.workers):
+            self.spawn(index)
+        
+        self.install_signal_handlers()
+        try:
+            last_report = time.monotonic()
+            while not self.stopping:
+                time.sleep(0.5)
+                for index, process in enumerate(self.processes):
+                    if not process.is_alive() and not self.stopping:
+                        logger.warning("Worker %d (pid %s) exited with code %s, restarting",
+                                       index, process.pid, process.exitcode)
+                        self.restarts[index] += 1
+                        self.spawn(index)
+                if time.monotonic() - last_report >= self.report_interval:
+                    self.report()
+                    last_report = time.monotonic()
+        except KeyboardInterrupt:
+            logger.info("Supervisor shutting down...")
+        finally:
+            self.stopping = True
+            # Workers drain on SIGTERM; only kill the ones that overrun the deadline
+            self.signal_workers(signal.SIGTERM)
+            deadline = time.monotonic() + self.drain_timeout + 5
+            for process in self.processes:
+                process.join(max(0, deadline - time.monotonic()))
+                if process.is_alive():
+                    logger.warning("Worker %s did not drain in time, killing it", process.name)
+                    process.kill()
+                    process.join()
+            self.report()
+    
+    def signal_workers(self, signum):
+        for process in self.processes:
+            if process.is_alive():
+                os.kill(process.pid, signum)
+    
+    def install_signal_handlers(self):
+        """SIGTERM drains every worker; SIGHUP makes every worker reload its certificate"""
+        def stop(signum, frame):
+            logger.info("Supervisor received SIGTERM, draining workers")
+            self.stopping = True
+        
+        def reload(signum, frame):
+            logger.info("Supervisor forwarding SIGHUP to workers")
+            try:
+                self.build_context()   # restarted workers must not come back with the old certificate
+            except (OSError, ssl.SSLError) as e:
+                logger.error("Certificate reload failed in the supervisor: %s", e)
+            self.signal_workers(signal.SIGHUP)
+        
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGHUP, reload)
+
+def raise_file_limit():
+    """Raise the open file soft limit to the hard limit (POSIX only)"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+            logger.info("Raised open file limit from %d to %d", soft, hard)
+        except (ValueError, OSError) as e:
+            logger.warning("Could not raise open file limit: %s", e)
+
+def enable_metrics(port=None, snapshot_path=None, snapshot_interval=10.0):
+    """Create ServerMetrics and start exporting it; None (metrics off) when no output is configured"""
+    if port is None and not snapshot_path:
+        return None
+    metrics = ServerMetrics()
+    MetricsExporter(metrics, port=port, snapshot_path=snapshot_path,
+                    snapshot_interval=snapshot_interval).start()
+    return metrics
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="TLS 1.3 demo server")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--mode', choices=['threaded', 'asyncio'], default='threaded',
+                        help="threaded: one thread per client; asyncio: single event loop")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of SO_REUSEPORT worker processes (0 = one per core)")
+    parser.add_argument('--backlog', type=int, default=None,
+                        help="listen() backlog (default 128 threaded, 4096 asyncio)")
+    parser.add_argument('--handshake-timeout', type=float, default=5.0,
+                        help="seconds a client may take to complete the handshake")
+    parser.add_argument('--handshake-workers', type=int, default=8,
+                        help="threaded mode: handshake pool threads")
+    parser.add_argument('--handshake-queue', type=int, default=128,
+                        help="threaded mode: queued handshakes before shedding load")
+    parser.add_argument('--num-tickets', type=int, default=2,
+                        help="TLS 1.3 session tickets per full handshake (0 disables resumption)")
+    parser.add_argument('--stream-buffer', type=int, default=DEFAULT_STREAM_BUFFER,
+                        help="per-connection buffer size for bulk streaming")
+    parser.add_argument('--stream-source', help="file served to stream download requests")
+    parser.add_argument('--metrics-port', type=int,
+                        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument('--metrics-snapshot', help="write a JSON metrics snapshot to this file periodically")
+    parser.add_argument('--metrics-interval', type=float, default=10.0, help="seconds between JSON snapshots")
+    parser.add_argument('--cert', default='server.crt', help="certificate chain (re-read on SIGHUP)")
+    parser.add_argument('--key', default='server.key', help="private key (re-read on SIGHUP)")
+    parser.add_argument('--drain-timeout', type=float, default=30.0,
+                        help="seconds SIGTERM waits for in-flight connections before closing them")
+    parser.add_argument('--log-level', default='INFO',
+                        help="DEBUG logs every connection; INFO and above keep the hot path quiet")
+    return parser.parse_args()
+
+def server_options(args):
+    """Constructor keyword arguments for the selected server mode"""
+    options = {
+        'handshake_timeout': args.handshake_timeout,
+        'num_tickets': args.num_tickets,
+        'stream_buffer_size': args.stream_buffer,
+        'stream_source': args.stream_source,
+        'certfile': args.cert,
+        'keyfile': args.key,
+        'drain_timeout': args.drain_timeout,
+    }
+    if args.backlog is not None:
+        options['backlog'] = args.backlog
+    if args.mode == 'threaded':
+        options['handshake_workers'] = args.handshake_workers
+        options['handshake_queue'] = args.handshake_queue
+    return options
 
 if __name__ == "__main__":
-    server = TLSServer()
+    args = parse_args()
+    logging.basicConfig(level=args.log_level.upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    options = server_options(args)
+    if args.workers != 1:
+        server = TLSWorkerPool(args.workers, args.host, args.port, args.mode,
+                               metrics_port=args.metrics_port, metrics_snapshot=args.metrics_snapshot,
+                               metrics_interval=args.metrics_interval, **options)
+    else:
+        options['metrics'] = enable_metrics(args.metrics_port, args.metrics_snapshot, args.metrics_interval)
+        if args.mode == 'asyncio':
+            server = AsyncTLSServer(args.host, args.port, **options)
+        else:
+            server = TLSServer(args.host, args.port, **options)
     server.start()
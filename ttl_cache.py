@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Thread-safe LRU cache with per-entry time-to-live
+Used for TLS session tickets and other short-lived cryptographic state
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+class TTLCache:
+    """
+    Least-recently-used cache whose entries also expire after a TTL
+    Expired entries are dropped lazily on lookup and when space is needed.
+    """
+
+    def __init__(self, max_size=1024, ttl=3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return a live entry and mark it most recently used"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, ttl=None):
+        """Insert or replace an entry, evicting the least recently used if full"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self.lock:
+            self.entries[key] = (expires_at, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        """Remove an entry and return its value"""
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def clear(self):
+        """Drop every entry (counters are kept)"""
+        with self.lock:
+            self.entries.clear()
+
+    def purge_expired(self):
+        """Drop every expired entry; returns how many were removed"""
+        now = time.monotonic()
+        with self.lock:
+            expired = [key for key, (expires_at, _) in self.entries.items() if expires_at <= now]
+            for key in expired:
+                del self.entries[key]
+            return len(expired)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        """Hit/miss counters and current size"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -41,6 +41,7 @@ class WiresharkAnalyzer:
         print("   • Specific port: tcp.port == 8443")
         print("   • TLS 1.3 only: tls.version == \"TLS 1.3\"")
         print("   • Handshake only: tls.handshake")
+        print("   • Resumed (PSK) handshakes: tls.handshake.extensions.psk.identity")
         
         print("\n5. DISPLAY FILTERS:")
         print("   • Client Hello: tls.handshake.type == 1")
@@ -65,21 +66,24 @@ class WiresharkAnalyzer:
         print("Make sure Wireshark is capturing on interface:", self.interface)
         print("Use filter: tcp.port == 8443")
         
-        # Generate multiple TLS connections
+        # Create TLS context once so later connections can resume the session
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        context.minimum_version = ssl.TLSVersion.TLSv1_3
+        context.maximum_version = ssl.TLSVersion.TLSv1_3
+        session = None
+        
+        # Generate multiple TLS connections (first is a full handshake, the
+        # rest resume with a PSK from the session ticket)
         for i in range(3):
             print(f"\n--- Connection {i+1} ---")
             try:
-                # Create TLS context
-                context = ssl.create_default_context()
-                context.check_hostname = False
-                context.verify_mode = ssl.CERT_NONE
-                context.minimum_version = ssl.TLSVersion.TLSv1_3
-                context.maximum_version = ssl.TLSVersion.TLSv1_3
-                
                 # Connect and send data
                 with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                    with context.wrap_socket(sock, server_hostname='localhost') as tls_socket:
+                    with context.wrap_socket(sock, server_hostname='localhost', session=session) as tls_socket:
                         tls_socket.connect(('localhost', 8443))
+                        print(f"Session resumed: {tls_socket.session_reused}")
                         
                         # Send test data
                         test_message = f"Test message {i+1} at {datetime.now()}"
@@ -88,6 +92,8 @@ class WiresharkAnalyzer:
                         # Receive response
                         response = tls_socket.recv(1024)
                         print(f"Response: {response.decode()}")
+                        if tls_socket.session is not None and tls_socket.session.has_ticket:
+                            session = tls_socket.session
                         
                         time.sleep(1)  # Pause between connections
                         
@@ -4,13 +4,21 @@ Zero-Knowledge Proof (ZKP) Implementations
 This script demonstrates various ZKP concepts and implementations
 """
 
+import time
 import hashlib
 import random
 import secrets
+import argparse
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.backends import default_backend
+from multiexp import FixedBaseTable, fixed_base_table, multi_exponentiation, pippenger
+
+# p - 1 = 4 * 3 * 65147 * q' for a 236-bit prime q', so Z_p* has small
+# subgroups of order dividing SCHNORR_COFACTOR next to the large one.
+SCHNORR_COFACTOR = 4 * 3 * 65147
+BATCH_WEIGHT_BITS = 128
 
 class SchnorrZKP:
     """
@@ -18,55 +26,141 @@ class SchnorrZKP:
     Demonstrates knowledge of discrete logarithm without revealing it
     """
     
-    def __init__(self):
+    def __init__(self, private_key=None, verbose=True, precompute=True, key_table=False, persist_tables=False):
         # Use a large prime for demonstration (in practice, use standardized parameters)
         self.p = 2**255 - 19  # Curve25519 prime field
         self.g = 2  # Generator
-        self.generate_keys()
+        self.verbose = verbose
+        # Fixed-base table for g, shared by every instance in the process (and
+        # across processes with persist_tables); optionally one for the key
+        self.g_table = fixed_base_table(self.g, self.p, self.p.bit_length(), persist=persist_tables) if precompute else None
+        self.key_table_enabled = key_table
+        self.key_table = None
+        self.generate_keys(private_key)
+    
+    def g_pow(self, exponent):
+        """g^exponent mod p, through the fixed-base table when there is one"""
+        if self.g_table is None:
+            return pow(self.g, exponent, self.p)
+        return self.g_table.pow(exponent)
     
-    def generate_keys(self):
-        """Generate private and public keys"""
-        self.private_key = secrets.randbelow(self.p - 2) + 1
-        self.public_key = pow(self.g, self.private_key, self.p)
-        print(f"Schnorr Keys Generated:")
-        print(f"  Private key: {self.private_key}")
-        print(f"  Public key: {self.public_key}")
+    def key_pow(self, exponent):
+        """public_key^exponent mod p, through the key's table if it is still current"""
+        if self.key_table is None or self.key_table.base != self.public_key:
+            return pow(self.public_key, exponent, self.p)
+        return self.key_table.pow(exponent)
+    
+    def generate_keys(self, private_key=None):
+        """Generate private and public keys (or derive the public key from a given private key)"""
+        self.private_key = secrets.randbelow(self.p - 2) + 1 if private_key is None else private_key
+        self.public_key = self.g_pow(self.private_key)
+        if self.key_table_enabled:
+            self.key_table = FixedBaseTable(self.public_key, self.p, self.p.bit_length())
+        if self.verbose:
+            print(f"Schnorr Keys Generated:")
+            print(f"  Private key: {self.private_key}")
+            print(f"  Public key: {self.public_key}")
+    
+    def challenge(self, message, r):
+        """Fiat-Shamir challenge e = H(message || r) mod p"""
+        challenge_data = f"{message}{r}".encode()
+        return int(hashlib.sha256(challenge_data).hexdigest(), 16) % self.p
     
     def prove(self, message):
         """Create a ZKP for the given message"""
-        print(f"\n--- Creating ZKP for message: '{message}' ---")
+        if self.verbose:
+            print(f"\n--- Creating ZKP for message: '{message}' ---")
         
         # Step 1: Generate random commitment
         k = secrets.randbelow(self.p - 2) + 1
-        r = pow(self.g, k, self.p)  # Commitment
+        r = self.g_pow(k)  # Commitment
         
         # Step 2: Create challenge (hash of message and commitment)
-        challenge_data = f"{message}{r}".encode()
-        e = int(hashlib.sha256(challenge_data).hexdigest(), 16) % self.p
+        e = self.challenge(message, r)
         
         # Step 3: Calculate response
         s = (k - e * self.private_key) % (self.p - 1)
         
-        print(f"  Commitment (r): {r}")
-        print(f"  Challenge (e): {e}")
-        print(f"  Response (s): {s}")
+        if self.verbose:
+            print(f"  Commitment (r): {r}")
+            print(f"  Challenge (e): {e}")
+            print(f"  Response (s): {s}")
         
         return r, e, s
     
     def verify(self, message, r, e, s):
         """Verify the ZKP"""
-        print(f"\n--- Verifying ZKP for message: '{message}' ---")
+        if self.verbose:
+            print(f"\n--- Verifying ZKP for message: '{message}' ---")
         
         # Calculate expected commitment
-        expected_r = (pow(self.g, s, self.p) * pow(self.public_key, e, self.p)) % self.p
-        
-        print(f"  Received commitment: {r}")
-        print(f"  Expected commitment: {expected_r}")
+        expected_r = (self.g_pow(s) * self.key_pow(e)) % self.p
         
         # Verify
         is_valid = r == expected_r
-        print(f"  Verification result: {'✓ VALID' if is_valid else '✗ INVALID'}")
+        if self.verbose:
+            print(f"  Received commitment: {r}")
+            print(f"  Expected commitment: {expected_r}")
+            print(f"  Verification result: {'✓ VALID' if is_valid else '✗ INVALID'}")
         return is_valid
+    
+    def batch_holds(self, proofs):
+        """
+        One randomized check for a list of (r, e, s, public_key) proofs
+        With secret random weights z_i, every r_i = g^s_i * y_i^e_i implies
+            prod r_i^z_i = g^(sum z_i s_i) * prod y^(sum over its proofs of z_i e_i)
+        and a single bad proof breaks the equation except with probability
+        about 2^-128. Proofs from the same public key share one base.
+        """
+        order = self.p - 1
+        weights = [secrets.randbits(BATCH_WEIGHT_BITS) for _ in proofs]
+        g_exponent = 0
+        key_exponents = {}
+        for (r, e, s, public_key), z in zip(proofs, weights):
+            g_exponent += z * s
+            key_exponents[public_key] = key_exponents.get(public_key, 0) + z * e
+        left = pippenger([r for r, _, _, _ in proofs], weights, self.p)
+        right = self.g_pow(g_exponent % order) * multi_exponentiation(
+            list(key_exponents), [x % order for x in key_exponents.values()], self.p) % self.p
+        # Compare in the large subgroup only: raising to the cofactor removes
+        # small-order factors, which the random weights cannot catch reliably
+        return pow(left * pow(right, -1, self.p) % self.p, SCHNORR_COFACTOR, self.p) == 1
+    
+    def verify_batch(self, proofs):
+        """
+        Verify many (message, r, e, s, public_key) proofs at once
+        Returns one bool per proof. The whole batch costs about one
+        multi-exponentiation; if it fails, the batch is bisected until the
+        bad proofs are isolated. public_key=None means this instance's key.
+        The challenge e is also recomputed from (message, r).
+
+        Caveat: Z_p* is not a prime-order group (see SCHNORR_COFACTOR), and
+        the check runs in its large subgroup. A proof whose commitment differs
+        from a valid one by an element of order dividing the cofactor is
+        accepted here but rejected by verify(). Since e is bound to r by the
+        hash, only the key holder can build such a proof; use verify() where
+        even that malleability matters.
+        """
+        results = [False] * len(proofs)
+        candidates = []
+        for index, (message, r, e, s, public_key) in enumerate(proofs):
+            public_key = self.public_key if public_key is None else public_key
+            if 0 < r < self.p and 0 < public_key < self.p and e == self.challenge(message, r):
+                candidates.append((index, (r, e, s, public_key)))
+        
+        pending = [candidates] if candidates else []
+        while pending:
+            group = pending.pop()
+            if self.batch_holds([proof for _, proof in group]):
+                for index, _ in group:
+                    results[index] = True
+            elif len(group) > 1:
+                middle = len(group) // 2
+                pending.extend((group[:middle], group[middle:]))
+        
+        if self.verbose:
+            print(f"\n--- Batch verification: {sum(results)}/{len(proofs)} proofs valid ---")
+        return results
 
 class FiatShamirZKP:
     """
@@ -74,10 +168,11 @@ class FiatShamirZKP:
     Demonstrates knowledge of square root modulo composite number
     """
     
-    def __init__(self):
-        self.generate_parameters()
+    def __init__(self, secret=None, verbose=True):
+        self.verbose = verbose
+        self.generate_parameters(secret)
     
-    def generate_parameters(self):
+    def generate_parameters(self, secret=None):
         """Generate parameters for Fiat-Shamir protocol"""
         # For demonstration, use small primes (in practice, use large secure primes)
         self.p = 1019  # Prime
@@ -85,19 +180,21 @@ class FiatShamirZKP:
         self.n = self.p * self.q  # Composite number
         
         # Generate secret (square root)
-        self.secret = secrets.randbelow(self.n - 2) + 2
+        self.secret = secrets.randbelow(self.n - 2) + 2 if secret is None else secret
         self.public_value = (self.secret * self.secret) % self.n
         
-        print(f"Fiat-Shamir Parameters:")
-        print(f"  p: {self.p}")
-        print(f"  q: {self.q}")
-        print(f"  n (p*q): {self.n}")
-        print(f"  Secret: {self.secret}")
-        print(f"  Public value (s² mod n): {self.public_value}")
+        if self.verbose:
+            print(f"Fiat-Shamir Parameters:")
+            print(f"  p: {self.p}")
+            print(f"  q: {self.q}")
+            print(f"  n (p*q): {self.n}")
+            print(f"  Secret: {self.secret}")
+            print(f"  Public value (s² mod n): {self.public_value}")
     
     def prove(self):
         """Create Fiat-Shamir ZKP"""
-        print(f"\n--- Creating Fiat-Shamir ZKP ---")
+        if self.verbose:
+            print(f"\n--- Creating Fiat-Shamir ZKP ---")
         
         # Step 1: Generate random commitment
         r = secrets.randbelow(self.n - 2) + 1
@@ -112,15 +209,17 @@ class FiatShamirZKP:
         else:
             y = (r * self.secret) % self.n  # Reveal r*s
         
-        print(f"  Commitment (x): {x}")
-        print(f"  Challenge bit (c): {c}")
-        print(f"  Response (y): {y}")
+        if self.verbose:
+            print(f"  Commitment (x): {x}")
+            print(f"  Challenge bit (c): {c}")
+            print(f"  Response (y): {y}")
         
         return x, c, y
     
     def verify(self, x, c, y):
         """Verify Fiat-Shamir ZKP"""
-        print(f"\n--- Verifying Fiat-Shamir ZKP ---")
+        if self.verbose:
+            print(f"\n--- Verifying Fiat-Shamir ZKP ---")
         
         # Calculate expected commitment
         if c == 0:
@@ -128,12 +227,12 @@ class FiatShamirZKP:
         else:
             expected_x = (y * y * pow(self.public_value, -1, self.n)) % self.n
         
-        print(f"  Received commitment: {x}")
-        print(f"  Expected commitment: {expected_x}")
-        
         # Verify
         is_valid = x == expected_x
-        print(f"  Verification result: {'✓ VALID' if is_valid else '✗ INVALID'}")
+        if self.verbose:
+            print(f"  Received commitment: {x}")
+            print(f"  Expected commitment: {expected_x}")
+            print(f"  Verification result: {'✓ VALID' if is_valid else '✗ INVALID'}")
         return is_valid
 
 class RSAZKP:
@@ -270,5 +369,91 @@ def print_zkp_theory():
     print("• Password authentication: Prove knowledge without sending password")
     print("• Blockchain: Privacy-preserving smart contracts")
 
+def benchmark_batch(sizes=(1, 10, 100, 1000, 10000), provers=1):
+    """Proofs/s of a loop over SchnorrZKP.verify against verify_batch, per batch size"""
+    schnorrs = [SchnorrZKP(verbose=False) for _ in range(provers)]
+    verifier = SchnorrZKP(verbose=False)
+    report = {}
+    for size in sizes:
+        proofs = []
+        for i in range(size):
+            schnorr = schnorrs[i % provers]
+            message = f"message {i}"
+            proofs.append((message, *schnorr.prove(message), schnorr.public_key))
+        
+        start = time.perf_counter()
+        for message, r, e, s, public_key in proofs:
+            verifier.public_key = public_key
+            verifier.verify(message, r, e, s)
+        loop_seconds = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        results = verifier.verify_batch(proofs)
+        batch_seconds = time.perf_counter() - start
+        if not all(results):
+            raise RuntimeError("Batch verification rejected valid proofs")
+        report[size] = {'loop_proofs_per_s': size / loop_seconds, 'batch_proofs_per_s': size / batch_seconds,
+                        'speedup': loop_seconds / batch_seconds}
+    
+    # One forged proof in a batch must be found by bisection
+    message, r, e, s, public_key = proofs[-1]
+    proofs[-1] = (message, r, e, (s + 1) % (verifier.p - 1), public_key)
+    if verifier.verify_batch(proofs)[-1] or not all(verifier.verify_batch(proofs)[:-1]):
+        raise RuntimeError("Bisection did not isolate the forged proof")
+    return report
+
+def benchmark_tables(count=2000, windows=(4, 6, 8)):
+    """Table build cost against prove/verify latency (µs) with and without fixed-base tables"""
+    messages = [f"message {i}" for i in range(count)]
+    
+    def latency(schnorr):
+        start = time.perf_counter()
+        proofs = [schnorr.prove(message) for message in messages]
+        prove_us = (time.perf_counter() - start) / count * 1e6
+        start = time.perf_counter()
+        if not all(schnorr.verify(message, *proof) for message, proof in zip(messages, proofs)):
+            raise RuntimeError("Fixed-base tables produced an invalid proof")
+        return prove_us, (time.perf_counter() - start) / count * 1e6
+    
+    plain = SchnorrZKP(verbose=False, precompute=False)
+    prove_us, verify_us = latency(plain)
+    report = {'pow': {'prove_us': prove_us, 'verify_us': verify_us}}
+    bits = plain.p.bit_length()
+    for window in windows:
+        start = time.perf_counter()
+        g_table = FixedBaseTable(plain.g, plain.p, bits, window)
+        key_table = FixedBaseTable(plain.public_key, plain.p, bits, window)
+        build_ms = (time.perf_counter() - start) / 2 * 1e3
+        plain.g_table, plain.key_table = g_table, key_table
+        prove_us, verify_us = latency(plain)
+        report[f'window_{window}'] = {
+            'build_ms_per_table': build_ms,
+            'table_kib': len(g_table.rows) * ((1 << window) - 1) * g_table.width / 1024,
+            'prove_us': prove_us,
+            'verify_us': verify_us,
+            'prove_speedup': report['pow']['prove_us'] / prove_us,
+            'verify_speedup': report['pow']['verify_us'] / verify_us,
+        }
+    return report
+
 if __name__ == "__main__":
-    interactive_zkp_demo()
+    parser = argparse.ArgumentParser(description="Zero-knowledge proof demos")
+    parser.add_argument('--benchmark-batch', metavar='SIZES',
+                        help="compare verify vs verify_batch for comma-separated batch sizes, e.g. 1,10,100,1000,10000")
+    parser.add_argument('--provers', type=int, default=1, help="distinct public keys in the benchmark batches")
+    parser.add_argument('--benchmark-tables', type=int, metavar='N',
+                        help="time N proofs with and without fixed-base tables")
+    args = parser.parse_args()
+
+    if args.benchmark_tables:
+        for name, result in benchmark_tables(args.benchmark_tables).items():
+            build = (f"build {result['build_ms_per_table']:6.1f} ms ({result['table_kib']:5.0f} KiB)  "
+                     if 'build_ms_per_table' in result else " " * 31)
+            print(f"{name:<9} {build}prove {result['prove_us']:7.1f} µs  verify {result['verify_us']:7.1f} µs")
+    elif args.benchmark_batch:
+        report = benchmark_batch([int(size) for size in args.benchmark_batch.split(',')], args.provers)
+        for size, result in report.items():
+            print(f"N={size:<6} loop {result['loop_proofs_per_s']:10,.0f} proofs/s  "
+                  f"batch {result['batch_proofs_per_s']:10,.0f} proofs/s  ({result['speedup']:.1f}x)")
+    else:
+        interactive_zkp_demo()
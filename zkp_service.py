@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Parallel Prover/Verifier Service for SchnorrZKP and FiatShamirZKP
+A non-interactive replacement for interactive_zkp_demo: clients send batches
+of prove/verify jobs as JSON in length-prefixed frames (tls_protocol framing)
+over TCP or a Unix socket. The service splits each batch into chunks for a
+process pool that does the big-integer work with printing turned off.
+Results come back in job order.
+
+Backpressure works at two levels. Each connection has a bounded queue of
+batches in flight; when it fills up, the server stops reading that socket,
+so TCP pushes back on the client. Across all connections, a semaphore caps
+how many chunks can wait on the pool.
+
+    request  {"jobs": [{"op": "schnorr.prove", "message": "..."}, ...]}
+    response {"results": [{"r": ..., "e": ..., "s": ..., "public_key": ...}, ...]}
+
+Operations: schnorr.prove (message), schnorr.verify (message, r, e, s,
+public_key optional), fiat_shamir.prove, fiat_shamir.verify (x, c, y,
+public_value optional). A job that fails yields {"error": "..."} in its slot.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from zero_knowledge_proof import SchnorrZKP, FiatShamirZKP
+from tls_protocol import ProtocolError, read_frame, write_frame, send_frame, recv_frame
+from perf_stats import summarize
+
+DEFAULT_PORT = 9650
+DEFAULT_CHUNK = 32
+MAX_BATCH_JOBS = 10_000
+
+# Protocol objects of one worker process, built by init_worker
+worker_state = {}
+
+def init_worker(schnorr_private_key, fiat_shamir_secret):
+    worker_state['schnorr'] = SchnorrZKP(schnorr_private_key, verbose=False)
+    worker_state['schnorr_verifier'] = SchnorrZKP(schnorr_private_key, verbose=False, key_table=True)
+    worker_state['fiat_shamir'] = FiatShamirZKP(fiat_shamir_secret, verbose=False)
+    worker_state['fiat_shamir_verifier'] = FiatShamirZKP(fiat_shamir_secret, verbose=False)
+
+def schnorr_prove(job):
+    schnorr = worker_state['schnorr']
+    r, e, s = schnorr.prove(str(job['message']))
+    return {'r': r, 'e': e, 's': s, 'public_key': schnorr.public_key}
+
+def schnorr_verify(job):
+    verifier = worker_state['schnorr_verifier']
+    verifier.public_key = int(job.get('public_key') or worker_state['schnorr'].public_key)
+    message, r, e, s = str(job['message']), int(job['r']), int(job['e']), int(job['s'])
+    # verify() alone does not bind the proof to the message; check the challenge too
+    return {'valid': e == verifier.challenge(message, r) and verifier.verify(message, r, e, s)}
+
+def fiat_shamir_prove(job):
+    fiat_shamir = worker_state['fiat_shamir']
+    x, c, y = fiat_shamir.prove()
+    return {'x': x, 'c': c, 'y': y, 'public_value': fiat_shamir.public_value}
+
+def fiat_shamir_verify(job):
+    verifier = worker_state['fiat_shamir_verifier']
+    verifier.public_value = int(job.get('public_value') or worker_state['fiat_shamir'].public_value)
+    return {'valid': verifier.verify(int(job['x']), int(job['c']), int(job['y']))}
+
+OPERATIONS = {
+    'schnorr.prove': schnorr_prove,
+    'schnorr.verify': schnorr_verify,
+    'fiat_shamir.prove': fiat_shamir_prove,
+    'fiat_shamir.verify': fiat_shamir_verify,
+}
+
+def run_jobs(jobs):
+    """Worker task: run a chunk of jobs, one result (or error) per job"""
+    results = []
+    for job in jobs:
+        try:
+            results.append(OPERATIONS[job['op']](job))
+        except KeyError as e:
+            results.append({'error': f"missing or unknown field {e}"})
+        except Exception as e:   # e.g. OverflowError for "r": 1e400; only this job fails
+            results.append({'error': f"{type(e).__name__}: {e}"})
+    return results
+
+class ZKPService:
+    """
+    Batches of ZKP jobs over a process pool, with bounded queues
+    Keys are injected (or generated once) here and handed to every worker, so
+    all workers prove with the same Schnorr key and Fiat-Shamir secret.
+    run_batch() can be awaited directly; serve() exposes it on a socket.
+    """
+
+    def __init__(self, workers=None, chunk_size=DEFAULT_CHUNK, max_pending_chunks=None, max_pipelined=8,
+                 schnorr_private_key=None, fiat_shamir_secret=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.max_pending_chunks = max_pending_chunks or 4 * self.workers
+        self.max_pipelined = max_pipelined
+        schnorr = SchnorrZKP(schnorr_private_key, verbose=False, precompute=False)
+        fiat_shamir = FiatShamirZKP(fiat_shamir_secret, verbose=False)
+        self.keys = (schnorr.private_key, fiat_shamir.secret)
+        self.schnorr_public_key = schnorr.public_key
+        self.fiat_shamir_public_value = fiat_shamir.public_value
+        self.pool = None
+        self.slots = None
+        self.server = None
+        self.connections = 0
+        self.jobs = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+
+    def start(self):
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers, initializer=init_worker, initargs=self.keys)
+            # Fork the workers now, before any connection exists: a worker forked
+            # later would inherit open sockets and keep them from closing
+            self.pool.submit(int).result()
+        return self
+
+    async def run_chunk(self, jobs):
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.max_pending_chunks)
+        async with self.slots:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, run_jobs, jobs)
+
+    async def run_batch(self, jobs):
+        """Results for a list of jobs, in order"""
+        if len(jobs) > MAX_BATCH_JOBS:
+            raise ValueError(f"Batch of {len(jobs)} jobs exceeds {MAX_BATCH_JOBS}")
+        self.start()
+        start = time.perf_counter()
+        chunks = [jobs[i:i + self.chunk_size] for i in range(0, len(jobs), self.chunk_size)]
+        results = [result for chunk in await asyncio.gather(*map(self.run_chunk, chunks)) for result in chunk]
+        self.busy_seconds += time.perf_counter() - start
+        self.jobs += len(jobs)
+        self.batches += 1
+        return results
+
+    async def answer(self, payload):
+        try:
+            request = json.loads(payload)
+            jobs = request['jobs']
+            if not isinstance(jobs, list) or not all(isinstance(job, dict) for job in jobs):
+                raise ValueError("'jobs' must be a list of objects")
+            response = {'results': await self.run_batch(jobs)}
+        except (KeyError, TypeError, ValueError) as e:
+            response = {'error': f"Bad request: {e}"}
+        except Exception as e:   # e.g. BrokenProcessPool: fail this batch, not the connection
+            response = {'error': f"{type(e).__name__}: {e}"}
+        return json.dumps(response, separators=(',', ':')).encode()
+
+    async def handle(self, reader, writer):
+        """One connection: batches are read ahead up to max_pipelined and answered in order"""
+        answers = asyncio.Queue(maxsize=self.max_pipelined)
+
+        async def respond():
+            while True:
+                answer = await answers.get()
+                if answer is None:
+                    return
+                write_frame(writer, await answer)
+                await writer.drain()
+
+        responder = asyncio.create_task(respond())
+        self.connections += 1
+        try:
+            while not responder.done():
+                payload = await read_frame(reader)
+                if payload is None:
+                    break
+                # put() blocks while the queue is full, which stops reading this socket
+                await answers.put(asyncio.ensure_future(self.answer(payload)))
+        except (ProtocolError, ConnectionError):
+            pass
+        finally:
+            try:
+                if not responder.done():
+                    await answers.put(None)
+                await responder
+            except Exception:
+                pass   # the peer went away or a response could not be written
+            finally:
+                responder.cancel()
+                writer.close()
+                self.connections -= 1
+
+    async def serve(self, host='127.0.0.1', port=DEFAULT_PORT, unix_path=None):
+        """Start listening; returns the asyncio server"""
+        self.start()
+        if unix_path:
+            self.server = await asyncio.start_unix_server(self.handle, path=unix_path)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'batches': self.batches,
+            'jobs': self.jobs,
+            'jobs_per_s': self.jobs / self.busy_seconds if self.busy_seconds else 0.0,
+        }
+
+class ZKPClient:
+    """Blocking client: one batch per call"""
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, unix_path=None):
+        if unix_path:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(unix_path)
+        else:
+            self.sock = socket.create_connection((host, port))
+
+    def submit(self, jobs):
+        """Results for the jobs, in order; raises ProtocolError on a rejected request"""
+        send_frame(self.sock, json.dumps({'jobs': jobs}).encode())
+        payload = recv_frame(self.sock)
+        if payload is None:
+            raise ProtocolError("Connection closed before the response")
+        response = json.loads(payload)
+        if 'error' in response:
+            raise ProtocolError(response['error'])
+        return response['results']
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+async def benchmark(batches=50, batch_size=64, clients=4, pipeline=2, workers=None):
+    """Proofs/s and per-batch latency percentiles for prove batches, then for verifying them"""
+    service = ZKPService(workers)
+    server = await service.serve(port=0)
+    port = server.sockets[0].getsockname()[1]
+    await service.run_batch([{'op': 'schnorr.prove', 'message': 'warmup'}] * service.workers)
+
+    async def client(index, make_batch):
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        in_flight = asyncio.Semaphore(pipeline)
+        sent = deque()
+        latencies, outputs = [], []
+
+        async def receive():
+            for _ in range(batches):
+                response = json.loads(await read_frame(reader))
+                latencies.append(time.perf_counter() - sent.popleft())
+                outputs.append(response['results'])
+                in_flight.release()
+
+        receiver = asyncio.create_task(receive())
+        for batch in range(batches):
+            await in_flight.acquire()
+            sent.append(time.perf_counter())
+            write_frame(writer, json.dumps({'jobs': make_batch(index, batch)}).encode())
+            await writer.drain()
+        await receiver
+        writer.close()
+        await writer.wait_closed()
+        return latencies, outputs
+
+    def prove_batch(index, batch):
+        return [{'op': 'schnorr.prove', 'message': f"{index}/{batch}/{i}"} for i in range(batch_size)]
+
+    report = {'batches_per_client': batches, 'batch_size': batch_size, 'clients': clients, 'workers': service.workers}
+    proofs = {}
+    for phase in ('prove', 'verify'):
+        if phase == 'prove':
+            make_batch = prove_batch
+        else:
+            def make_batch(index, batch):
+                return [{'op': 'schnorr.verify', 'message': f"{index}/{batch}/{i}", **proof}
+                        for i, proof in enumerate(proofs[index][batch])]
+        start = time.perf_counter()
+        results = await asyncio.gather(*(client(index, make_batch) for index in range(clients)))
+        elapsed = time.perf_counter() - start
+        latencies = [latency for client_latencies, _ in results for latency in client_latencies]
+        report[phase] = {
+            'proofs_per_s': clients * batches * batch_size / elapsed,
+            'batch_latency_ms': summarize(latencies, 1e3),
+        }
+        if phase == 'prove':
+            proofs = {index: outputs for index, (_, outputs) in enumerate(results)}
+        elif not all(result['valid'] for _, outputs in results for batch in outputs for result in batch):
+            raise RuntimeError("Service rejected its own proofs")
+    while service.connections:
+        await asyncio.sleep(0.01)
+    report['service'] = service.stats()
+    service.close()
+    return report
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Batch ZKP prover/verifier service")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    serve = subcommands.add_parser('serve', help="run the service")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve.add_argument('--unix', metavar='PATH', help="listen on a Unix socket instead of TCP")
+    serve.add_argument('--workers', type=int, default=None)
+    bench = subcommands.add_parser('benchmark', help="proofs/s and latency percentiles against a local service")
+    bench.add_argument('--batches', type=int, default=50, help="batches per client")
+    bench.add_argument('--batch-size', type=int, default=64)
+    bench.add_argument('--clients', type=int, default=4)
+    bench.add_argument('--pipeline', type=int, default=2, help="batches each client keeps in flight")
+    bench.add_argument('--workers', type=int, default=None)
+    return parser.parse_args()
+
+async def serve_forever(args):
+    service = ZKPService(args.workers)
+    server = await service.serve(args.host, args.port, args.unix)
+    print(f"ZKP service on {args.unix or f'{args.host}:{args.port}'} with {service.workers} workers", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == 'serve':
+        try:
+            asyncio.run(serve_forever(args))
+        except KeyboardInterrupt:
+            pass
+    else:
+        report = asyncio.run(benchmark(args.batches, args.batch_size, args.clients, args.pipeline, args.workers))
+        for phase in ('prove', 'verify'):
+            latency = report[phase]['batch_latency_ms']
+            print(f"{phase:<7} {report[phase]['proofs_per_s']:8,.0f} proofs/s  batch p50 {latency['p50']:7.1f} ms  "
+                  f"p95 {latency['p95']:7.1f} ms  p99 {latency['p99']:7.1f} ms", file=sys.stderr)
+        print(json.dumps(report, indent=2))